@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmarks for the render, encode and transmit path of pyledstrip.
+Results are printed as JSON (or written to --output) so they can be compared across releases.
+"""
+
+import argparse
+import configparser
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import timeit
+
+import numpy as np
+
+import pyledstrip
+from pyledstrip import LedStrip
+
+SIZES = (300, 3000, 30000)
+
+# LEDs per strip in multi strip configurations
+STRIP_SIZE = 300
+
+
+class UdpSink:
+    """
+    Loopback UDP receiver discarding everything it receives.
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self._receive, daemon=True)
+        self.thread.start()
+
+    def _receive(self):
+        buffer = bytearray(1 << 16)
+        try:
+            while self.sock.recv_into(buffer):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+
+class TcpSink:
+    """
+    Loopback TCP server accepting any amount of connections and discarding everything it receives.
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        self.connections = []
+        self.thread = threading.Thread(target=self._accept, daemon=True)
+        self.thread.start()
+
+    def _accept(self):
+        try:
+            while True:
+                connection, _ = self.sock.accept()
+                self.connections.append(connection)
+                threading.Thread(target=self._receive, args=(connection,), daemon=True).start()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _receive(connection):
+        buffer = bytearray(1 << 16)
+        try:
+            while connection.recv_into(buffer):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+        for connection in self.connections:
+            connection.close()
+
+
+def measure(func, repeat):
+    """
+    Time a function with automatically chosen iteration count.
+    :return: dict with seconds per call
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'number': number,
+        'min': min(times),
+        'median': statistics.median(times),
+    }
+
+
+def make_strip(led_count, strips, **kwargs):
+    # empty configuration, ignores ~/.pyledstrip.ini
+    config = configparser.ConfigParser()
+    config['pyledstrip'] = {}
+    kwargs['config'] = config
+    if strips == 1:
+        return LedStrip(led_count=led_count, power_limit=1.0, **kwargs)
+    kwargs.setdefault('ip', ['127.0.0.1'] * strips)
+    return LedStrip(led_count=[led_count // strips] * strips, power_limit=1.0, **kwargs)
+
+
+def suffixed(name, pixel_dtype):
+    # benchmarks of the default pixel storage keep their plain names
+    return name if pixel_dtype == 'float64' else '%s_%s' % (name, pixel_dtype)
+
+
+def render_cases(led_count, strips, pixel_dtype='float64'):
+    """
+    Benchmarks of pixel manipulation.
+    :return: list of (name, function) tuples
+    """
+    strip = make_strip(led_count, strips, pixel_dtype=pixel_dtype)
+    random = np.random.RandomState(0)
+    positions = np.arange(led_count)
+    hsv = random.random_sample((led_count, 3))
+    particles = random.random_sample(led_count) * led_count
+    colors = random.random_sample((led_count, 3))
+    rgb = np.empty((led_count, 3))
+    counter = iter(range(1 << 62))
+
+    def next_pos():
+        return next(counter) % led_count
+
+    # matrix of 50 LEDs wide rows
+    strip.mapping = pyledstrip.Mapping(np.column_stack([positions % 50, positions // 50]))
+    image = random.random_sample((-(-led_count // 50), 50, 3))
+
+    # effects including the bulk write into the strip
+    rainbow = pyledstrip.Rainbow(led_count)
+    chase = pyledstrip.Chase(led_count)
+    twinkle = pyledstrip.Twinkle(led_count)
+    fire = pyledstrip.Fire(led_count)
+
+    compositor = pyledstrip.Compositor(strip)
+    for blend in pyledstrip.BLEND_MODES:
+        layer = compositor.add_layer(blend, blend=blend, opacity=0.5)
+        layer.pixels[:] = colors
+
+    return [(suffixed(name, pixel_dtype), func) for name, func in [
+        ('set_pixel_rgb', lambda: strip.set_pixel_rgb(next_pos(), 0.1, 0.2, 0.3)),
+        ('set_rgb', lambda: strip.set_rgb(next_pos() + 0.5, 0.1, 0.2, 0.3)),
+        ('set_hsv', lambda: strip.set_hsv(next_pos() + 0.5, 0.1, 0.2, 0.3)),
+        ('call_interpolated', lambda: LedStrip._call_interpolated(
+            strip.add_pixel_rgb, next_pos() + 0.5, 0.1, 0.2, 0.3)),
+        ('clear', strip.clear),
+        ('set_hsv_array', lambda: strip.set_hsv_array(positions, hsv)),
+        ('hsv_to_rgb', lambda: pyledstrip.hsv_to_rgb(hsv, rgb)),
+        ('hue_to_rgb', lambda: pyledstrip.hue_to_rgb(hsv[:, 0], out=rgb)),
+        ('add_rgb_array', lambda: strip.add_rgb_array(particles, colors)),
+        ('flatten_layers', compositor.flatten),
+        ('set_image', lambda: strip.set_image(image)),
+        ('set_function', lambda: strip.set_function(lambda x, y, z: np.column_stack([x / 50, y / 50, z]))),
+        ('effect_rainbow', lambda: rainbow(strip, 1.0)),
+        ('effect_chase', lambda: chase(strip, 1.0)),
+        ('effect_twinkle', lambda: twinkle(strip, 1.0)),
+        ('effect_fire', lambda: fire(strip, next(counter) / 60.0)),
+    ]]
+
+
+def encode_cases(led_count, strips, pixel_dtype='float64'):
+    """
+    Benchmarks of converting pixels to transmit buffers.
+    :return: list of (name, function) tuples
+    """
+    cases = []
+    for name, kwargs in (('update_buffers', {}), ('update_buffers_calibrated', {'gamma': 2.2})):
+        strip = make_strip(led_count, strips, pixel_dtype=pixel_dtype, **kwargs)
+        strip.set_pixels_rgb(np.arange(led_count), np.random.RandomState(0).random_sample((led_count, 3)))
+
+        def update(strip=strip):
+            strip._strip_dirty[:] = True
+            strip._update_buffers()
+
+        cases.append((suffixed(name, pixel_dtype), update))
+    return cases
+
+
+def transmit_cases(led_count, strips, sinks):
+    """
+    Benchmarks of a full frame (encode and send) to loopback sinks.
+    :return: list of (name, function) tuples
+    """
+    cases = []
+    for name, protocol, sink, kwargs in (
+            ('transmit_udp', 'esp', sinks['udp'], {}),
+            ('transmit_udp_stats', 'esp', sinks['udp'], {'collect_stats': True}),
+            ('transmit_tcp', 'opc', sinks['tcp'], {})):
+        strip = make_strip(led_count, strips, ip='127.0.0.1', port=[sink.port] * strips,
+                           protocol=protocol, keepalive=0.0, **kwargs)
+
+        def transmit(strip=strip):
+            strip.set_pixel_rgb(0, 0.5, 0.5, 0.5)
+            strip.transmit()
+
+        cases.append((name, transmit))
+
+    # replaying a recorded frame skips rendering and encoding
+    strip = make_strip(led_count, strips, ip='127.0.0.1', port=[sinks['udp'].port] * strips, keepalive=0.0)
+    strip.set_pixels_rgb(np.arange(led_count), np.random.RandomState(0).random_sample((led_count, 3)))
+    path = os.path.join(sinks['directory'].name, 'transmit_recorded_%d_%d.plr' % (led_count, strips))
+    with pyledstrip.Recorder(path, strip) as recorder:
+        recorder.record()
+    player = pyledstrip.Player(path, strip)
+    cases.append(('transmit_recorded', lambda: player.show(0)))
+    return cases
+
+
+def run(sizes, strip_counts, repeat, name_filter, pixel_dtypes=pyledstrip.PIXEL_DTYPES):
+    sinks = {'udp': UdpSink(), 'tcp': TcpSink(), 'directory': tempfile.TemporaryDirectory()}
+    results = []
+    try:
+        for led_count in sizes:
+            for strips in strip_counts(led_count):
+                cases = []
+                for pixel_dtype in pixel_dtypes:
+                    cases += render_cases(led_count, strips, pixel_dtype) + encode_cases(led_count, strips, pixel_dtype)
+                cases += transmit_cases(led_count, strips, sinks)
+                for name, func in cases:
+                    if name_filter and name_filter not in name:
+                        continue
+                    result = {'name': name, 'led_count': led_count, 'strips': strips}
+                    try:
+                        result.update(measure(func, repeat))
+                    except OSError as e:
+                        # e.g. a single strip too large for one datagram
+                        result['error'] = str(e)
+                        print('%-26s %6d LEDs %3d strips %s' % (name, led_count, strips, e), file=sys.stderr)
+                    else:
+                        print('%-26s %6d LEDs %3d strips %12.2f us' % (
+                            name, led_count, strips, result['min'] * 1e6), file=sys.stderr)
+                    results.append(result)
+    finally:
+        sinks['udp'].close()
+        sinks['tcp'].close()
+        sinks['directory'].cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='total amounts of LEDs')
+    parser.add_argument('--repeat', type=int, default=5, help='timing repetitions per benchmark')
+    parser.add_argument('--filter', type=str, help='only run benchmarks containing this string')
+    parser.add_argument('--pixel_dtypes', type=str, nargs='+', choices=pyledstrip.PIXEL_DTYPES,
+                        default=pyledstrip.PIXEL_DTYPES, help='pixel storage types to benchmark')
+    parser.add_argument('--output', type=str, help='write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    def strip_counts(led_count):
+        # single strip and the same amount of LEDs split into strips of STRIP_SIZE
+        if led_count > STRIP_SIZE:
+            return [1, led_count // STRIP_SIZE]
+        return [1]
+
+    report = {
+        'pyledstrip': pyledstrip.__version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': run(args.sizes, strip_counts, args.repeat, args.filter, args.pixel_dtypes),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
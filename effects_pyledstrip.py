@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Runs one of the effects of pyledstrip on the strips of a configuration until interrupted.
+"""
+
+import argparse
+
+import pyledstrip
+from pyledstrip import LedStrip
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--effect', type=str, choices=list(pyledstrip.EFFECTS), default='rainbow', help='effect')
+    parser.add_argument('--fps', type=float, default=60.0, help='frames per second')
+    parser.add_argument('--duration', type=float, help='stop after seconds')
+    LedStrip.add_arguments(parser)
+    args = parser.parse_args()
+
+    strip = LedStrip(config=args.config, args=args)
+    effect = pyledstrip.EFFECTS[args.effect](strip.led_count)
+    frames = None if args.duration is None else int(args.duration * args.fps)
+    try:
+        strip.run(effect, fps=args.fps, frames=frames)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        strip.off()
+
+
+if __name__ == '__main__':
+    main()
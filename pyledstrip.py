@@ -5,588 +5,5068 @@
 This module wraps streaming of color information to WS2812 LED strips
 """
 
-__all__ = ['LedStrip']
+__all__ = ['LedStrip', 'FrameClock', 'Mapping', 'Layer', 'Compositor', 'Effect', 'Rainbow', 'GradientScroll', 'Chase',
+           'Scanner', 'Twinkle', 'Fire', 'Recorder', 'Player', 'Receiver', 'Relay', 'hsv_to_rgb', 'rgb_to_hsv',
+           'hsl_to_rgb', 'rgb_to_hsl', 'kelvin_to_rgb', 'hue_palette', 'gradient_palette', 'palette_lookup',
+           'hue_to_rgb']
 __version__ = '2.1'
 __author__ = 'Michael Cipold'
 __email__ = 'github@cipold.de'
 __license__ = 'MPL-2.0'
 
 import argparse
-import colorsys
+import asyncio
+import bisect
+import concurrent.futures
 import configparser
+import contextlib
+import ctypes
+import functools
+import json
+import mmap
 import os.path
 import pprint
 import shlex
 import socket
-from typing import Union, Callable, List
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from typing import Union, Callable, List, Tuple
 
 import numpy as np
 
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # Python < 3.8, shared pixels are only available as memory mapped files
+    resource_tracker = None
+    shared_memory = None
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, commits of several processes to shared pixels are not serialized
+    fcntl = None
+
+
+def _synchronized(method: Callable) -> Callable:
+    """
+    Decorator running a LedStrip method while holding its transmit lock.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._transmit_lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _parse_bool(value: str) -> bool:
+    """
+    Argument type accepting the boolean values of configuration files (yes/no, true/false, on/off, 1/0).
+    """
+    try:
+        return configparser.ConfigParser.BOOLEAN_STATES[value.lower()]
+    except KeyError:
+        raise argparse.ArgumentTypeError('not a boolean: %r' % value)
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(_IoVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', _MsgHdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+
+def _load_sendmmsg() -> Union[Callable, None]:
+    """
+    Find sendmmsg in the C library (Linux only).
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        sendmmsg = ctypes.CDLL(None, use_errno=True).sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+class _UdpSender:
+    """
+    Sends datagrams to many addresses through one socket, batched into a single sendmmsg system call where available
+    """
+    # time in seconds to busy wait before sending a packet when pacing packets, sleeping before that
+    SPIN = 0.0005
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sockaddrs = {}
+
+    def _sockaddr(self, address: Tuple[str, int]) -> Union[ctypes.Array, None]:
+        """
+        Build (and cache) a sockaddr_in for an address, None if the host name can not be resolved.
+        """
+        if address not in self._sockaddrs:
+            try:
+                packed_ip = socket.inet_aton(socket.gethostbyname(address[0]))
+            except OSError:
+                return None
+            self._sockaddrs[address] = ctypes.create_string_buffer(
+                struct.pack('=H', socket.AF_INET) + struct.pack('!H', address[1]) + packed_ip + bytes(8), 16)
+        return self._sockaddrs[address]
+
+    def prepare(self, packets: List[Tuple[List[np.ndarray], Tuple[str, int]]]) -> Union[ctypes.Array, None]:
+        """
+        Build the sendmmsg message vector for a fixed list of buffers, which must stay allocated while in use.
+        :param packets: list of (contiguous uint8 buffers forming one datagram, address)
+        :return: message vector or None if batching is not possible
+        """
+        sockaddrs = [self._sockaddr(address) for _, address in packets]
+        if _sendmmsg is None or None in sockaddrs:
+            return None
+
+        iovecs = (_IoVec * sum(len(buffers) for buffers, _ in packets))()
+        messages = (_MMsgHdr * len(packets))()
+        i = 0
+        for message, (buffers, _), sockaddr in zip(messages, packets, sockaddrs):
+            message.msg_hdr.msg_name = ctypes.addressof(sockaddr)
+            message.msg_hdr.msg_namelen = 16
+            message.msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+            message.msg_hdr.msg_iovlen = len(buffers)
+            for buffer in buffers:
+                iovecs[i].iov_base = buffer.ctypes.data
+                iovecs[i].iov_len = buffer.nbytes
+                i += 1
+
+        # keep referenced structures alive as long as the message vector
+        messages.references = (iovecs, sockaddrs)
+        return messages
+
+    @staticmethod
+    def select(messages: ctypes.Array, positions: List[int]) -> ctypes.Array:
+        """
+        Copy some entries of a message vector, the result is only valid while the original exists.
+        :param messages: message vector from prepare()
+        :param positions: positions of the entries to copy
+        :return: message vector
+        """
+        selected = (_MMsgHdr * len(positions))()
+        for i, position in enumerate(positions):
+            selected[i] = messages[position]
+        return selected
+
+    def _sendto(self, buffers: List[np.ndarray], address: Tuple[str, int]) -> None:
+        """
+        Send one datagram, gathered from several buffers without joining them.
+        """
+        if len(buffers) == 1:
+            self.sock.sendto(buffers[0], address)
+        else:
+            self.sock.sendmsg(buffers, (), 0, address)
+
+    def send(
+            self,
+            packets: List[Tuple[List[np.ndarray], Tuple[str, int]]],
+            messages: ctypes.Array = None,
+            interval: float = 0.0
+    ) -> None:
+        """
+        Send datagrams. A packet failing to send (e.g. to an unreachable host) does not stop the others, the first
+        error is raised after all packets were tried.
+        :param packets: list of (contiguous uint8 buffers forming one datagram, address)
+        :param messages: message vector from prepare() for exactly these packets, sent with sendmmsg
+        :param interval: time in seconds between packets, 0 sends all packets at once
+        """
+        errors = []
+        if interval > 0.0:
+            deadline = time.perf_counter()
+            for buffers, address in packets:
+                delay = deadline - time.perf_counter()
+                if delay > self.SPIN:
+                    time.sleep(delay - self.SPIN)
+                while time.perf_counter() < deadline:
+                    pass
+                self._try_sendto(buffers, address, errors)
+                deadline += interval
+        elif messages is None:
+            for buffers, address in packets:
+                self._try_sendto(buffers, address, errors)
+        else:
+            count = len(packets)
+            sent = 0
+            while sent < count:
+                result = _sendmmsg(self.sock.fileno(), ctypes.addressof(messages) + sent * ctypes.sizeof(_MMsgHdr),
+                                   count - sent, 0)
+                if result <= 0:
+                    # sendmmsg stops at a failing packet, sendto gets its error the same way as without batching
+                    self._try_sendto(*packets[sent], errors)
+                    result = 1
+                sent += result
+
+        if errors:
+            raise errors[0]
+
+    def _try_sendto(self, buffers: List[np.ndarray], address: Tuple[str, int], errors: List[OSError]) -> None:
+        """
+        Send one datagram, collecting an error instead of raising it.
+        """
+        try:
+            self._sendto(buffers, address)
+        except OSError as error:
+            errors.append(error)
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class _SharedPixels:
+    """
+    Pixel array in shared memory or a memory mapped file so several processes can render into one strip.
+    The pixels are preceded by a header holding a frame sequence number and a change counter per strip.
+    """
+    MAGIC = b'PLS1'
+    HEADER = np.dtype([
+        ('magic', 'S4'),
+        ('led_count', '<u4'),
+        ('strip_count', '<u4'),
+        ('dtype', 'S8'),
+        ('frame', '<u8'),
+    ])
+    # pixels start at a cache line boundary
+    ALIGNMENT = 64
+    # shared memory created by this process
+    CREATED_NAMES = set()
+    # time in seconds to wait for another process to finish creating the block
+    ATTACH_TIMEOUT = 1.0
+
+    def __init__(self, name: str, led_count: int, strip_count: int, dtype: str):
+        """
+        Create the block or attach to an existing one with the same layout.
+        :param name: shared memory name, or path of a file if it contains a path separator
+        :param led_count: amount of LEDs
+        :param strip_count: amount of strips
+        :param dtype: storage type of the pixels
+        """
+        self.name = name
+        pixels_offset = -(-(self.HEADER.itemsize + 8 * strip_count) // self.ALIGNMENT) * self.ALIGNMENT
+        size = pixels_offset + led_count * 3 * np.dtype(dtype).itemsize
+        self._shm = None
+        self._file = None
+        self._mmap = None
+        self._lock_file = None
+        deadline = time.monotonic() + self.ATTACH_TIMEOUT
+
+        if os.sep in name or (os.altsep is not None and os.altsep in name):
+            try:
+                # exclusive creation decides which process initializes the file
+                self._file = os.fdopen(os.open(name, os.O_RDWR | os.O_CREAT | os.O_EXCL), 'r+b')
+                self.created = True
+            except FileExistsError:
+                self._file = open(name, 'r+b')
+                # wait for the creating process to size the file, an empty file left behind is initialized here
+                self.created = not self._wait(lambda: os.fstat(self._file.fileno()).st_size > 0, deadline)
+            if self.created:
+                self._file.truncate(size)
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            buffer = self._mmap
+            self._lock_file = self._file
+        else:
+            if shared_memory is None:
+                raise RuntimeError('Shared memory needs Python 3.8 or newer, use a file path instead')
+            try:
+                self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+                self.created = True
+                self.CREATED_NAMES.add(name)
+            except FileExistsError:
+                self._shm = self._attach_shared_memory(name, deadline)
+                self.created = False
+                # the creating process owns the block, do not remove it when this process exits; the tracker
+                # knows POSIX blocks by their name with a leading slash
+                if name not in self.CREATED_NAMES and os.name == 'posix':
+                    resource_tracker.unregister('/' + self._shm.name, 'shared_memory')
+            buffer = self._shm.buf
+            if fcntl is not None:
+                self._lock_file = open(os.path.join(tempfile.gettempdir(), 'pyledstrip-%s.lock' % name), 'a+b')
+
+        if len(buffer) < size:
+            self._release()
+            raise ValueError('Shared pixels %r are smaller than expected' % name)
+
+        self.header = np.ndarray((), dtype=self.HEADER, buffer=buffer)
+        if self.created:
+            self.header['led_count'] = led_count
+            self.header['strip_count'] = strip_count
+            self.header['dtype'] = dtype.encode()
+            # written last, attaching processes wait for it
+            self.header['magic'] = self.MAGIC
+        else:
+            self._wait(lambda: self.header['magic'] == self.MAGIC, deadline)
+        if (self.header['magic'] != self.MAGIC or self.header['led_count'] != led_count
+              or self.header['strip_count'] != strip_count or self.header['dtype'] != dtype.encode()):
+            layout = (int(self.header['led_count']), int(self.header['strip_count']), self.header['dtype'][()].decode())
+            self.header = None
+            self._release()
+            raise ValueError('Shared pixels %r have a different layout (LEDs, strips, dtype): %s' % (name, layout))
+
+        self.sequences = np.ndarray((strip_count,), dtype='<u8', buffer=buffer, offset=self.HEADER.itemsize)
+        self.pixels = np.ndarray((led_count, 3), dtype=dtype, buffer=buffer, offset=pixels_offset)
+
+    def matches(self, name: str, led_count: int, strip_count: int, dtype: str) -> bool:
+        """
+        :return: True if the block has the given name and layout
+        """
+        return (self.name == name and self.pixels.shape[0] == led_count and len(self.sequences) == strip_count
+                and self.pixels.dtype == dtype)
+
+    @staticmethod
+    def _wait(condition, deadline: float) -> bool:
+        while not condition():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    @staticmethod
+    def _attach_shared_memory(name: str, deadline: float):
+        while True:
+            try:
+                return shared_memory.SharedMemory(name)
+            except ValueError:
+                # the creating process has not sized the block yet
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.001)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Serialize updates of the sequence numbers between processes. The lock file of a shared memory block is left
+        in the temporary directory, removing it while other processes hold it would break the lock.
+        """
+        if self._lock_file is None or fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _release(self) -> None:
+        if self._lock_file is not None and self._lock_file is not self._file:
+            self._lock_file.close()
+        self._lock_file = None
+        if self._shm is not None:
+            self._shm.close()
+            if self.created:
+                self._shm.unlink()
+                self.CREATED_NAMES.discard(self.name)
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+            if self.created:
+                os.remove(self.name)
+
+    def close(self) -> None:
+        """
+        Detach from the block, which is removed if this process created it.
+        """
+        self.header = None
+        self.sequences = None
+        self.pixels = None
+        self._release()
+
+
 class Protocol:
-    pass
+    """
+    Encoder of a wire format, owning the layout of the transmit buffer of a strip.
+    Subclasses describe their pixel layout with CHANNEL_ORDER and BYTES_PER_CHANNEL and override the hooks below
+    for headers and splitting into datagrams.
+    """
+    CONNECTION_TYPE = 'udp'
+    # Time the controller needs per LED and to latch a frame, limits the frame rate
+    LED_TIME = 0.0
+    LATCH_TIME = 0.0
+    # Bytes in front of the pixel data of the transmit buffer
+    DATA_OFFSET = 0
+    # Order of channels per LED on the wire, W is the white channel extracted from red, green and blue
+    CHANNEL_ORDER = 'RGB'
+    # 1 for 8 bit or 2 for 16 bit (big endian) channels
+    BYTES_PER_CHANNEL = 1
+    # Most LEDs the format can address per strip, None for no limit
+    MAX_LED_COUNT = None
+
+    @classmethod
+    def led_size(cls) -> int:
+        """
+        :return: amount of bytes per LED
+        """
+        return len(cls.CHANNEL_ORDER) * cls.BYTES_PER_CHANNEL
+
+    @classmethod
+    def buffer_size(cls, led_count: int) -> int:
+        """
+        :param led_count: amount of LEDs in the strip
+        :return: size of the transmit buffer
+        """
+        return cls.DATA_OFFSET + led_count * cls.led_size()
+
+    @classmethod
+    def write_header(cls, transmit_buffer: np.ndarray, led_count: int) -> None:
+        """
+        Write the constant part of a transmit buffer, called once when the buffer is allocated.
+        :param transmit_buffer: zeroed buffer of buffer_size() bytes
+        :param led_count: amount of LEDs in the strip
+        """
+        pass
+
+    @classmethod
+    def data(cls, transmit_buffer: np.ndarray, led_count: int) -> np.ndarray:
+        """
+        :param transmit_buffer: buffer of buffer_size() bytes
+        :param led_count: amount of LEDs in the strip
+        :return: view of the pixel data shaped (led_count, channels)
+        """
+        data = transmit_buffer[cls.DATA_OFFSET:]
+        if cls.BYTES_PER_CHANNEL == 2:
+            data = data.view('>u2')
+        return data.reshape((led_count, len(cls.CHANNEL_ORDER)))
+
+    @classmethod
+    def encode(cls, data: np.ndarray, pixels: np.ndarray) -> None:
+        """
+        Pack red, green and blue levels into the pixel data of a transmit buffer.
+        :param data: view returned by data()
+        :param pixels: levels shaped (led_count, 3), uint8 for 8 bit and uint16 for 16 bit channels
+        """
+        white = cls.CHANNEL_ORDER.find('W')
+        if white >= 0:
+            # white takes the common part of red, green and blue
+            np.minimum(pixels[:, 0], pixels[:, 1], out=data[:, white])
+            np.minimum(data[:, white], pixels[:, 2], out=data[:, white])
+
+        # write to buffer in strides per channel
+        for position, channel in enumerate(cls.CHANNEL_ORDER):
+            if channel == 'W':
+                continue
+            if white >= 0:
+                np.subtract(pixels[:, 'RGB'.index(channel)], data[:, white], out=data[:, position])
+            else:
+                data[:, position] = pixels[:, 'RGB'.index(channel)]
+
+    @classmethod
+    def decode(cls, data: np.ndarray, pixels: np.ndarray) -> None:
+        """
+        Unpack the pixel data of a transmit buffer into red, green and blue levels, the inverse of encode().
+        :param data: view returned by data()
+        :param pixels: output levels shaped (led_count, 3), uint8 for 8 bit and uint16 for 16 bit channels
+        """
+        for position, channel in enumerate(cls.CHANNEL_ORDER):
+            if channel != 'W':
+                pixels[:, 'RGB'.index(channel)] = data[:, position]
+        white = cls.CHANNEL_ORDER.find('W')
+        if white >= 0:
+            pixels += data[:, white:white + 1]
+
+    @classmethod
+    def packets(
+            cls,
+            transmit_buffer: np.ndarray,
+            led_count: int,
+            max_payload: int,
+            universe: int = 1
+    ) -> List[List[np.ndarray]]:
+        """
+        Split a transmit buffer into packets, each a list of buffers sent as one datagram.
+        :param transmit_buffer: encoded strip
+        :param led_count: amount of LEDs in the strip
+        :param max_payload: maximum datagram size
+        :param universe: first universe of the strip for protocols addressing universes
+        :return: list of packets
+        """
+        return [[transmit_buffer]]
+
+    @classmethod
+    def leds_per_packet(cls, max_payload: int) -> Union[int, None]:
+        """
+        :param max_payload: maximum datagram size
+        :return: amount of LEDs per packet when packets() splits strips by max_payload, otherwise None
+        """
+        return None
+
+    @classmethod
+    def addresses(cls, ip: str, port: int, packet_count: int, universe: int = 1) -> List[Tuple[str, int]]:
+        """
+        Destination of each packet returned by packets().
+        :param ip: IP address of the strip
+        :param port: port of the strip
+        :param packet_count: amount of packets
+        :param universe: first universe of the strip
+        :return: list of addresses
+        """
+        return [(ip, port)] * packet_count
+
+    @classmethod
+    def next_frame(cls, packets: List[List[np.ndarray]], frame: int) -> None:
+        """
+        Update packet headers before a frame is sent.
+        :param packets: packets returned by packets()
+        :param frame: frame counter of the strip
+        """
+        pass
 
 
 # Protocol specified by ESP8266 I2S WS2812 Driver
 # https://github.com/cnlohr/esp8266ws2812i2s
 class ProtocolEsp(Protocol):
     CONNECTION_TYPE = 'udp'
+    LED_TIME = 30e-6
+    LATCH_TIME = 300e-6
     DATA_OFFSET = 3
-    RED_OFFSET = 1
-    GREEN_OFFSET = 0
-    BLUE_OFFSET = 2
-    LED_COUNT_HIGH_BYTE = None
-    LED_COUNT_LOW_BYTE = None
+    CHANNEL_ORDER = 'GRB'
+
+
+# ESP8266 I2S WS2812 Driver built for SK6812 RGBW strips
+class ProtocolEspRgbw(ProtocolEsp):
+    LED_TIME = 40e-6
+    CHANNEL_ORDER = 'GRBW'
+
+
+# ESP8266 I2S WS2812 Driver protocol split into datagrams fitting the MTU, for firmware accepting an offset header:
+# byte 0: bit 7 set on the last fragment of a frame (display), bits 0-6 frame counter
+# bytes 1-2: index of the first LED in the fragment (big endian)
+class ProtocolEspFragmented(ProtocolEsp):
+    DATA_OFFSET = 0
+    HEADER_SIZE = 3
+    LAST_FRAGMENT = 0x80
+    # the first LED of a fragment is sent in 16 bits
+    MAX_LED_COUNT = 65536
+
+    @classmethod
+    def packets(
+            cls,
+            transmit_buffer: np.ndarray,
+            led_count: int,
+            max_payload: int,
+            universe: int = 1
+    ) -> List[List[np.ndarray]]:
+        led_size = cls.led_size()
+        leds_per_packet = cls.leds_per_packet(max_payload)
+        packets = []
+        for start in range(0, led_count, leds_per_packet):
+            end = min(start + leds_per_packet, led_count)
+            header = np.array([0, start >> 8, start & 0xff], dtype=np.uint8)
+            packets.append([header, transmit_buffer[start * led_size:end * led_size]])
+        if packets:
+            packets[-1][0][0] = cls.LAST_FRAGMENT
+        return packets
+
+    @classmethod
+    def leds_per_packet(cls, max_payload: int) -> Union[int, None]:
+        return (max_payload - cls.HEADER_SIZE) // cls.led_size()
+
+    @classmethod
+    def next_frame(cls, packets: List[List[np.ndarray]], frame: int) -> None:
+        for header, _ in packets:
+            header[0] = (header[0] & cls.LAST_FRAGMENT) | (frame & 0x7f)
+
+
+# Protocol specified by Open Pixel Control
+# http://openpixelcontrol.org
+class ProtocolOpc(Protocol):
+    CONNECTION_TYPE = 'tcp'
+    DATA_OFFSET = 4
+    CHANNEL_ORDER = 'RGB'
+    LED_COUNT_HIGH_BYTE = 2
+    LED_COUNT_LOW_BYTE = 3
+    # the length field holds the amount of data bytes in 16 bits
+    MAX_LED_COUNT = 0xffff // 3
+
+    @classmethod
+    def write_header(cls, transmit_buffer: np.ndarray, led_count: int) -> None:
+        # length of the pixel data in bytes
+        size = led_count * cls.led_size()
+        transmit_buffer[cls.LED_COUNT_HIGH_BYTE] = size >> 8
+        transmit_buffer[cls.LED_COUNT_LOW_BYTE] = size & 0xff
+
+
+# Distributed Display Protocol
+# http://www.3waylabs.com/ddp/
+# 10 byte header per datagram: flags (version 1, push on the last datagram of a frame), 4 bit sequence number,
+# data type, destination id (display), byte offset of the data (32 bit) and data length (16 bit)
+class ProtocolDdp(Protocol):
+    CONNECTION_TYPE = 'udp'
+    CHANNEL_ORDER = 'RGB'
+    HEADER = struct.Struct('>BBBBIH')
+    VERSION = 0x40
+    PUSH = 0x01
+    # data type bits: 00 TTT SSS, TTT 001 for RGB, SSS 011 for 8 bit
+    DATA_TYPE = 0x0b
+    DESTINATION_DISPLAY = 0x01
+    # Payload most senders and receivers agree on (480 RGB LEDs)
+    MAX_DATA = 1440
+
+    @classmethod
+    def packets(
+            cls,
+            transmit_buffer: np.ndarray,
+            led_count: int,
+            max_payload: int,
+            universe: int = 1
+    ) -> List[List[np.ndarray]]:
+        led_size = cls.led_size()
+        leds_per_packet = cls.leds_per_packet(max_payload)
+        packets = []
+        for start in range(0, led_count, leds_per_packet):
+            end = min(start + leds_per_packet, led_count)
+            header = np.frombuffer(bytearray(cls.HEADER.pack(
+                cls.VERSION, 0, cls.DATA_TYPE, cls.DESTINATION_DISPLAY, start * led_size, (end - start) * led_size)),
+                dtype=np.uint8)
+            packets.append([header, transmit_buffer[start * led_size:end * led_size]])
+        if packets:
+            packets[-1][0][0] |= cls.PUSH
+        return packets
+
+    @classmethod
+    def leds_per_packet(cls, max_payload: int) -> Union[int, None]:
+        return min(max_payload - cls.HEADER.size, cls.MAX_DATA) // cls.led_size()
+
+    @classmethod
+    def next_frame(cls, packets: List[List[np.ndarray]], frame: int) -> None:
+        # sequence numbers run from 1 to 15, 0 means not used
+        sequence = (frame - 1) % 15 + 1
+        for header, _ in packets:
+            header[1] = sequence
+
+
+class ProtocolDdpRgbw(ProtocolDdp):
+    CHANNEL_ORDER = 'RGBW'
+    # TTT 011 for RGBW
+    DATA_TYPE = 0x1b
+
+
+class ProtocolDdp16Bit(ProtocolDdp):
+    BYTES_PER_CHANNEL = 2
+    # SSS 100 for 16 bit
+    DATA_TYPE = 0x0c
+
+
+# ANSI E1.31 (Streaming ACN), one DMX universe per datagram starting at the universe of the strip
+# https://tsp.esta.org/tsp/documents/published_docs.php
+class ProtocolE131(Protocol):
+    CONNECTION_TYPE = 'udp'
+    CHANNEL_ORDER = 'RGB'
+    # root layer, framing layer and DMP layer up to and including the DMX start code
+    HEADER = struct.Struct('>HH12sHI16sHI64sBHBBHHBBHHHB')
+    SEQUENCE_BYTE = 111
+    DMX_SLOTS = 512
+    MIN_UNIVERSE = 1
+    MAX_UNIVERSE = 63999
+    PRIORITY = 100
+    SOURCE_NAME = b'pyledstrip'
+
+    @classmethod
+    def _header(cls, universe: int, length: int) -> np.ndarray:
+        """
+        :param universe: DMX universe
+        :param length: amount of DMX slots following the header
+        :return: data packet header
+        """
+        size = cls.HEADER.size + length
+        header = cls.HEADER.pack(
+            0x0010, 0x0000, b'ASC-E1.17', 0x7000 | (size - 16), 0x00000004, _E131_CID,
+            0x7000 | (size - 38), 0x00000002, cls.SOURCE_NAME, cls.PRIORITY, 0, 0, 0, universe,
+            0x7000 | (size - 115), 0x02, 0xa1, 0x0000, 0x0001, length + 1, 0x00)
+        return np.frombuffer(bytearray(header), dtype=np.uint8)
+
+    @classmethod
+    def packets(
+            cls,
+            transmit_buffer: np.ndarray,
+            led_count: int,
+            max_payload: int,
+            universe: int = 1
+    ) -> List[List[np.ndarray]]:
+        led_size = cls.led_size()
+        leds_per_universe = cls.DMX_SLOTS // led_size
+        packets = []
+        for start in range(0, led_count, leds_per_universe):
+            end = min(start + leds_per_universe, led_count)
+            if not cls.MIN_UNIVERSE <= universe <= cls.MAX_UNIVERSE:
+                raise ValueError('Universe %d out of range %d to %d' % (
+                    universe, cls.MIN_UNIVERSE, cls.MAX_UNIVERSE))
+            packets.append([
+                cls._header(universe, (end - start) * led_size),
+                transmit_buffer[start * led_size:end * led_size]
+            ])
+            universe += 1
+        return packets
+
+    @classmethod
+    def next_frame(cls, packets: List[List[np.ndarray]], frame: int) -> None:
+        sequence = frame & 0xff
+        for header, _ in packets:
+            header[cls.SEQUENCE_BYTE] = sequence
+
+
+class ProtocolE131Rgbw(ProtocolE131):
+    CHANNEL_ORDER = 'RGBW'
+
+
+# E1.31 sent to the multicast group of each universe (239.255.universe high byte.universe low byte), ip is ignored
+class ProtocolE131Multicast(ProtocolE131):
+    @classmethod
+    def addresses(cls, ip: str, port: int, packet_count: int, universe: int = 1) -> List[Tuple[str, int]]:
+        return [('239.255.%d.%d' % (u >> 8, u & 0xff), port) for u in range(universe, universe + packet_count)]
+
+
+# Art-Net ArtDmx, one DMX universe (port-address) per datagram starting at the universe of the strip
+# https://art-net.org.uk
+class ProtocolArtNet(Protocol):
+    CONNECTION_TYPE = 'udp'
+    CHANNEL_ORDER = 'RGB'
+    # id, opcode (little endian), protocol version, sequence, physical, port-address (little endian), length
+    HEADER = struct.Struct('>8s2sHBB2sH')
+    OP_DMX = b'\x00\x50'
+    PROTOCOL_VERSION = 14
+    SEQUENCE_BYTE = 12
+    DMX_SLOTS = 512
+    MIN_UNIVERSE = 0
+    MAX_UNIVERSE = 32767
+
+    @classmethod
+    def packets(
+            cls,
+            transmit_buffer: np.ndarray,
+            led_count: int,
+            max_payload: int,
+            universe: int = 1
+    ) -> List[List[np.ndarray]]:
+        led_size = cls.led_size()
+        leds_per_universe = cls.DMX_SLOTS // led_size
+        packets = []
+        for start in range(0, led_count, leds_per_universe):
+            end = min(start + leds_per_universe, led_count)
+            if not cls.MIN_UNIVERSE <= universe <= cls.MAX_UNIVERSE:
+                raise ValueError('Universe %d out of range %d to %d' % (
+                    universe, cls.MIN_UNIVERSE, cls.MAX_UNIVERSE))
+            length = (end - start) * led_size
+            packet = [transmit_buffer[start * led_size:end * led_size]]
+            # the DMX data length has to be even
+            if length % 2:
+                packet.append(np.zeros(1, dtype=np.uint8))
+                length += 1
+            header = np.frombuffer(bytearray(cls.HEADER.pack(
+                b'Art-Net', cls.OP_DMX, cls.PROTOCOL_VERSION, 0, 0, struct.pack('<H', universe), length)),
+                dtype=np.uint8)
+            packets.append([header] + packet)
+            universe += 1
+        return packets
+
+    @classmethod
+    def next_frame(cls, packets: List[List[np.ndarray]], frame: int) -> None:
+        # sequence numbers run from 1 to 255, 0 disables reordering
+        sequence = (frame - 1) % 255 + 1
+        for packet in packets:
+            packet[0][cls.SEQUENCE_BYTE] = sequence
+
+
+class ProtocolArtNetRgbw(ProtocolArtNet):
+    CHANNEL_ORDER = 'RGBW'
+
+
+PROTOCOLS = {
+    'esp': ProtocolEsp,
+    'esp_rgbw': ProtocolEspRgbw,
+    'esp_fragmented': ProtocolEspFragmented,
+    'opc': ProtocolOpc,
+    'ddp': ProtocolDdp,
+    'ddp_rgbw': ProtocolDdpRgbw,
+    'ddp_16bit': ProtocolDdp16Bit,
+    'e131': ProtocolE131,
+    'e131_rgbw': ProtocolE131Rgbw,
+    'e131_multicast': ProtocolE131Multicast,
+    'artnet': ProtocolArtNet,
+    'artnet_rgbw': ProtocolArtNetRgbw,
+}
+
+INTERPOLATION_KERNELS = ('linear', 'triangle', 'gaussian')
+
+# Storage types of pixels: floating point in range(0.0, 1.0) or 8 bit levels (adding saturates immediately)
+PIXEL_DTYPES = ('float64', 'float32', 'uint8')
+
+# Blend modes of compositor layers
+BLEND_MODES = ('add', 'alpha', 'max', 'multiply')
+
+# Merging of frames from several relay clients: highest priority (then latest) source or highest level per channel
+MERGE_MODES = ('priority', 'max')
+
+# Contents of recordings: encoded transmit buffers (replayed without encoding) or pixels as 8 bit levels
+RECORDING_CONTENTS = ('buffers', 'pixels')
+
+# IPv4 and UDP header size, subtracted from the MTU to get the maximum datagram payload
+UDP_OVERHEAD = 28
+
+# Resolution of the calibration lookup tables (input levels per channel)
+CALIBRATION_LUT_SIZE = 4096
+
+# Default entries of palette lookup tables (hue sweeps, gradients, effects)
+PALETTE_SIZE = 1024
+
+# E1.31 component identifier of this sender
+_E131_CID = uuid.uuid4().bytes
+
+# Upper bounds in seconds of the timing histogram buckets reported by LedStrip.stats()
+STATS_BUCKETS = (1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 1e-1, 2e-1, 5e-1, float('inf'))
+
+
+def _hsv_to_rgb_scalar(hue: float, saturation: float, value: float) -> Tuple[float, float, float]:
+    """
+    hsv_to_rgb of a single color in plain Python, numpy only pays off for arrays.
+    :param hue: hue in range(0.0, 1.0), wraps around
+    :param saturation: saturation in range(0.0, 1.0)
+    :param value: value in range(0.0, 1.0)
+    :return: red, green and blue in range(0.0, 1.0)
+    """
+    hue = (hue % 1.0) * 6.0
+    chroma = value * saturation
+    low = value - chroma
+    fraction = hue - int(hue)
+    sector = int(hue) % 6
+    if sector == 0:
+        return value, low + chroma * fraction, low
+    if sector == 1:
+        return value - chroma * fraction, value, low
+    if sector == 2:
+        return low, value, low + chroma * fraction
+    if sector == 3:
+        return low, value - chroma * fraction, value
+    if sector == 4:
+        return low + chroma * fraction, low, value
+    return value, low, value - chroma * fraction
+
+
+def hsv_to_rgb(hsv: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Vectorized equivalent of colorsys.hsv_to_rgb for arrays of shape (..., 3).
+    Every channel is a clamped piecewise linear function of the hue, no per sector selection needed.
+    :param hsv: hue (wraps around), saturation and value in range(0.0, 1.0)
+    :param out: array of the same shape receiving the result, may be hsv itself
+    :return: red, green and blue in range(0.0, 1.0)
+    """
+    hsv = np.asarray(hsv, dtype=float)
+    if out is None:
+        out = np.empty(hsv.shape)
+    hue = np.remainder(hsv[..., 0], 1.0)
+    hue *= 6.0
+    chroma = hsv[..., 1] * hsv[..., 2]
+    low = hsv[..., 2] - chroma
+    weight = np.empty(hue.shape)
+
+    # weight of red is |hue - 3| - 1, of green 2 - |hue - 2| and of blue 2 - |hue - 4|, clamped to range(0, 1)
+    for channel, (center, factor, offset) in enumerate(((3.0, 1.0, -1.0), (2.0, -1.0, 2.0), (4.0, -1.0, 2.0))):
+        np.subtract(hue, center, out=weight)
+        np.abs(weight, out=weight)
+        weight *= factor
+        weight += offset
+        np.clip(weight, 0.0, 1.0, out=weight)
+        np.multiply(weight, chroma, out=out[..., channel])
+        out[..., channel] += low
+    return out
+
+
+def rgb_to_hsv(rgb: np.ndarray) -> np.ndarray:
+    """
+    Vectorized equivalent of colorsys.rgb_to_hsv for arrays of shape (..., 3).
+    :param rgb: red, green and blue in range(0.0, 1.0)
+    :return: hue, saturation and value in range(0.0, 1.0), hue and saturation 0.0 where undefined
+    """
+    rgb = np.asarray(rgb, dtype=float)
+    red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    value = rgb.max(axis=-1)
+    delta = value - rgb.min(axis=-1)
+    saturation = np.divide(delta, value, out=np.zeros(value.shape), where=value > 0.0)
+
+    # distance of every channel from the maximum relative to the range, see colorsys
+    chromatic = delta > 0.0
+    distance = np.divide(value[..., None] - rgb, delta[..., None], out=np.zeros(rgb.shape), where=chromatic[..., None])
+    hue = np.where(red == value, distance[..., 2] - distance[..., 1],
+                   np.where(green == value, 2.0 + distance[..., 0] - distance[..., 2],
+                            4.0 + distance[..., 1] - distance[..., 0]))
+    hue = np.remainder(hue / 6.0, 1.0)
+    hue[~chromatic] = 0.0
+    return np.stack((hue, saturation, value), axis=-1)
+
+
+def hsl_to_rgb(hsl: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Vectorized conversion of hue, saturation and lightness, equivalent to colorsys.hls_to_rgb in a different order.
+    :param hsl: hue (wraps around), saturation and lightness in range(0.0, 1.0) in arrays of shape (..., 3)
+    :param out: array of the same shape receiving the result, may be hsl itself
+    :return: red, green and blue in range(0.0, 1.0)
+    """
+    hsl = np.asarray(hsl, dtype=float)
+    lightness = hsl[..., 2]
+    value = lightness + hsl[..., 1] * np.minimum(lightness, 1.0 - lightness)
+    # saturation of the hsv color, 0.0 for black
+    ratio = np.divide(lightness, value, out=np.ones(value.shape), where=value > 0.0)
+    hsv = np.stack((hsl[..., 0], 2.0 * (1.0 - ratio), value), axis=-1)
+    return hsv_to_rgb(hsv, hsv if out is None else out)
+
+
+def rgb_to_hsl(rgb: np.ndarray) -> np.ndarray:
+    """
+    Vectorized conversion to hue, saturation and lightness, equivalent to colorsys.rgb_to_hls in a different order.
+    :param rgb: red, green and blue in range(0.0, 1.0) in arrays of shape (..., 3)
+    :return: hue, saturation and lightness in range(0.0, 1.0), hue and saturation 0.0 where undefined
+    """
+    hsv = rgb_to_hsv(rgb)
+    value = hsv[..., 2]
+    lightness = value * (1.0 - hsv[..., 1] * 0.5)
+    limit = np.minimum(lightness, 1.0 - lightness)
+    hsv[..., 1] = np.divide(value - lightness, limit, out=np.zeros(limit.shape), where=limit > 0.0)
+    hsv[..., 2] = lightness
+    return hsv
+
+
+def kelvin_to_rgb(kelvin: np.ndarray) -> np.ndarray:
+    """
+    Vectorized approximation of the color of a black body (Tanner Helland's fit of the CIE 1964 10 degree color
+    matching functions), normalized to the brightest channel.
+    :param kelvin: color temperatures in range(1000, 40000), 6600 is about white
+    :return: red, green and blue in range(0.0, 1.0) in an array of shape kelvin.shape + (3,)
+    """
+    temperature = np.clip(np.asarray(kelvin, dtype=float), 1000.0, 40000.0) / 100.0
+    warm = temperature <= 66.0
+    # the other branch of np.where is evaluated too, keep logarithm and power arguments positive
+    above = np.maximum(temperature - 60.0, 1.0)
+    rgb = np.empty(temperature.shape + (3,))
+    rgb[..., 0] = np.where(warm, 255.0, 329.698727446 * above ** -0.1332047592)
+    rgb[..., 1] = np.where(warm, 99.4708025861 * np.log(temperature) - 161.1195681661,
+                           288.1221695283 * above ** -0.0755148492)
+    rgb[..., 2] = np.where(temperature >= 66.0, 255.0,
+                           np.where(temperature <= 19.0, 0.0,
+                                    138.5177312231 * np.log(np.maximum(temperature - 10.0, 1.0)) - 305.0447927307))
+    np.clip(rgb, 0.0, 255.0, out=rgb)
+    rgb /= 255.0
+    return rgb
+
+
+@functools.lru_cache(maxsize=32)
+def hue_palette(size: int = PALETTE_SIZE, saturation: float = 1.0, value: float = 1.0) -> np.ndarray:
+    """
+    Lookup table of a full hue circle, cached and read-only.
+    :param size: amount of entries
+    :param saturation: saturation in range(0.0, 1.0)
+    :param value: value in range(0.0, 1.0)
+    :return: array of shape (size, 3)
+    """
+    hsv = np.empty((size, 3))
+    hsv[:, 0] = np.arange(size) / size
+    hsv[:, 1] = saturation
+    hsv[:, 2] = value
+    table = hsv_to_rgb(hsv, hsv)
+    table.flags.writeable = False
+    return table
+
+
+def _color_tuple(colors) -> Tuple[Tuple[float, float, float], ...]:
+    """
+    Hashable form of one or more rgb colors, used as key of the cached tables.
+    """
+    return tuple(tuple(float(channel) for channel in color) for color in np.asarray(colors, dtype=float).reshape(-1, 3))
+
+
+@functools.lru_cache(maxsize=32)
+def _gradient_table(colors: Tuple[Tuple[float, float, float], ...], size: int, cyclic: bool) -> np.ndarray:
+    stops = np.array(colors, dtype=float).reshape(-1, 3)
+    if cyclic:
+        stops = np.concatenate((stops, stops[:1]))
+        positions = np.arange(size) / size
+    else:
+        positions = np.arange(size) / max(size - 1, 1)
+    stop_positions = np.linspace(0.0, 1.0, len(stops))
+    table = np.column_stack([np.interp(positions, stop_positions, stops[:, channel]) for channel in range(3)])
+    table.flags.writeable = False
+    return table
+
+
+def gradient_palette(colors, size: int = PALETTE_SIZE, cyclic: bool = False) -> np.ndarray:
+    """
+    Lookup table of a linear gradient through equally spaced colors, cached and read-only.
+    :param colors: rgb colors in range(0.0, 1.0)
+    :param size: amount of entries
+    :param cyclic: blend the last color back into the first one instead of ending on it
+    :return: array of shape (size, 3)
+    """
+    return _gradient_table(_color_tuple(colors), size, cyclic)
+
+
+def palette_lookup(palette: np.ndarray, index: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Colors of the nearest palette entries below indices.
+    :param palette: array of shape (size, 3)
+    :param index: palette indices in range(0.0, 1.0), wrapping around
+    :param out: array of shape index.shape + (3,) receiving the result
+    :return: rgb colors
+    """
+    entries = np.floor(np.multiply(index, len(palette))).astype(np.intp)
+    # wrap mode also avoids np.take buffering the whole output array
+    return np.take(palette, entries, axis=0, out=out, mode='wrap')
+
+
+def hue_to_rgb(hue: np.ndarray, saturation=1.0, value=1.0, *, size: int = PALETTE_SIZE,
+               out: np.ndarray = None) -> np.ndarray:
+    """
+    Hue sweeps through a cached hue_palette instead of computing every color, accurate to the palette resolution.
+    :param hue: hues in range(0.0, 1.0), wrapping around
+    :param saturation: saturation in range(0.0, 1.0), scalar or broadcast against hue
+    :param value: value in range(0.0, 1.0), scalar or broadcast against hue
+    :param size: entries of the hue palette
+    :param out: array of shape hue.shape + (3,) receiving the result
+    :return: red, green and blue in range(0.0, 1.0)
+    """
+    rgb = palette_lookup(hue_palette(size), hue, out)
+    if np.any(np.not_equal(saturation, 1.0)) or np.any(np.not_equal(value, 1.0)):
+        # value - value * saturation * (1 - rgb) for colors of the fully saturated hue
+        chroma = np.multiply(saturation, value)
+        low = np.subtract(value, chroma)
+        for channel in range(3):
+            rgb[..., channel] *= chroma
+            rgb[..., channel] += low
+    return rgb
+
+
+class _Timing:
+    """
+    Count, sum, maximum and histogram of measured durations.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+        self.histogram = [0] * len(STATS_BUCKETS)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[bisect.bisect_left(STATS_BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'last': self.last,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'histogram': list(self.histogram),
+        }
+
+
+class _Stats:
+    """
+    Frame timing and network health counters of a LedStrip, only allocated while collect_stats is enabled.
+    """
+    # weight of the latest frame interval in the smoothed frame rate
+    FPS_SMOOTHING = 0.1
+
+    def __init__(self, strip_count: int):
+        self.started = time.perf_counter()
+        self.frames = 0
+        self.dropped_frames = 0
+        self.encode = _Timing()
+        self.interval = _Timing()
+        self.smoothed_interval = None
+        self.last_frame_time = None
+        self.frame_send_time = 0.0
+        self.frame_bytes = 0
+        self.frame_strips = 0
+        self.strip_send = [_Timing() for _ in range(strip_count)]
+        self.strip_bytes = [0] * strip_count
+        self.strip_dropped = [0] * strip_count
+        self.strip_errors = [0] * strip_count
+        self.strip_connects = [0] * strip_count
+        self.strip_connect_failures = [0] * strip_count
+
+    def strip_sent(self, strip_index: int, seconds: float, size: int) -> None:
+        self.strip_send[strip_index].add(seconds)
+        self.strip_bytes[strip_index] += size
+        self.frame_send_time += seconds
+        self.frame_bytes += size
+        self.frame_strips += 1
+
+    def strip_failed(self, strip_index: int, connect: bool = False) -> None:
+        if connect:
+            self.strip_connect_failures[strip_index] += 1
+        else:
+            self.strip_errors[strip_index] += 1
+        self.strip_dropped[strip_index] += 1
+
+    def frame_done(self, encode_time: float) -> dict:
+        """
+        Count a frame after its strips were sent.
+        :param encode_time: time in seconds taken to update the transmit buffers
+        :return: record of the frame passed to the stats callback
+        """
+        now = time.perf_counter()
+        self.frames += 1
+        self.encode.add(encode_time)
+        if self.last_frame_time is not None:
+            interval = now - self.last_frame_time
+            self.interval.add(interval)
+            if self.smoothed_interval is None:
+                self.smoothed_interval = interval
+            else:
+                self.smoothed_interval += self.FPS_SMOOTHING * (interval - self.smoothed_interval)
+        self.last_frame_time = now
+
+        record = {
+            'frame': self.frames,
+            'encode_time': encode_time,
+            'send_time': self.frame_send_time,
+            'bytes_sent': self.frame_bytes,
+            'strips_sent': self.frame_strips,
+        }
+        self.frame_send_time = 0.0
+        self.frame_bytes = 0
+        self.frame_strips = 0
+        return record
+
+    def snapshot(self) -> dict:
+        return {
+            'elapsed': time.perf_counter() - self.started,
+            'frames': self.frames,
+            'dropped_frames': self.dropped_frames,
+            'fps': 1.0 / self.smoothed_interval if self.smoothed_interval else 0.0,
+            'bytes_sent': sum(self.strip_bytes),
+            'encode_time': self.encode.snapshot(),
+            'frame_interval': self.interval.snapshot(),
+            'histogram_buckets': list(STATS_BUCKETS),
+            'strips': [{
+                'send_time': self.strip_send[i].snapshot(),
+                'bytes_sent': self.strip_bytes[i],
+                'dropped_frames': self.strip_dropped[i],
+                'send_errors': self.strip_errors[i],
+                'connects': self.strip_connects[i],
+                'reconnects': max(self.strip_connects[i] - 1, 0),
+                'connect_failures': self.strip_connect_failures[i],
+            } for i in range(len(self.strip_bytes))],
+        }
+
+
+class FrameClock:
+    """
+    Paces a render loop to a fixed frame rate against a monotonic clock.
+    Deadlines advance by a fixed interval so sleep inaccuracies do not accumulate. A frame finishing after its
+    deadline counts as missed, when more than a whole interval late the schedule restarts instead of bursting.
+    """
+
+    def __init__(
+            self,
+            fps: float,
+            *,
+            min_interval: float = 0.0,
+            spin: float = 0.0005,
+            on_missed: Callable[[float], None] = None,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        :param fps: requested frames per second
+        :param min_interval: minimum time between frames in seconds, lowers fps if necessary
+        :param spin: time in seconds to busy wait before a deadline instead of sleeping (precision vs. cpu use)
+        :param on_missed: called with the lateness in seconds when a deadline was missed
+        :param clock: monotonic time source
+        :param sleep: sleep function
+        """
+        assert fps > 0.0
+        self.interval = max(1.0 / fps, min_interval)
+        self.spin = spin
+        self.on_missed = on_missed
+        self.frame = 0
+        self.missed_deadlines = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._start = None
+        self._deadline = None
+
+    fps = property(
+        fget=lambda self: 1.0 / self.interval,
+        doc='Effective frames per second'
+    )
+
+    time = property(
+        fget=lambda self: 0.0 if self._start is None else self._deadline - self._start,
+        doc='Scheduled time of the current frame in seconds since the first tick'
+    )
+
+    def tick(self) -> None:
+        """
+        Wait until the next frame is due.
+        """
+        now = self._clock()
+        if self._deadline is None:
+            self._start = now
+            self._deadline = now
+
+        self._deadline += self.interval
+        self.frame += 1
+        delay = self._deadline - now
+        if delay < 0.0:
+            self.missed_deadlines += 1
+            if self.on_missed is not None:
+                self.on_missed(-delay)
+            if -delay > self.interval:
+                self._deadline = now
+            return
+
+        if delay > self.spin:
+            self._sleep(delay - self.spin)
+        while self._clock() < self._deadline:
+            pass
+
+
+class Mapping:
+    """
+    Coordinates of LEDs for effects working in 2D or 3D space instead of strip positions.
+    Points hold an (x, y, z) coordinate per LED position, LEDs with NaN coordinates are not mapped. Index and
+    coordinate arrays of the mapped LEDs are computed once, so effects assign whole images or vectorized functions of
+    the coordinates with a single fancy indexed assignment.
+    """
+
+    def __init__(self, points: np.ndarray, source: str = None):
+        """
+        :param points: array of shape (led_count, 2) or (led_count, 3) with a coordinate per LED position
+        :param source: file the points were loaded from
+        """
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[1] not in (2, 3):
+            raise ValueError('Mapping points need shape (led_count, 2) or (led_count, 3), got %s' % (points.shape,))
+        if points.shape[1] == 2:
+            points = np.column_stack([points, np.zeros(len(points))])
+        self.points = points
+        self.source = source
+        mapped = ~np.isnan(points).any(axis=1)
+        self.indices = np.flatnonzero(mapped)
+        # all LEDs mapped in order: assign to the whole pixel array instead of indexing
+        self.complete = len(self.indices) == len(points)
+        coordinates = points[self.indices]
+        self.x = coordinates[:, 0].copy()
+        self.y = coordinates[:, 1].copy()
+        self.z = coordinates[:, 2].copy()
+        self._image_indices = {}
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __repr__(self) -> str:
+        if self.source is not None:
+            return 'Mapping(%r)' % self.source
+        return 'Mapping(<%d LEDs>)' % len(self)
+
+    bounds = property(
+        fget=lambda self: (np.array([self.x.min(), self.y.min(), self.z.min()]),
+                           np.array([self.x.max(), self.y.max(), self.z.max()])),
+        doc='Minimum and maximum (x, y, z) coordinate of the mapped LEDs'
+    )
+
+    @classmethod
+    def grid(
+            cls,
+            width: int,
+            height: int,
+            depth: int = 1,
+            *,
+            serpentine: bool = False,
+            columns: bool = False,
+            offset: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+    ) -> 'Mapping':
+        """
+        Matrix (or stack of matrices) wired row by row starting at the top left, y grows downwards like in images.
+        :param width: LEDs per row
+        :param height: LEDs per column
+        :param depth: amount of matrices stacked along z
+        :param serpentine: every other row (or column) runs backwards, as in zigzag wired matrices
+        :param columns: wired column by column instead of row by row
+        :param offset: coordinate of the top left LED, places several matrices next to each other
+        """
+        index = np.arange(width * height * depth)
+        z, index = np.divmod(index, width * height)
+        line_length = height if columns else width
+        line, step = np.divmod(index, line_length)
+        if serpentine:
+            step = np.where(line % 2 == 1, line_length - 1 - step, step)
+        x, y = (line, step) if columns else (step, line)
+        return cls(np.column_stack([x, y, z]) + np.asarray(offset, dtype=float))
+
+    @classmethod
+    def load(cls, path: str) -> 'Mapping':
+        """
+        Read points from a JSON list of [x, y] or [x, y, z] coordinates (null for unmapped LEDs) or a CSV file with
+        one x,y or x,y,z line per LED position (nan for unmapped LEDs, lines starting with # are ignored).
+        :param path: JSON or CSV file
+        """
+        if path.endswith('.json'):
+            with open(path) as file:
+                points = [[float('nan')] * 3 if point is None else point for point in json.load(file)]
+            if any(len(point) == 2 for point in points):
+                points = [point + [0.0] if len(point) == 2 else point for point in points]
+        else:
+            points = np.loadtxt(path, delimiter=',', comments='#', ndmin=2)
+        return cls(points, source=path)
+
+    @classmethod
+    def concatenate(cls, mappings: List['Mapping']) -> 'Mapping':
+        """
+        :param mappings: mappings of consecutive strips
+        :return: mapping of all strips
+        """
+        return cls(np.concatenate([mapping.points for mapping in mappings]))
+
+    def image_indices(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        Find the image cell nearest to each mapped LED, the bounds of the mapping are stretched to the image.
+        :param shape: (height, width) of a 2D or (depth, height, width) of a 3D image
+        :return: flat index into the image per mapped LED
+        """
+        shape = tuple(shape)
+        indices = self._image_indices.get(shape)
+        if indices is None:
+            cells = []
+            for coordinate, size in zip((self.x, self.y, self.z), reversed(shape)):
+                low, high = coordinate.min(), coordinate.max()
+                scale = (size - 1) / (high - low) if high > low else 0.0
+                cells.append(np.rint((coordinate - low) * scale).astype(np.intp))
+            indices = np.ravel_multi_index(tuple(reversed(cells)), shape)
+            self._image_indices[shape] = indices
+        return indices
+
+
+class LedStrip:
+    """
+    Class managing led strip state information (e.g. connection information, color information before transmit)
+
+    Pixel methods and transmit() are meant to be called from a single rendering thread. With threaded enabled,
+    encoding and sending happen in a background thread working on a copy of the pixels taken by transmit(), so
+    the rendering thread may modify pixels right after transmit() returns. Parameter setters may be called from
+    the rendering thread at any time, they wait for a send in progress to finish.
+    """
+
+    @_synchronized
+    def _refresh_parameters(self) -> None:
+        """
+        Build consistent parameter list from possibly ambiguous user inputs
+        """
+        # Transform all strip parameters for lists
+        if isinstance(self._led_count, int):
+            self._led_counts = [self._led_count]
+        else:
+            self._led_counts = self._led_count
+
+        if isinstance(self._ip, str):
+            self._ips = [self._ip]
+        else:
+            self._ips = self._ip
+
+        if isinstance(self._port, int):
+            self._ports = [self._port]
+        else:
+            self._ports = self._port
+
+        if isinstance(self._protocol, List):
+            self._protocols = self._protocol
+        else:
+            self._protocols = [self._protocol]
+
+        self._protocols = [PROTOCOLS[p] if isinstance(p, str) else p for p in self._protocols]
+
+        if isinstance(self._flip, bool):
+            self._flips = [self._flip]
+        else:
+            self._flips = self._flip
+
+        if isinstance(self._universe, int):
+            self._universes = [self._universe]
+        else:
+            self._universes = self._universe
+
+        if isinstance(self._power_group, int):
+            self._power_groups = [self._power_group]
+        else:
+            self._power_groups = self._power_group
+
+        if isinstance(self._gamma, (int, float)):
+            self._gammas = [self._gamma]
+        else:
+            self._gammas = self._gamma
+
+        if isinstance(self._white_balance[0], (int, float)):
+            self._white_balances = [self._white_balance]
+        else:
+            self._white_balances = self._white_balance
+
+        # A strip is defined by a set of ip and port
+        self._strip_count = max(len(self._ips), len(self._ports))
+
+        # Make all lists equal in length
+        if len(self._ips) < self._strip_count:
+            self._ips = self._ips + [self._ips[0]] * (self._strip_count - len(self._ips))
+
+        if len(self._ports) < self._strip_count:
+            self._ports = self._ports + [self._ports[0]] * (self._strip_count - len(self._ports))
+
+        if len(self._protocols) < self._strip_count:
+            self._protocols = self._protocols + [self._protocols[0]] * (self._strip_count - len(self._protocols))
+
+        if len(self._led_counts) > self._strip_count:
+            self._led_counts = self._led_counts[:self._strip_count]
+        elif len(self._led_counts) < self._strip_count:
+            self._led_counts = self._led_counts * self._strip_count
+
+        if len(self._flips) > self._strip_count:
+            self._flips = self._flips[:self._strip_count]
+        elif len(self._flips) < self._strip_count:
+            self._flips = self._flips * self._strip_count
+
+        if len(self._universes) > self._strip_count:
+            self._universes = self._universes[:self._strip_count]
+        elif len(self._universes) < self._strip_count:
+            self._universes = self._universes * self._strip_count
+
+        if len(self._power_groups) > self._strip_count:
+            self._power_groups = self._power_groups[:self._strip_count]
+        elif len(self._power_groups) < self._strip_count:
+            self._power_groups = self._power_groups + [self._power_groups[0]] * (
+                self._strip_count - len(self._power_groups))
+
+        if len(self._gammas) > self._strip_count:
+            self._gammas = self._gammas[:self._strip_count]
+        elif len(self._gammas) < self._strip_count:
+            self._gammas = self._gammas * self._strip_count
+
+        if len(self._white_balances) > self._strip_count:
+            self._white_balances = self._white_balances[:self._strip_count]
+        elif len(self._white_balances) < self._strip_count:
+            self._white_balances = self._white_balances * self._strip_count
+
+        for protocol, led_count in zip(self._protocols, self._led_counts):
+            if protocol.MAX_LED_COUNT is not None and led_count > protocol.MAX_LED_COUNT:
+                raise ValueError('%s supports up to %d LEDs per strip, got %d' % (
+                    protocol.__name__, protocol.MAX_LED_COUNT, led_count))
+            leds_per_packet = protocol.leds_per_packet(self._mtu - UDP_OVERHEAD)
+            if leds_per_packet is not None and leds_per_packet < 1:
+                raise ValueError('MTU %d leaves no room for an LED in a %s datagram' % (self._mtu, protocol.__name__))
+
+        # keep the current colors when only the storage of the pixels changes
+        previous = self._pixels if self._total_led_count == sum(self._led_counts) else None
+        self._total_led_count = sum(self._led_counts)
+        shared = self._shared_pixels
+        if self._shared_memory is not None:
+            if shared is None or not shared.matches(
+                    self._shared_memory, self._total_led_count, self._strip_count, self._pixel_dtype):
+                if previous is not None:
+                    previous = np.array(previous)
+                self._pixels = None
+                self._close_shared_pixels()
+                shared = _SharedPixels(self._shared_memory, self._total_led_count, self._strip_count,
+                                       self._pixel_dtype)
+                if shared.created and previous is not None:
+                    shared.pixels[:] = self._convert_pixels(previous, self._pixel_dtype)
+                self._shared_pixels = shared
+                self._shared_sequences = shared.sequences.copy()
+                self._pixels = shared.pixels
+        else:
+            if shared is not None:
+                if previous is not None:
+                    previous = np.array(previous)
+                self._pixels = None
+                self._close_shared_pixels()
+            if previous is None:
+                self._pixels = np.zeros((self._total_led_count, 3), dtype=self._pixel_dtype)
+            else:
+                self._pixels = self._convert_pixels(previous, self._pixel_dtype)
+        self._integer_pixels = self._pixel_dtype == 'uint8'
+
+        # Preallocated scratch space so _update_buffers does not allocate per frame,
+        # integer pixels are scaled in fixed point (8.8 levels times 257 fit into 32 bits)
+        if self._integer_pixels:
+            self._scratch_pixels = np.empty(self._pixels.shape, dtype=np.uint32)
+        else:
+            self._scratch_pixels = np.empty_like(self._pixels)
+        self._scratch_bytes = np.empty(self._pixels.shape, dtype=np.uint8)
+        # 16 bit levels are only computed if a protocol uses them
+        if any(p.BYTES_PER_CHANNEL == 2 for p in self._protocols):
+            self._scratch_wide = np.empty(self._pixels.shape, dtype=np.uint16)
+        else:
+            self._scratch_wide = None
+        # power per pixel and strip in one type so the reduction needs no casting buffers
+        if self._integer_pixels:
+            self._scratch_power = np.empty(self._total_led_count, dtype=np.uint32)
+        else:
+            self._scratch_power = np.empty(self._total_led_count, dtype=self._pixel_dtype)
+
+        self._strip_ranges = []
+        self._transmit_buffers = []
+        self._transmit_data = []
+        self._strip_packets = []
+        self._strip_addresses = []
+        start = 0
+        for strip_index, led_count in enumerate(self._led_counts):
+            protocol = self._protocols[strip_index]
+            self._strip_ranges.append((start, start + led_count))
+            start += led_count
+
+            transmit_buffer = np.zeros(protocol.buffer_size(led_count), dtype=np.uint8)
+            protocol.write_header(transmit_buffer, led_count)
+
+            self._transmit_buffers.append(transmit_buffer)
+            self._transmit_data.append(protocol.data(transmit_buffer, led_count))
+            packets = protocol.packets(
+                transmit_buffer, led_count, self._mtu - UDP_OVERHEAD, self._universes[strip_index])
+            self._strip_packets.append(packets)
+            self._strip_addresses.append(protocol.addresses(
+                self._ips[strip_index], self._ports[strip_index], len(packets), self._universes[strip_index]))
+
+        # Change tracking per strip, only changed strips are encoded and sent
+        self._strip_starts = np.array([start for start, _ in self._strip_ranges])
+        self._strip_ends = [end for _, end in self._strip_ranges]
+        self._strip_dirty = np.ones(self._strip_count, dtype=bool)
+        self._strip_unsent = np.ones(self._strip_count, dtype=bool)
+        self._strip_sent_times = np.zeros(self._strip_count)
+        self._strip_sent_bytes = [
+            sum(b.nbytes for packet in packets for b in packet) if p.CONNECTION_TYPE == 'udp' else buffer.nbytes
+            for p, packets, buffer in zip(self._protocols, self._strip_packets, self._transmit_buffers)]
+        self._strip_power = np.zeros(self._strip_count, dtype=self._scratch_power.dtype)
+        self._strip_frames = [0 for _ in self._led_counts]
+        self._strip_brightness = np.full(self._strip_count, np.nan)
+
+        # Power supply groups, strips without a group of their own share the first one
+        self._strip_groups = np.array(self._power_groups, dtype=np.intp)
+        if (self._strip_groups < 0).any():
+            raise ValueError('Power groups need non-negative ids, got %s' % self._power_groups)
+        self._group_count = int(self._strip_groups.max()) + 1
+        self._group_led_counts = np.bincount(
+            self._strip_groups, weights=self._led_counts, minlength=self._group_count)
+        if self._max_amps is None:
+            self._group_max_amps = None
+        else:
+            max_amps = [self._max_amps] if isinstance(self._max_amps, (int, float)) else self._max_amps
+            if len(max_amps) < self._group_count:
+                max_amps = max_amps + [max_amps[-1]] * (self._group_count - len(max_amps))
+            self._group_max_amps = np.array(max_amps[:self._group_count], dtype=float)
+
+        self._socks = [None for _ in self._led_counts]
+        self._udp_strips = [i for i, p in enumerate(self._protocols) if p.CONNECTION_TYPE == 'udp']
+        self._udp_positions = {}
+        for strip_index in self._udp_strips:
+            first = sum(len(p) for p in self._udp_positions.values())
+            self._udp_positions[strip_index] = list(range(first, first + len(self._strip_packets[strip_index])))
+        self._udp_messages = None
+        self._udp_messages_prepared = False
+        # connections of transmit_async may belong to strips that changed
+        self._close_async_connections()
+        self._async_writers = [None for _ in self._led_counts]
+        self._async_connects = [None for _ in self._led_counts]
+        if self._stats is not None and len(self._stats.strip_bytes) != self._strip_count:
+            self._stats = _Stats(self._strip_count)
+
+        self._refresh_calibration()
+        self._refresh_frame_buffers()
+        self._refresh_mapping()
+
+    def _refresh_mapping(self) -> None:
+        """
+        Combine the mappings of all strips and find the strips with mapped LEDs.
+        """
+        if self._mappings is None:
+            self._strip_mapping = None
+            self._mapping_strips = None
+            return
+
+        if len(self._mappings) == 1:
+            self._strip_mapping = self._mappings[0]
+        else:
+            self._strip_mapping = Mapping.concatenate(self._mappings)
+        if len(self._strip_mapping) == self._total_led_count:
+            self._mapping_strips = np.zeros(self._strip_count, dtype=bool)
+            self._mapping_strips[np.searchsorted(self._strip_ends, self._strip_mapping.indices, side='right')] = True
+        else:
+            self._mapping_strips = None
+
+    @staticmethod
+    def _convert_pixels(pixels: np.ndarray, dtype: str) -> np.ndarray:
+        """
+        Convert pixels to another storage type keeping their colors.
+        :param pixels: pixel array
+        :param dtype: one of PIXEL_DTYPES
+        :return: pixels unchanged if they already have the storage type, converted copy otherwise
+        """
+        if pixels.dtype == dtype:
+            return pixels
+        if dtype == 'uint8':
+            return (np.clip(pixels, 0.0, 1.0) * 255.0).astype(np.uint8)
+        if pixels.dtype == np.uint8:
+            return (pixels / 255.0).astype(dtype)
+        return pixels.astype(dtype)
+
+    def _close_shared_pixels(self) -> None:
+        """
+        Detach from shared pixels, the caller has to drop all views of them first.
+        """
+        if self._shared_pixels is not None:
+            self._shared_pixels.close()
+            self._shared_pixels = None
+            self._shared_sequences = None
+
+    def _collect_shared_changes(self) -> None:
+        """
+        Mark strips changed by processes sharing the pixels.
+        """
+        if self._shared_pixels is None:
+            return
+        # compare a snapshot so increments happening meanwhile are seen next time
+        sequences = self._shared_pixels.sequences.copy()
+        self._strip_dirty |= sequences != self._shared_sequences
+        self._shared_sequences = sequences
+
+    def commit(self) -> None:
+        """
+        Publish changed strips to the process transmitting shared pixels and count a frame.
+        Rendering processes call this instead of transmit(), without shared_memory it does nothing.
+        """
+        shared = self._shared_pixels
+        if shared is None:
+            return
+        with shared.locked():
+            shared.sequences[self._strip_dirty] += 1
+            shared.header['frame'] += 1
+        self._strip_dirty[:] = False
+
+    frame_sequence = property(
+        fget=lambda self: 0 if self._shared_pixels is None else int(self._shared_pixels.header['frame']),
+        doc='Amount of frames committed to shared pixels'
+    )
+
+    def _refresh_frame_buffers(self) -> None:
+        """
+        Allocate the pixel copies handed over to the sender thread
+        """
+        with self._frame_condition:
+            if self._threaded:
+                self._pending_pixels = np.empty_like(self._pixels)
+                self._sending_pixels = np.empty_like(self._pixels)
+            else:
+                self._pending_pixels = None
+                self._sending_pixels = None
+            self._frame_pending = False
+            self._pending_dirty = np.zeros(self._strip_count, dtype=bool)
+            self._frame_generation += 1
+
+    @_synchronized
+    def _refresh_calibration(self) -> None:
+        """
+        Precompute lookup tables for gamma correction, white balance and dithering
+        """
+        self._strip_dirty[:] = True
+        self._calibrated = self._dither or any(
+            g != 1.0 or any(w != 1.0 for w in wb) for g, wb in zip(self._gammas, self._white_balances))
+        if not self._calibrated:
+            self._calibration_lut = None
+            self._calibration_offsets = None
+            self._calibration_indices = None
+            self._calibration_levels = None
+            self._dither_phase = None
+            return
+
+        # One table per strip and channel holding output levels in 8.8 fixed point,
+        # flattened so the whole frame is converted by a single np.take
+        inputs = np.linspace(0.0, 1.0, CALIBRATION_LUT_SIZE)
+        tables = []
+        offsets = np.empty((self._total_led_count, 3), dtype=np.intp)
+        for strip_index, (start, end) in enumerate(self._strip_ranges):
+            curve = np.power(inputs, self._gammas[strip_index])
+            for channel in range(3):
+                levels = curve * self._white_balances[strip_index][channel] * 255.0 * 256.0
+                tables.append(np.clip(np.rint(levels), 0, 255 * 256))
+                offsets[start:end, channel] = (strip_index * 3 + channel) * CALIBRATION_LUT_SIZE
+        self._calibration_lut = np.concatenate(tables).astype(np.intp)
+        self._calibration_offsets = offsets
+        self._calibration_indices = np.empty((self._total_led_count, 3), dtype=np.intp)
+        self._calibration_levels = np.empty((self._total_led_count, 3), dtype=np.intp)
+
+        if self._dither:
+            # fixed random threshold per pixel, advanced by a golden ratio step every frame
+            self._dither_phase = np.random.RandomState(0).randint(
+                0, 256, (self._total_led_count, 3)).astype(np.intp)
+        else:
+            self._dither_phase = None
+
+    # Public variables
+    def _set_led_count(self, led_count: Union[int, List[int]]) -> None:
+        self._led_count = led_count
+        self._refresh_parameters()
+
+    led_count = property(
+        fget=lambda self: self._total_led_count,
+        fset=_set_led_count,
+        doc='Amount of LEDs'
+    )
+
+    def _set_ip(self, ip: Union[str, List[str]]) -> None:
+        self._ip = ip
+        self._refresh_parameters()
+
+    ip = property(
+        fget=lambda self: self._ip,
+        fset=_set_ip,
+        doc='IP address used when transmit is called'
+    )
+
+    def _set_port(self, port: Union[int, List[int]]) -> None:
+        self._port = port
+        self._refresh_parameters()
+
+    port = property(
+        fget=lambda self: self._port,
+        fset=_set_port,
+        doc='Port used when transmit is called'
+    )
+
+    def _set_protocol(self, protocol: Union[Protocol, List[Protocol]]) -> None:
+        self._protocol = protocol
+        self._refresh_parameters()
+
+    protocol = property(
+        fget=lambda self: self._protocol,
+        fset=_set_protocol,
+        doc='Protocol used when transmit is called'
+    )
+
+    def _set_flip(self, flip: Union[bool, List[bool]]) -> None:
+        self._flip = flip
+        self._refresh_parameters()
+
+    flip = property(
+        fget=lambda self: self._flip,
+        fset=_set_flip,
+        doc='Flip LED positions, use led_count - pos - 1 as position'
+    )
+
+    def _set_universe(self, universe: Union[int, List[int]]) -> None:
+        self._universe = universe
+        self._refresh_parameters()
+
+    universe = property(
+        fget=lambda self: self._universe,
+        fset=_set_universe,
+        doc='First DMX universe of a strip for protocols addressing universes (E1.31, Art-Net)'
+    )
+
+    def _set_pixel_dtype(self, pixel_dtype: str) -> None:
+        if pixel_dtype not in PIXEL_DTYPES:
+            raise ValueError('Unknown pixel dtype %r, expected one of %s' % (pixel_dtype, ', '.join(PIXEL_DTYPES)))
+        self._pixel_dtype = pixel_dtype
+        self._refresh_parameters()
+
+    pixel_dtype = property(
+        fget=lambda self: self._pixel_dtype,
+        fset=_set_pixel_dtype,
+        doc='Storage type of pixels, one of PIXEL_DTYPES'
+    )
+
+    def _set_shared_memory(self, shared_memory: Union[str, None]) -> None:
+        self._shared_memory = shared_memory
+        self._refresh_parameters()
+
+    shared_memory = property(
+        fget=lambda self: self._shared_memory,
+        fset=_set_shared_memory,
+        doc='Name of shared memory (or path of a file) holding the pixels, None for private pixels'
+    )
+
+    def _set_mapping(self, mapping: Union[Mapping, str, List[Union[Mapping, str]], None]) -> None:
+        self._mapping = mapping
+        if mapping is None:
+            self._mappings = None
+        else:
+            self._mappings = [Mapping.load(m) if isinstance(m, str) else m
+                              for m in (mapping if isinstance(mapping, list) else [mapping])]
+        self._refresh_mapping()
+
+    mapping = property(
+        fget=lambda self: self._mapping,
+        fset=_set_mapping,
+        doc='Mapping (or file of a mapping) of all LEDs or a list of one per strip, None for no mapping'
+    )
+
+    def _set_power_limit(self, power_limit: float) -> None:
+        assert power_limit >= 0.0
+        assert power_limit <= 1.0
+        self._power_limit = power_limit
+        self._strip_dirty[:] = True
+
+    power_limit = property(
+        fget=lambda self: self._power_limit,
+        fset=_set_power_limit,
+        doc='Limit total power used by LED strip'
+    )
+
+    def _set_power_group(self, power_group: Union[int, List[int]]) -> None:
+        self._power_group = power_group
+        self._refresh_parameters()
+
+    power_group = property(
+        fget=lambda self: self._power_group,
+        fset=_set_power_group,
+        doc='Power supply group of a strip, power is limited per group'
+    )
+
+    def _set_max_amps(self, max_amps: Union[float, List[float], None]) -> None:
+        self._max_amps = max_amps
+        self._refresh_parameters()
+
+    max_amps = property(
+        fget=lambda self: self._max_amps,
+        fset=_set_max_amps,
+        doc='Current limit in amperes per power supply group, None limits by power_limit instead'
+    )
+
+    def _set_amps_per_channel(self, amps_per_channel: float) -> None:
+        assert amps_per_channel > 0.0
+        self._amps_per_channel = amps_per_channel
+
+    amps_per_channel = property(
+        fget=lambda self: self._amps_per_channel,
+        fset=_set_amps_per_channel,
+        doc='Current in amperes of a single fully lit color channel'
+    )
+
+    def _set_idle_amps(self, idle_amps: float) -> None:
+        assert idle_amps >= 0.0
+        self._idle_amps = idle_amps
+
+    idle_amps = property(
+        fget=lambda self: self._idle_amps,
+        fset=_set_idle_amps,
+        doc='Current in amperes of a single LED when off'
+    )
+
+    def _set_packet_interval(self, packet_interval: float) -> None:
+        assert packet_interval >= 0.0
+        self._packet_interval = packet_interval
+
+    packet_interval = property(
+        fget=lambda self: self._packet_interval,
+        fset=_set_packet_interval,
+        doc='Time in seconds between UDP packets, 0 sends all strips in one batch'
+    )
+
+    def _set_mtu(self, mtu: int) -> None:
+        if mtu <= UDP_OVERHEAD:
+            raise ValueError('MTU has to exceed the IP and UDP headers of %d bytes, got %d' % (UDP_OVERHEAD, mtu))
+        self._mtu = mtu
+        self._refresh_parameters()
+
+    mtu = property(
+        fget=lambda self: self._mtu,
+        fset=_set_mtu,
+        doc='Maximum transmission unit used by protocols splitting strips into several datagrams'
+    )
+
+    def _set_keepalive(self, keepalive: float) -> None:
+        assert keepalive >= 0.0
+        self._keepalive = keepalive
+
+    keepalive = property(
+        fget=lambda self: self._keepalive,
+        fset=_set_keepalive,
+        doc='Resend unchanged strips after this amount of seconds, 0 to send every frame, inf to only send changes'
+    )
+
+    def _set_gamma(self, gamma: Union[float, List[float]]) -> None:
+        self._gamma = gamma
+        self._refresh_parameters()
+
+    gamma = property(
+        fget=lambda self: self._gamma,
+        fset=_set_gamma,
+        doc='Gamma exponent applied to colors before transmit'
+    )
+
+    def _set_white_balance(self, white_balance: Union[List[float], List[List[float]]]) -> None:
+        self._white_balance = white_balance
+        self._refresh_parameters()
+
+    white_balance = property(
+        fget=lambda self: self._white_balance,
+        fset=_set_white_balance,
+        doc='Red, green and blue gains applied to colors before transmit'
+    )
+
+    min_frame_interval = property(
+        fget=lambda self: max(
+            c * p.LED_TIME + p.LATCH_TIME for c, p in zip(self._led_counts, self._protocols)),
+        doc='Minimum time in seconds between frames the slowest strip can display'
+    )
+
+    def _set_threaded(self, threaded: bool) -> None:
+        if threaded == self._threaded:
+            return
+
+        if threaded:
+            self._threaded = True
+            self._refresh_frame_buffers()
+            self._sender_thread = threading.Thread(target=self._sender_loop, name='pyledstrip-sender', daemon=True)
+            self._sender_thread.start()
+        else:
+            with self._frame_condition:
+                self._threaded = False
+                self._frame_condition.notify()
+            self._sender_thread.join()
+            self._sender_thread = None
+            self._refresh_frame_buffers()
+            # the last frame handed over may not have been encoded
+            self._strip_dirty[:] = True
+
+    threaded = property(
+        fget=lambda self: self._threaded,
+        fset=_set_threaded,
+        doc='Encode and send in a background thread, transmit() only hands over a copy of the pixels'
+    )
+
+    def _set_collect_stats(self, collect_stats: bool) -> None:
+        with self._transmit_lock:
+            if not collect_stats:
+                self._stats = None
+            elif self._stats is None:
+                self._stats = _Stats(self._strip_count)
+
+    collect_stats = property(
+        fget=lambda self: self._stats is not None,
+        fset=_set_collect_stats,
+        doc='Collect frame timing and network statistics, see stats()'
+    )
+
+    def _set_dither(self, dither: bool) -> None:
+        self._dither = dither
+        self._refresh_calibration()
+
+    dither = property(
+        fget=lambda self: self._dither,
+        fset=_set_dither,
+        doc='Temporally dither the fractional part of calibrated colors'
+    )
+
+    def __init__(
+            self,
+            *,
+            config: Union[str, configparser.ConfigParser] = None,
+            led_count: Union[int, List[int]] = None,
+            ip: Union[str, List[str]] = None,
+            port: Union[int, List[int]] = None,
+            protocol: Union[Protocol, List[Protocol]] = None,
+            flip: Union[bool, List[bool]] = None,
+            universe: Union[int, List[int]] = None,
+            power_limit: float = None,
+            power_group: Union[int, List[int]] = None,
+            max_amps: Union[float, List[float]] = None,
+            amps_per_channel: float = None,
+            idle_amps: float = None,
+            loop: bool = None,
+            gamma: Union[float, List[float]] = None,
+            white_balance: Union[List[float], List[List[float]]] = None,
+            dither: bool = None,
+            threaded: bool = None,
+            keepalive: float = None,
+            packet_interval: float = None,
+            mtu: int = None,
+            pixel_dtype: str = None,
+            shared_memory: str = None,
+            collect_stats: bool = None,
+            stats_callback: Callable[[dict], None] = None,
+            mapping: Union[Mapping, str, List[Union[Mapping, str]]] = None,
+            args=None
+    ):
+        """
+        :param config: configuration file
+        :param led_count: amount of LEDs (used for power and loop calculation)
+        :param ip: IP address used when transmit is called
+        :param port: Port used when transmit is called
+        :param protocol: Protocol used when transmit is called
+        :param flip: Flip LED positions, use led_count - pos - 1 as position
+        :param universe: first DMX universe of a strip for protocols addressing universes
+        :param power_limit: limit power use running the LED strip on a small power source
+        :param power_group: power supply group of a strip, power is limited per group
+        :param max_amps: current limit in amperes per power supply group, replaces power_limit
+        :param amps_per_channel: current in amperes of a single fully lit color channel
+        :param idle_amps: current in amperes of a single LED when off
+        :param loop: loop positions modulo led_count
+        :param gamma: gamma exponent applied to colors before transmit
+        :param white_balance: red, green and blue gains applied to colors before transmit
+        :param dither: temporally dither the fractional part of calibrated colors
+        :param threaded: encode and send in a background thread
+        :param keepalive: resend unchanged strips after this amount of seconds
+        :param packet_interval: time in seconds between UDP packets to avoid bursts
+        :param mtu: maximum transmission unit for protocols splitting strips into several datagrams
+        :param pixel_dtype: storage type of pixels, one of PIXEL_DTYPES
+        :param shared_memory: name of shared memory (or path of a file) holding the pixels
+        :param collect_stats: collect frame timing and network statistics, see stats()
+        :param stats_callback: called with a record of every frame while collecting statistics
+        :param mapping: coordinates of the LEDs, a Mapping or JSON/CSV file, or a list of them per strip
+        :param args: argparse arguments
+        """
+
+        # Property variables per strip
+        self._led_count = 300
+        self._ip = '192.168.4.1'
+        self._port = 7777
+        self._protocol = ProtocolEsp
+        self._flip = False
+        self._universe = 1
+        self._gamma = 1.0
+        self._white_balance = [1.0, 1.0, 1.0]
+
+        # Instance variables
+        self.loop = False
+        self._power_limit = 0.2
+        self._power_group = 0
+        self._max_amps = None
+        self._amps_per_channel = 0.02
+        self._idle_amps = 0.001
+        self._dither = False
+        self._threaded = False
+        self._keepalive = 1.0
+        self._packet_interval = 0.0
+        self._mtu = 1500
+        self._pixel_dtype = 'float64'
+        self._shared_memory = None
+        self.stats_callback = None
+        self._mapping = None
+
+        # Misc private variables
+        self._stats = None
+        self._mappings = None
+        self._strip_mapping = None
+        self._mapping_strips = None
+        self._udp_sender = None
+        self._udp_strips = None
+        self._udp_positions = None
+        self._udp_messages = None
+        self._udp_messages_prepared = False
+        self._transmit_lock = threading.RLock()
+        self._frame_condition = threading.Condition()
+        self._sender_thread = None
+        self._sender_error = None
+        self._pending_pixels = None
+        self._sending_pixels = None
+        self._frame_pending = False
+        self._pending_dirty = None
+        self._frame_generation = 0
+        self._socks = None
+        self._async_udp_transport = None
+        self._async_writers = None
+        self._async_connects = None
+        self._strip_count = None
+        self._total_led_count = None
+        self._led_counts = None
+        self._ips = None
+        self._ports = None
+        self._protocols = None
+        self._flips = None
+        self._universes = None
+        self._power_groups = None
+        self._gammas = None
+        self._white_balances = None
+        self._pixels = None
+        self._integer_pixels = False
+        self._shared_pixels = None
+        self._shared_sequences = None
+        self._scratch_pixels = None
+        self._scratch_bytes = None
+        self._scratch_wide = None
+        self._scratch_power = None
+        self._strip_ranges = None
+        self._transmit_buffers = None
+        self._transmit_data = None
+        self._strip_packets = None
+        self._strip_addresses = None
+        self._strip_frames = None
+        self._strip_starts = None
+        self._strip_ends = None
+        self._strip_dirty = None
+        self._strip_unsent = None
+        self._strip_sent_times = None
+        self._strip_sent_bytes = None
+        self._strip_power = None
+        self._strip_brightness = None
+        self._strip_groups = None
+        self._group_count = None
+        self._group_led_counts = None
+        self._group_max_amps = None
+        self._calibrated = False
+        self._calibration_lut = None
+        self._calibration_offsets = None
+        self._calibration_indices = None
+        self._calibration_levels = None
+        self._dither_phase = None
+        self._dither_frame = 0
+
+        self._refresh_parameters()
+
+        self.set_parameters(
+            config=config,
+            led_count=led_count,
+            ip=ip,
+            port=port,
+            protocol=protocol,
+            flip=flip,
+            universe=universe,
+            power_limit=power_limit,
+            power_group=power_group,
+            max_amps=max_amps,
+            amps_per_channel=amps_per_channel,
+            idle_amps=idle_amps,
+            loop=loop,
+            gamma=gamma,
+            white_balance=white_balance,
+            dither=dither,
+            threaded=threaded,
+            keepalive=keepalive,
+            packet_interval=packet_interval,
+            mtu=mtu,
+            pixel_dtype=pixel_dtype,
+            shared_memory=shared_memory,
+            collect_stats=collect_stats,
+            stats_callback=stats_callback,
+            mapping=mapping,
+            args=args
+        )
+
+    def set_parameters(
+            self,
+            *,
+            config: Union[str, configparser.ConfigParser] = None,
+            led_count: Union[int, List[int]] = None,
+            ip: Union[str, List[str]] = None,
+            port: Union[int, List[int]] = None,
+            protocol: Union[Protocol, List[Protocol]] = None,
+            flip: Union[bool, List[bool]] = None,
+            universe: Union[int, List[int]] = None,
+            power_limit: float = None,
+            power_group: Union[int, List[int]] = None,
+            max_amps: Union[float, List[float]] = None,
+            amps_per_channel: float = None,
+            idle_amps: float = None,
+            loop: bool = False,
+            gamma: Union[float, List[float]] = None,
+            white_balance: Union[List[float], List[List[float]]] = None,
+            dither: bool = None,
+            threaded: bool = None,
+            keepalive: float = None,
+            packet_interval: float = None,
+            mtu: int = None,
+            pixel_dtype: str = None,
+            shared_memory: str = None,
+            collect_stats: bool = None,
+            stats_callback: Callable[[dict], None] = None,
+            mapping: Union[Mapping, str, List[Union[Mapping, str]]] = None,
+            args=None
+    ) -> None:
+        """
+        :param config: configuration file
+        :param led_count: amount of LEDs (used for power and loop calculation)
+        :param ip: IP address used when transmit is called
+        :param port: Port used when transmit is called
+        :param protocol: Protocol used when transmit is called
+        :param flip: Flip LED positions, use led_count - pos - 1 as position
+        :param universe: first DMX universe of a strip for protocols addressing universes
+        :param power_limit: used to limit power use when running the LED strip on a small power source
+        :param power_group: power supply group of a strip, power is limited per group
+        :param max_amps: current limit in amperes per power supply group, replaces power_limit
+        :param amps_per_channel: current in amperes of a single fully lit color channel
+        :param idle_amps: current in amperes of a single LED when off
+        :param loop: loop positions modulo led_count
+        :param gamma: gamma exponent applied to colors before transmit
+        :param white_balance: red, green and blue gains applied to colors before transmit
+        :param dither: temporally dither the fractional part of calibrated colors
+        :param threaded: encode and send in a background thread
+        :param keepalive: resend unchanged strips after this amount of seconds
+        :param packet_interval: time in seconds between UDP packets to avoid bursts
+        :param mtu: maximum transmission unit for protocols splitting strips into several datagrams
+        :param pixel_dtype: storage type of pixels, one of PIXEL_DTYPES
+        :param shared_memory: name of shared memory (or path of a file) holding the pixels
+        :param collect_stats: collect frame timing and network statistics, see stats()
+        :param stats_callback: called with a record of every frame while collecting statistics
+        :param mapping: coordinates of the LEDs, a Mapping or JSON/CSV file, or a list of them per strip
+        :param args: argparse arguments
+        """
+        configs = [config]
+        if args is not None and args.config is not None:
+            configs.append(args.config)
+
+        self.read_configs(configs)
+
+        if args is not None:
+            self.read_args(args)
+
+        if led_count is not None:
+            self.led_count = led_count
+
+        if ip is not None:
+            self.ip = ip
+
+        if port is not None:
+            self.port = port
+
+        if protocol is not None:
+            self.protocol = protocol
+
+        if flip is not None:
+            self.flip = flip
+
+        if universe is not None:
+            self.universe = universe
+
+        if power_limit is not None:
+            self.power_limit = power_limit
+
+        if power_group is not None:
+            self.power_group = power_group
+
+        if max_amps is not None:
+            self.max_amps = max_amps
+
+        if amps_per_channel is not None:
+            self.amps_per_channel = amps_per_channel
+
+        if idle_amps is not None:
+            self.idle_amps = idle_amps
+
+        if loop is not None:
+            self.loop = loop
+
+        if gamma is not None:
+            self.gamma = gamma
+
+        if white_balance is not None:
+            self.white_balance = white_balance
+
+        if dither is not None:
+            self.dither = dither
+
+        if threaded is not None:
+            self.threaded = threaded
+
+        if keepalive is not None:
+            self.keepalive = keepalive
+
+        if packet_interval is not None:
+            self.packet_interval = packet_interval
+
+        if mtu is not None:
+            self.mtu = mtu
+
+        if pixel_dtype is not None:
+            self.pixel_dtype = pixel_dtype
+
+        if shared_memory is not None:
+            self.shared_memory = shared_memory
+
+        if collect_stats is not None:
+            self.collect_stats = collect_stats
+
+        if stats_callback is not None:
+            self.stats_callback = stats_callback
+
+        if mapping is not None:
+            self.mapping = mapping
+
+    def read_configs(self, configs: List[Union[str, configparser.ConfigParser]]) -> None:
+        """
+        :param configs: configuration files
+        """
+        config = configparser.ConfigParser()
+        global_config_file = os.path.expanduser('~/.pyledstrip.ini')
+        if os.path.exists(global_config_file):
+            config.read(global_config_file)
+        for input_config in configs:
+            if isinstance(input_config, str):
+                # Assume config file name was passed
+                config_file = input_config
+                config.read(config_file)
+            elif input_config is not None:
+                # Any actual ConfigParser object overrides the current config
+                # completely.
+                config = input_config
+
+        if 'pyledstrip' not in config:
+            print('Section "pyledstrip" not found in config')
+            return
+
+        section = config['pyledstrip']
+
+        if 'led_count' in section:
+            self.led_count = [int(p) for p in shlex.split(section.get('led_count'))]
+
+        if 'ip' in section:
+            self.ip = shlex.split(section.get('ip'))
+
+        if 'port' in section:
+            self.port = [int(p) for p in shlex.split(section.get('port'))]
+
+        if 'protocol' in section:
+            self.protocol = [PROTOCOLS[p] for p in shlex.split(section.get('protocol'))]
+
+        if 'flip' in section:
+            self.flip = [bool(f) for f in shlex.split(section.get('flip'))]
+
+        if 'universe' in section:
+            self.universe = [int(u) for u in shlex.split(section.get('universe'))]
+
+        if 'power_limit' in section:
+            self.power_limit = section.getfloat('power_limit')
+
+        if 'power_group' in section:
+            self.power_group = [int(g) for g in shlex.split(section.get('power_group'))]
+
+        if 'max_amps' in section:
+            self.max_amps = [float(a) for a in shlex.split(section.get('max_amps'))]
+
+        if 'amps_per_channel' in section:
+            self.amps_per_channel = section.getfloat('amps_per_channel')
+
+        if 'idle_amps' in section:
+            self.idle_amps = section.getfloat('idle_amps')
+
+        if 'loop' in section:
+            self.loop = section.getboolean('loop')
+
+        if 'gamma' in section:
+            self.gamma = [float(g) for g in shlex.split(section.get('gamma'))]
+
+        if 'white_balance' in section:
+            self.white_balance = self._group_white_balance(
+                [float(w) for w in shlex.split(section.get('white_balance'))])
+
+        if 'dither' in section:
+            self.dither = section.getboolean('dither')
+
+        if 'threaded' in section:
+            self.threaded = section.getboolean('threaded')
+
+        if 'keepalive' in section:
+            self.keepalive = section.getfloat('keepalive')
+
+        if 'packet_interval' in section:
+            self.packet_interval = section.getfloat('packet_interval')
+
+        if 'mtu' in section:
+            self.mtu = section.getint('mtu')
+
+        if 'pixel_dtype' in section:
+            self.pixel_dtype = section.get('pixel_dtype')
+
+        if 'shared_memory' in section:
+            self.shared_memory = section.get('shared_memory')
+
+        if 'collect_stats' in section:
+            self.collect_stats = section.getboolean('collect_stats')
+
+        if 'mapping' in section:
+            mappings = shlex.split(section.get('mapping'))
+            self.mapping = mappings[0] if len(mappings) == 1 else mappings
+
+    def read_args(self, args) -> None:
+        """
+        :param args: argparse arguments
+        """
+        if args.led_count is not None:
+            self.led_count = args.led_count
+
+        if args.ip is not None:
+            self.ip = args.ip
+
+        if args.port is not None:
+            self.port = args.port
+
+        if args.protocol is not None:
+            self.protocol = args.protocol
+
+        if args.flip is not None:
+            self.flip = args.flip
+
+        if args.universe is not None:
+            self.universe = args.universe
+
+        if args.power_limit is not None:
+            self.power_limit = args.power_limit
+
+        if args.power_group is not None:
+            self.power_group = args.power_group
+
+        if args.max_amps is not None:
+            self.max_amps = args.max_amps
+
+        if args.amps_per_channel is not None:
+            self.amps_per_channel = args.amps_per_channel
+
+        if args.idle_amps is not None:
+            self.idle_amps = args.idle_amps
+
+        if args.loop is not None:
+            self.loop = args.loop
+
+        if args.gamma is not None:
+            self.gamma = args.gamma
+
+        if args.white_balance is not None:
+            self.white_balance = self._group_white_balance(args.white_balance)
+
+        if args.dither is not None:
+            self.dither = args.dither
+
+        if args.threaded is not None:
+            self.threaded = args.threaded
+
+        if args.keepalive is not None:
+            self.keepalive = args.keepalive
+
+        if args.packet_interval is not None:
+            self.packet_interval = args.packet_interval
+
+        if args.mtu is not None:
+            self.mtu = args.mtu
+
+        if args.pixel_dtype is not None:
+            self.pixel_dtype = args.pixel_dtype
+
+        if args.shared_memory is not None:
+            self.shared_memory = args.shared_memory
+
+        if args.collect_stats is not None:
+            self.collect_stats = args.collect_stats
+
+        if args.mapping is not None:
+            self.mapping = args.mapping[0] if len(args.mapping) == 1 else args.mapping
+
+    @staticmethod
+    def _group_white_balance(values: List[float]) -> List[List[float]]:
+        """
+        Split a flat list of gains into one red, green, blue triple per strip.
+        """
+        if len(values) == 0 or len(values) % 3 != 0:
+            raise ValueError('white_balance needs three gains (red, green, blue) per strip')
+        return [values[i:i + 3] for i in range(0, len(values), 3)]
+
+    def __str__(self):
+        return pprint.pformat({
+            'LED Count': self.led_count,
+            'IP': self.ip,
+            'Port': self.port,
+            'Protocol': self.protocol,
+            'Flip': self.flip,
+            'Universe': self.universe,
+            'Power Limit': self.power_limit,
+            'Power Group': self.power_group,
+            'Max Amps': self.max_amps,
+            'Amps Per Channel': self.amps_per_channel,
+            'Idle Amps': self.idle_amps,
+            'Loop': self.loop,
+            'Gamma': self.gamma,
+            'White Balance': self.white_balance,
+            'Dither': self.dither,
+            'Threaded': self.threaded,
+            'Keepalive': self.keepalive,
+            'Packet Interval': self.packet_interval,
+            'MTU': self.mtu,
+            'Pixel Dtype': self.pixel_dtype,
+            'Shared Memory': self.shared_memory,
+            'Collect Stats': self.collect_stats,
+            'Mapping': self.mapping,
+        })
+
+    def set_pixel_rgb(self, pos: int, red: float, green: float, blue: float) -> None:
+        """
+        Set floating point rgb values at integer position.
+        :param pos: integer led position
+        :param red: red value in range(0.0, 1.0)
+        :param green: green value in range(0.0, 1.0)
+        :param blue: blue value in range(0.0, 1.0)
+        """
+        if self.loop:
+            pos %= self._total_led_count
+
+        if 0 <= pos < self._total_led_count:
+            self._pixels[pos] = self._quantize([red, green, blue])
+            self._strip_dirty[bisect.bisect_right(self._strip_ends, pos)] = True
+
+    def add_pixel_rgb(self, pos: int, red: float, green: float, blue: float) -> None:
+        """
+        Add floating point rgb values at integer position.
+        :param pos: integer led position
+        :param red: red value in range(0.0, 1.0)
+        :param green: green value in range(0.0, 1.0)
+        :param blue: blue value in range(0.0, 1.0)
+        """
+        if self.loop:
+            pos %= self._total_led_count
+
+        if 0 <= pos < self._total_led_count:
+            if self._integer_pixels:
+                self._pixels[pos] = np.clip(self._pixels[pos] + np.multiply([red, green, blue], 255.0), 0.0, 255.0)
+            else:
+                self._pixels[pos] += [red, green, blue]
+            self._strip_dirty[bisect.bisect_right(self._strip_ends, pos)] = True
+
+    def _quantize(self, colors: np.ndarray) -> np.ndarray:
+        """
+        Convert floating point colors to values assignable to the pixel array.
+        :param colors: colors in range(0.0, 1.0)
+        :return: colors unchanged for floating point pixels, levels in range(0, 255) for integer pixels
+        """
+        if not self._integer_pixels:
+            return colors
+        return np.clip(np.multiply(colors, 255.0), 0.0, 255.0)
+
+    def _valid_positions(self, positions: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Wrap integer positions if loop is enabled and find positions inside the strip.
+        :param positions: integer led positions
+        :return: wrapped positions and mask of positions inside the strip
+        """
+        positions = np.asarray(positions, dtype=int).reshape(-1)
+        if self.loop:
+            positions = positions % self._total_led_count
+        mask = (positions >= 0) & (positions < self._total_led_count)
+        return positions, mask
+
+    def _mark_dirty(self, positions: np.ndarray) -> None:
+        """
+        Mark strips containing any of the given valid positions as changed.
+        :param positions: integer led positions inside the strip
+        """
+        if self._strip_count == 1:
+            self._strip_dirty[0] = True
+        else:
+            self._strip_dirty[np.searchsorted(self._strip_ends, positions, side='right')] = True
+
+    @staticmethod
+    def _broadcast_colors(colors: np.ndarray, count: int) -> np.ndarray:
+        """
+        Broadcast a single color or an array of colors to shape (count, 3).
+        """
+        return np.broadcast_to(np.asarray(colors, dtype=float), (count, 3))
+
+    def set_pixels_rgb(self, positions: np.ndarray, colors: np.ndarray) -> None:
+        """
+        Set floating point rgb values at integer positions.
+        :param positions: array of integer led positions
+        :param colors: array of shape (len(positions), 3) or single rgb color in range(0.0, 1.0)
+        """
+        positions, mask = self._valid_positions(positions)
+        colors = self._broadcast_colors(colors, len(positions))
+        if mask.any():
+            positions = positions[mask]
+            self._pixels[positions] = self._quantize(colors[mask])
+            self._mark_dirty(positions)
+
+    def add_pixels_rgb(self, positions: np.ndarray, colors: np.ndarray) -> None:
+        """
+        Add floating point rgb values at integer positions. Colors at repeated positions accumulate.
+        :param positions: array of integer led positions
+        :param colors: array of shape (len(positions), 3) or single rgb color in range(0.0, 1.0)
+        """
+        positions, mask = self._valid_positions(positions)
+        colors = self._broadcast_colors(colors, len(positions))
+        if not mask.any():
+            return
+
+        positions = positions[mask]
+        colors = colors[mask]
+        if self._integer_pixels:
+            # accumulate per distinct position and saturate once
+            unique, inverse = np.unique(positions, return_inverse=True)
+            sums = np.empty((len(unique), 3))
+            for channel in range(3):
+                sums[:, channel] = np.bincount(inverse, weights=colors[:, channel], minlength=len(unique))
+            self._pixels[unique] = np.clip(self._pixels[unique] + sums * 255.0, 0.0, 255.0)
+        elif len(positions) * 4 < self._total_led_count:
+            # few positions: scatter directly, cost independent of strip length
+            np.add.at(self._pixels, positions, colors)
+        else:
+            # many positions: accumulate per channel over the whole strip
+            for channel in range(3):
+                self._pixels[:, channel] += np.bincount(
+                    positions, weights=colors[:, channel], minlength=self._total_led_count)
+        self._mark_dirty(positions)
+
+    @staticmethod
+    def _interpolate_array(
+            positions: np.ndarray,
+            colors: np.ndarray,
+            kernel: str = 'linear',
+            width: float = 1.0
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Distribute colors at floating point positions across neighbouring pixels.
+        The linear kernel splits each color between two pixels exactly like set_rgb and add_rgb.
+        The triangle and gaussian kernels spread each color over more pixels (normalized to the same total).
+        :param positions: array of floating point led positions
+        :param colors: array of shape (len(positions), 3) or single rgb color
+        :param kernel: one of INTERPOLATION_KERNELS
+        :param width: triangle radius or gaussian standard deviation in pixels
+        :return: integer positions and weighted colors, ordered by input position
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1)
+        colors = LedStrip._broadcast_colors(colors, len(positions))
+
+        if kernel == 'linear':
+            pos_floor = np.trunc(positions)
+            pos_ceil = np.trunc(positions + 1.0)
+            pixel_positions = np.stack((pos_floor, pos_ceil), axis=1)
+            weights = np.stack((1.0 - (positions - pos_floor), 1.0 - (pos_ceil - positions)), axis=1)
+        elif kernel in INTERPOLATION_KERNELS:
+            assert width > 0.0
+            radius = width if kernel == 'triangle' else 3.0 * width
+            taps = max(int(np.ceil(radius)), 1)
+            offsets = np.arange(-taps, taps + 2)
+            pixel_positions = np.floor(positions)[:, np.newaxis] + offsets
+            distance = np.abs(pixel_positions - positions[:, np.newaxis])
+            if kernel == 'triangle':
+                weights = np.maximum(1.0 - distance / width, 0.0)
+            else:
+                weights = np.exp(-0.5 * np.square(distance / width))
+                weights[distance > radius] = 0.0
+            total = weights.sum(axis=1, keepdims=True)
+            np.divide(weights, total, out=weights, where=total > 0.0)
+        else:
+            raise ValueError('Unknown interpolation kernel "%s"' % kernel)
+
+        pixel_colors = colors[:, np.newaxis, :] * weights[:, :, np.newaxis]
+        return pixel_positions.reshape(-1).astype(int), pixel_colors.reshape(-1, 3)
+
+    def set_rgb_array(
+            self,
+            positions: np.ndarray,
+            colors: np.ndarray,
+            kernel: str = 'linear',
+            width: float = 1.0
+    ) -> None:
+        """
+        Set floating point rgb values at floating point positions (interpolated automatically).
+        :param positions: array of floating point led positions
+        :param colors: array of shape (len(positions), 3) or single rgb color in range(0.0, 1.0)
+        :param kernel: interpolation kernel, one of INTERPOLATION_KERNELS
+        :param width: kernel width in pixels (ignored by the linear kernel)
+        """
+        self.set_pixels_rgb(*self._interpolate_array(positions, colors, kernel, width))
+
+    def add_rgb_array(
+            self,
+            positions: np.ndarray,
+            colors: np.ndarray,
+            kernel: str = 'linear',
+            width: float = 1.0
+    ) -> None:
+        """
+        Add floating point rgb values at floating point positions (interpolated automatically).
+        :param positions: array of floating point led positions
+        :param colors: array of shape (len(positions), 3) or single rgb color in range(0.0, 1.0)
+        :param kernel: interpolation kernel, one of INTERPOLATION_KERNELS
+        :param width: kernel width in pixels (ignored by the linear kernel)
+        """
+        self.add_pixels_rgb(*self._interpolate_array(positions, colors, kernel, width))
+
+    def set_hsv_array(
+            self,
+            positions: np.ndarray,
+            colors: np.ndarray,
+            kernel: str = 'linear',
+            width: float = 1.0
+    ) -> None:
+        """
+        Set floating point hsv values at floating point positions (interpolated automatically).
+        :param positions: array of floating point led positions
+        :param colors: array of shape (len(positions), 3) or single hsv color in range(0.0, 1.0)
+        :param kernel: interpolation kernel, one of INTERPOLATION_KERNELS
+        :param width: kernel width in pixels (ignored by the linear kernel)
+        """
+        self.set_rgb_array(positions, hsv_to_rgb(colors), kernel, width)
+
+    def add_hsv_array(
+            self,
+            positions: np.ndarray,
+            colors: np.ndarray,
+            kernel: str = 'linear',
+            width: float = 1.0
+    ) -> None:
+        """
+        Add floating point hsv values at floating point positions (interpolated automatically).
+        :param positions: array of floating point led positions
+        :param colors: array of shape (len(positions), 3) or single hsv color in range(0.0, 1.0)
+        :param kernel: interpolation kernel, one of INTERPOLATION_KERNELS
+        :param width: kernel width in pixels (ignored by the linear kernel)
+        """
+        self.add_rgb_array(positions, hsv_to_rgb(colors), kernel, width)
+
+    def set_rgb(self, pos: float, red: float, green: float, blue: float) -> None:
+        """
+        Set floating point rgb values at floating point position (interpolated automatically).
+        :param pos: floating point led position
+        :param red: red value in range(0.0, 1.0)
+        :param green: green value in range(0.0, 1.0)
+        :param blue: blue value in range(0.0, 1.0)
+        """
+        self._call_interpolated(self.set_pixel_rgb, pos, red, green, blue)
+
+    def add_rgb(self, pos: float, red: float, green: float, blue: float) -> None:
+        """
+        Add floating point rgb values at floating point position (interpolated automatically).
+        :param pos: floating point led position
+        :param red: red value in range(0.0, 1.0)
+        :param green: green value in range(0.0, 1.0)
+        :param blue: blue value in range(0.0, 1.0)
+        """
+        self._call_interpolated(self.add_pixel_rgb, pos, red, green, blue)
+
+    def set_hsv(self, pos: float, hue: float, saturation: float, value: float) -> None:
+        """
+        Set floating point hsv values at floating point position (interpolated automatically).
+        :param pos: floating point led position
+        :param hue: hue value in range(0.0, 1.0)
+        :param saturation: saturation value in range(0.0, 1.0)
+        :param value: brightness value in range(0.0, 1.0)
+        """
+        red, green, blue = _hsv_to_rgb_scalar(hue, saturation, value)
+        self._call_interpolated(self.set_pixel_rgb, pos, red, green, blue)
+
+    def add_hsv(self, pos: float, hue: float, saturation: float, value: float) -> None:
+        """
+        Add floating point hsv values at floating point position (interpolated automatically).
+        :param pos: floating point led position
+        :param hue: hue value in range(0.0, 1.0)
+        :param saturation: saturation value in range(0.0, 1.0)
+        :param value: brightness value in range(0.0, 1.0)
+        """
+        red, green, blue = _hsv_to_rgb_scalar(hue, saturation, value)
+        self._call_interpolated(self.add_pixel_rgb, pos, red, green, blue)
+
+    def clear(self) -> None:
+        """
+        Set all pixels to black. Needs call to transmit() to take effect.
+        """
+        self.fill((0.0, 0.0, 0.0))
+
+    def fill(self, color: (float, float, float)) -> None:
+        """
+        Set all pixels to the same floating point rgb color.
+        :param color: red, green and blue value in range(0.0, 1.0)
+        """
+        self._pixels[:] = self._quantize(color)
+        self._strip_dirty[:] = True
+
+    def load_pixels(self, pixels: np.ndarray) -> None:
+        """
+        Replace all pixels at once.
+        :param pixels: array of shape (led_count, 3) with floating point rgb values in range(0.0, 1.0)
+            or uint8 levels in range(0, 255)
+        """
+        if pixels.dtype != np.uint8:
+            self._pixels[:] = self._quantize(pixels)
+        elif self._integer_pixels:
+            self._pixels[:] = pixels
+        else:
+            np.divide(pixels, 255.0, out=self._pixels)
+        self._strip_dirty[:] = True
+
+    def _range_slices(self, start: int, end: int) -> List[Tuple[int, int, int]]:
+        """
+        Split a position range into at most two slices of the pixel array, wrapping around if loop is enabled.
+        With loop a range longer than the strip is cut to its last led_count positions.
+        :param start: first integer led position
+        :param end: integer led position after the last one
+        :return: list of (pixel start, pixel end, offset of pixel start within the range)
+        """
+        if end <= start:
+            return []
+
+        total = self._total_led_count
+        if not self.loop:
+            pixel_start = max(start, 0)
+            pixel_end = min(end, total)
+            if pixel_end <= pixel_start:
+                return []
+            return [(pixel_start, pixel_end, pixel_start - start)]
+
+        offset = max(end - start - total, 0)
+        pixel_start = (start + offset) % total
+        length = end - start - offset
+        first_length = min(length, total - pixel_start)
+        slices = [(pixel_start, pixel_start + first_length, offset)]
+        if first_length < length:
+            slices.append((0, length - first_length, offset + first_length))
+        return slices
+
+    def _mark_dirty_range(self, pixel_start: int, pixel_end: int) -> None:
+        """
+        Mark strips overlapping a slice of the pixel array as changed.
+        :param pixel_start: first pixel index
+        :param pixel_end: pixel index after the last one
+        """
+        first = bisect.bisect_right(self._strip_ends, pixel_start)
+        last = bisect.bisect_right(self._strip_ends, pixel_end - 1)
+        self._strip_dirty[first:last + 1] = True
+
+    def fill_range(self, start: int, end: int, color: (float, float, float)) -> None:
+        """
+        Set pixels in range(start, end) to the same floating point rgb color.
+        :param start: first integer led position
+        :param end: integer led position after the last one
+        :param color: red, green and blue value in range(0.0, 1.0)
+        """
+        for pixel_start, pixel_end, _ in self._range_slices(start, end):
+            self._pixels[pixel_start:pixel_end] = self._quantize(color)
+            self._mark_dirty_range(pixel_start, pixel_end)
+
+    def fill_gradient(
+            self,
+            start: int,
+            end: int,
+            color_a: (float, float, float),
+            color_b: (float, float, float)
+    ) -> None:
+        """
+        Set pixels in range(start, end) to a linear rgb gradient from color_a at start to color_b at end - 1.
+        :param start: first integer led position
+        :param end: integer led position after the last one
+        :param color_a: red, green and blue value in range(0.0, 1.0) at start
+        :param color_b: red, green and blue value in range(0.0, 1.0) at end - 1
+        """
+        color_a = np.asarray(color_a, dtype=float)
+        color_b = np.asarray(color_b, dtype=float)
+        steps = max(end - start - 1, 1)
+        for pixel_start, pixel_end, offset in self._range_slices(start, end):
+            fraction = np.arange(offset, offset + pixel_end - pixel_start) / steps
+            self._pixels[pixel_start:pixel_end] = self._quantize(color_a + np.outer(fraction, color_b - color_a))
+            self._mark_dirty_range(pixel_start, pixel_end)
+
+    def _mapped(self) -> Mapping:
+        """
+        :return: mapping of all LEDs
+        """
+        if self._strip_mapping is None:
+            raise ValueError('No mapping set')
+        if self._mapping_strips is None:
+            raise ValueError('Mapping has %d LEDs, strip has %d' % (len(self._strip_mapping), self._total_led_count))
+        return self._strip_mapping
+
+    def set_image(self, image: np.ndarray) -> None:
+        """
+        Set mapped pixels to the nearest cells of an image stretched over the bounds of the mapping.
+        :param image: array of shape (height, width, 3) or (depth, height, width, 3) with floating point rgb values
+            in range(0.0, 1.0)
+        """
+        mapping = self._mapped()
+        image = np.asarray(image)
+        indices = mapping.image_indices(image.shape[:-1])
+        if mapping.complete and image.dtype == self._pixels.dtype and not self._integer_pixels:
+            # gather straight into the pixels without a temporary array
+            np.take(image.reshape(-1, 3), indices, axis=0, out=self._pixels, mode='clip')
+        elif mapping.complete:
+            self._pixels[:] = self._quantize(image.reshape(-1, 3)[indices])
+        else:
+            self._pixels[mapping.indices] = self._quantize(image.reshape(-1, 3)[indices])
+        self._strip_dirty |= self._mapping_strips
+
+    def set_function(self, function: Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]) -> None:
+        """
+        Set mapped pixels to a function of their coordinates.
+        :param function: called with x, y and z arrays of the mapped LEDs, returns an array of shape (len(x), 3)
+            or a single color with floating point rgb values in range(0.0, 1.0)
+        """
+        mapping = self._mapped()
+        colors = self._broadcast_colors(function(mapping.x, mapping.y, mapping.z), len(mapping.indices))
+        if mapping.complete:
+            self._pixels[:] = self._quantize(colors)
+        else:
+            self._pixels[mapping.indices] = self._quantize(colors)
+        self._strip_dirty |= self._mapping_strips
+
+    def _group_brightness(self) -> np.ndarray:
+        """
+        Brightness factor per power supply group keeping the group within its power limit.
+        Without max_amps a group may use power_limit of its full white power, otherwise its current, modelled as
+        idle_amps per LED plus amps_per_channel per fully lit channel, is limited to max_amps of the group.
+        :return: array of factors in range(0.0, 1.0)
+        """
+        # sum of channel levels per group in range(0.0, 3.0 * led count)
+        group_power = np.bincount(self._strip_groups, weights=self._strip_power, minlength=self._group_count)
+        if self._integer_pixels:
+            group_power /= 255.0
+
+        brightness = np.ones(self._group_count)
+        if self._max_amps is None:
+            # ids left out of the group numbering have no LEDs
+            power_use = np.divide(group_power, 3 * self._group_led_counts, out=np.zeros(self._group_count),
+                                  where=self._group_led_counts > 0)
+            np.divide(self._power_limit, power_use, out=brightness, where=power_use > self._power_limit)
+        else:
+            idle = self._idle_amps * self._group_led_counts
+            current = idle + self._amps_per_channel * group_power
+            over = current > self._group_max_amps
+            np.divide(np.maximum(self._group_max_amps - idle, 0.0), current - idle, out=brightness, where=over)
+        return brightness
+
+    def _update_buffers(self) -> None:
+        """
+        Clamp colors to range(0.0, 1.0), limit power use and convert colors to buffer.
+        """
+        self._collect_shared_changes()
+        self._encode_pixels(self._pixels, self._strip_dirty)
+        self._strip_dirty[:] = False
+
+    def _encode_pixels(self, source: np.ndarray, dirty: np.ndarray) -> None:
+        """
+        Convert pixels of changed strips to the transmit buffers.
+        :param source: pixel array shaped like _pixels
+        :param dirty: boolean array marking strips to encode, all strips are marked if the power limit changed
+        """
+        pixels = self._scratch_pixels
+        pixel_bytes = self._scratch_bytes
+        pixel_wide = self._scratch_wide
+
+        if self._dither:
+            dirty[:] = True
+
+        # clamp individual colors and keep track of power use per strip, integer pixels need no clamping
+        clamped = source if self._integer_pixels else pixels
+        if dirty.all():
+            if not self._integer_pixels:
+                np.clip(source, 0.0, 1.0, out=pixels)
+            # adding the channel columns is much faster than a reduction along the short axis
+            np.add(clamped[:, 0], clamped[:, 1], out=self._scratch_power, dtype=self._scratch_power.dtype)
+            np.add(self._scratch_power, clamped[:, 2], out=self._scratch_power)
+            np.add.reduceat(self._scratch_power, self._strip_starts, out=self._strip_power)
+        else:
+            for strip_index in np.flatnonzero(dirty):
+                start, end = self._strip_ranges[strip_index]
+                if not self._integer_pixels:
+                    np.clip(source[start:end], 0.0, 1.0, out=pixels[start:end])
+                self._strip_power[strip_index] = clamped[start:end].sum(dtype=self._strip_power.dtype)
+
+        # limit power use per power supply group, a changed brightness factor affects all strips of the group
+        strip_brightness = self._group_brightness()[self._strip_groups]
+        changed = strip_brightness != self._strip_brightness
+        if changed.any():
+            if not self._integer_pixels:
+                for strip_index in np.flatnonzero(changed & ~dirty):
+                    start, end = self._strip_ranges[strip_index]
+                    np.clip(source[start:end], 0.0, 1.0, out=pixels[start:end])
+            dirty |= changed
+            self._strip_brightness[:] = strip_brightness
+
+        if not dirty.any():
+            return
+
+        # contiguous runs of changed strips sharing a brightness factor are processed at once
+        if dirty.all() and (strip_brightness == strip_brightness[0]).all():
+            segments = [(0, self._total_led_count, strip_brightness[0])]
+        else:
+            segments = []
+            for strip_index in np.flatnonzero(dirty):
+                start, end = self._strip_ranges[strip_index]
+                brightness_factor = strip_brightness[strip_index]
+                if segments and segments[-1][1] == start and segments[-1][2] == brightness_factor:
+                    segments[-1] = (segments[-1][0], end, brightness_factor)
+                else:
+                    segments.append((start, end, brightness_factor))
+
+        if self._calibrated and self._dither:
+            self._dither_frame = (self._dither_frame + 1) % 256
+
+        for start, end, brightness_factor in segments:
+            segment = pixels[start:end]
+            # a python float keeps float32 pixels in single precision
+            brightness_factor = float(brightness_factor)
+            # brightness of integer pixels in 8.8 fixed point
+            brightness_scale = np.uint32(round(brightness_factor * 256))
+            if brightness_factor != 1.0 and not self._integer_pixels:
+                segment *= brightness_factor
+
+            if self._calibrated:
+                # look up calibrated 8.8 fixed point levels for all channels at once
+                indices = self._calibration_indices[start:end]
+                levels = self._calibration_levels[start:end]
+                if self._integer_pixels:
+                    # round levels scaled by brightness to table indices
+                    np.multiply(source[start:end], brightness_scale, out=indices)
+                    indices *= CALIBRATION_LUT_SIZE - 1
+                    indices += 255 * 128
+                    indices //= 255 * 256
+                else:
+                    segment *= CALIBRATION_LUT_SIZE - 1
+                    segment += 0.5
+                    np.copyto(indices, segment, casting='unsafe')
+                indices += self._calibration_offsets[start:end]
+                np.take(self._calibration_lut, indices, out=levels, mode='clip')
+                if pixel_wide is not None:
+                    # scale 8.8 fixed point (max 255 * 256) to 16 bit
+                    np.right_shift(levels, 8, out=indices)
+                    np.add(levels, indices, out=pixel_wide[start:end], casting='unsafe')
+
+                # round to nearest or add a per frame varying threshold to dither
+                if self._dither:
+                    np.add(self._dither_phase[start:end], self._dither_frame * 159, out=indices)
+                    indices &= 255
+                    levels += indices
+                else:
+                    levels += 128
+                levels >>= 8
+                np.minimum(levels, 255, out=levels)
+                np.copyto(pixel_bytes[start:end], levels, casting='unsafe')
+            elif self._integer_pixels:
+                # integer pixels are output levels already, only scaled by brightness (truncating)
+                if brightness_scale == 256 and pixel_wide is None:
+                    np.copyto(pixel_bytes[start:end], source[start:end])
+                else:
+                    np.multiply(source[start:end], brightness_scale, out=segment)
+                    np.right_shift(segment, 8, out=pixel_bytes[start:end])
+                    if pixel_wide is not None:
+                        segment *= 257
+                        segment >>= 8
+                        np.copyto(pixel_wide[start:end], segment, casting='unsafe')
+            else:
+                # convert floating point pixels to bytes (truncating)
+                segment *= 255
+                np.copyto(pixel_bytes[start:end], segment, casting='unsafe')
+                if pixel_wide is not None:
+                    segment *= 257
+                    np.copyto(pixel_wide[start:end], segment, casting='unsafe')
+
+        # update data part of the transmit buffer
+        for strip_index in np.flatnonzero(dirty):
+            start, end = self._strip_ranges[strip_index]
+            protocol = self._protocols[strip_index]
+            if protocol.BYTES_PER_CHANNEL == 2:
+                strip_pixels = pixel_wide[start:end]
+            else:
+                strip_pixels = pixel_bytes[start:end]
+            if self._flips[strip_index]:
+                strip_pixels = strip_pixels[::-1]
+            protocol.encode(self._transmit_data[strip_index], strip_pixels)
+
+        self._strip_unsent |= dirty
+
+    def transmit(self) -> None:
+        """
+        Update buffer and transmit to LED strip.
+        With threaded enabled only a copy of the pixels is handed to the sender thread. A frame which was not
+        picked up by the sender thread before the next call is dropped. An error of the sender thread is raised by
+        the next call after handing over its frame.
+        """
+        if self._threaded:
+            with self._frame_condition:
+                self._collect_shared_changes()
+                if self._strip_dirty.any():
+                    np.copyto(self._pending_pixels, self._pixels)
+                    self._pending_dirty |= self._strip_dirty
+                    self._strip_dirty[:] = False
+                if self._frame_pending and self._stats is not None:
+                    self._stats.dropped_frames += 1
+                self._frame_pending = True
+                self._frame_condition.notify()
+                error, self._sender_error = self._sender_error, None
+            if error is not None:
+                raise error
+            return
+
+        with self._transmit_lock:
+            stats = self._stats
+            if stats is None:
+                self._update_buffers()
+                self._send_buffers()
+            else:
+                start = time.perf_counter()
+                self._update_buffers()
+                encode_time = time.perf_counter() - start
+                self._send_buffers()
+                self._frame_done(encode_time)
+
+    def _transmit_encoded(self, data: np.ndarray) -> None:
+        """
+        Send encoded transmit buffers, e.g. a recorded frame, without encoding the pixels.
+        The next transmit() encodes all strips from the pixels again.
+        :param data: transmit buffers of all strips one after another
+        """
+        with self._transmit_lock:
+            stats = self._stats
+            start = time.perf_counter() if stats is not None else 0.0
+            offset = 0
+            for strip_index, transmit_buffer in enumerate(self._transmit_buffers):
+                frame_buffer = data[offset:offset + len(transmit_buffer)]
+                offset += len(transmit_buffer)
+                if not np.array_equal(transmit_buffer, frame_buffer):
+                    transmit_buffer[:] = frame_buffer
+                    self._strip_unsent[strip_index] = True
+            self._strip_dirty[:] = True
+            encode_time = time.perf_counter() - start if stats is not None else 0.0
+            self._send_buffers()
+            if stats is not None:
+                self._frame_done(encode_time)
+
+    def _frame_done(self, encode_time: float) -> None:
+        """
+        Count a transmitted frame in the statistics and pass its record to the stats callback.
+        :param encode_time: time in seconds taken to update the transmit buffers
+        """
+        record = self._stats.frame_done(encode_time)
+        if self.stats_callback is not None:
+            self.stats_callback(record)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the statistics collected since collect_stats was enabled or reset_stats() was called.
+        Times are in seconds, histograms count durations up to each of STATS_BUCKETS. Strips list per strip
+        send times, bytes sent, frames dropped on connection errors and connection counts of TCP strips.
+        :return: dict of statistics, empty if collect_stats is disabled
+        """
+        with self._transmit_lock:
+            if self._stats is None:
+                return {}
+            return self._stats.snapshot()
+
+    def reset_stats(self) -> None:
+        """
+        Restart collecting statistics if collect_stats is enabled.
+        """
+        with self._transmit_lock:
+            if self._stats is not None:
+                self._stats = _Stats(self._strip_count)
+
+    def _sender_loop(self) -> None:
+        """
+        Background thread encoding and sending the latest frame handed over by transmit().
+        """
+        while True:
+            with self._frame_condition:
+                while self._threaded and not self._frame_pending:
+                    self._frame_condition.wait()
+                if not self._threaded:
+                    return
+
+                generation = self._frame_generation
+                dirty = self._pending_dirty
+                if dirty.any():
+                    self._pending_pixels, self._sending_pixels = self._sending_pixels, self._pending_pixels
+                self._frame_pending = False
+                self._pending_dirty = np.zeros_like(dirty)
+
+            with self._transmit_lock:
+                # skip frames taken before a parameter change reallocated the buffers
+                if generation != self._frame_generation:
+                    continue
+                try:
+                    stats = self._stats
+                    if stats is None:
+                        self._encode_pixels(self._sending_pixels, dirty)
+                        self._send_buffers()
+                    else:
+                        start = time.perf_counter()
+                        self._encode_pixels(self._sending_pixels, dirty)
+                        encode_time = time.perf_counter() - start
+                        self._send_buffers()
+                        self._frame_done(encode_time)
+                except Exception as error:
+                    # keep the thread alive for later frames, transmit() raises the error
+                    with self._frame_condition:
+                        self._sender_error = error
+                        if generation == self._frame_generation:
+                            # encode the strips of the failed frame again with the next one
+                            self._pending_dirty |= dirty
+
+    def _strips_to_send(self) -> np.ndarray:
+        """
+        Find strips with changed transmit buffers or due for a keep-alive resend.
+        :return: boolean array marking strips to send
+        """
+        return self._strip_unsent | (time.monotonic() - self._strip_sent_times >= self._keepalive)
+
+    def _strip_sent(self, strip_index: int) -> None:
+        """
+        Record a successful send of a strip.
+        :param strip_index: index of the strip
+        """
+        self._strip_unsent[strip_index] = False
+        self._strip_sent_times[strip_index] = time.monotonic()
+
+    def _send_buffers(self) -> None:
+        """
+        Send the transmit buffers of changed strips.
+        """
+        stats = self._stats
+        udp_strips = []
+        for i in np.flatnonzero(self._strips_to_send()):
+            if self._protocols[i].CONNECTION_TYPE == 'udp':
+                udp_strips.append(i)
+                continue
+
+            if not self._socks[i]:
+                self._socks[i] = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                res = self._socks[i].connect_ex((self._ips[i], self._ports[i]))
+                if res != 0:
+                    self._socks[i] = None
+                    if stats is not None:
+                        stats.strip_failed(i, connect=True)
+                    continue
+                if stats is not None:
+                    stats.strip_connects[i] += 1
+
+            start = time.perf_counter() if stats is not None else 0.0
+            try:
+                self._socks[i].sendall(self._transmit_buffers[i])
+            except (ConnectionResetError, BrokenPipeError):
+                self._socks[i] = None
+                if stats is not None:
+                    stats.strip_failed(i)
+                continue
+            self._strip_sent(i)
+            if stats is not None:
+                stats.strip_sent(i, time.perf_counter() - start, self._strip_sent_bytes[i])
+
+        # all UDP strips share one socket and are sent in one batch
+        if udp_strips:
+            if self._udp_sender is None:
+                self._udp_sender = _UdpSender()
+            # message vector for all UDP strips only changes with the parameters
+            if not self._udp_messages_prepared:
+                self._udp_messages = self._udp_sender.prepare(self._udp_packets(self._udp_strips))
+                self._udp_messages_prepared = True
+
+            for i in udp_strips:
+                self._strip_frames[i] += 1
+                self._protocols[i].next_frame(self._strip_packets[i], self._strip_frames[i])
+
+            packets = self._udp_packets(udp_strips)
+            messages = self._udp_messages
+            if messages is not None and len(udp_strips) < len(self._udp_strips):
+                messages = _UdpSender.select(messages, [p for i in udp_strips for p in self._udp_positions[i]])
+            start = time.perf_counter() if stats is not None else 0.0
+            self._udp_sender.send(packets, messages, self._packet_interval)
+            for i in udp_strips:
+                self._strip_sent(i)
+            if stats is not None:
+                # the batch is sent at once, its time is shared evenly by the strips
+                seconds = (time.perf_counter() - start) / len(udp_strips)
+                for i in udp_strips:
+                    stats.strip_sent(i, seconds, self._strip_sent_bytes[i])
+
+    def _udp_packets(self, strips: List[int]) -> List[Tuple[List[np.ndarray], Tuple[str, int]]]:
+        """
+        Collect the datagrams of UDP strips.
+        :param strips: strip indices
+        :return: list of (buffers, address)
+        """
+        return [packet for i in strips for packet in zip(self._strip_packets[i], self._strip_addresses[i])]
+
+    async def transmit_async(self, timeout: float = 0.1) -> None:
+        """
+        Update buffer and transmit to all LED strips concurrently.
+        A TCP strip which did not accept the previous frame within timeout is disconnected, unconnected TCP strips
+        are skipped and reconnected in the background.
+        :param timeout: time in seconds a single strip may take to accept a frame
+        """
+        stats = self._stats
+        start = time.perf_counter() if stats is not None else 0.0
+        self._update_buffers()
+        encode_time = time.perf_counter() - start if stats is not None else 0.0
+
+        if self._async_udp_transport is None and any(p.CONNECTION_TYPE == 'udp' for p in self._protocols):
+            self._async_udp_transport, _ = await asyncio.get_event_loop().create_datagram_endpoint(
+                asyncio.DatagramProtocol, family=socket.AF_INET)
+
+        sends = []
+        to_send = self._strips_to_send()
+        for i in range(self._strip_count):
+            if self._protocols[i].CONNECTION_TYPE == 'udp':
+                if to_send[i]:
+                    start = time.perf_counter() if stats is not None else 0.0
+                    self._strip_frames[i] += 1
+                    self._protocols[i].next_frame(self._strip_packets[i], self._strip_frames[i])
+                    for buffers, address in self._udp_packets([i]):
+                        # datagram transports can not gather buffers
+                        data = memoryview(buffers[0]) if len(buffers) == 1 else b''.join(buffers)
+                        self._async_udp_transport.sendto(data, address)
+                    self._strip_sent(i)
+                    if stats is not None:
+                        stats.strip_sent(i, time.perf_counter() - start, self._strip_sent_bytes[i])
+            elif self._async_writers[i] is None:
+                if to_send[i] and stats is not None:
+                    stats.strip_dropped[i] += 1
+                self._reconnect_async(i, timeout)
+            elif to_send[i]:
+                sends.append(self._send_async(i, timeout))
+
+        if sends:
+            await asyncio.gather(*sends)
+        if stats is not None and stats is self._stats:
+            self._frame_done(encode_time)
+
+    async def _send_async(self, strip_index: int, timeout: float) -> None:
+        """
+        Send the transmit buffer of a single TCP strip, waiting at most timeout for the previous frame to drain.
+        :param strip_index: index of the strip
+        :param timeout: time in seconds the strip may take to accept the previous frame
+        """
+        writer = self._async_writers[strip_index]
+        stats = self._stats
+        start = time.perf_counter() if stats is not None else 0.0
+        try:
+            # the transport discards writes silently once sending failed, e.g. after the strip closed the connection
+            if writer.transport.is_closing():
+                raise ConnectionResetError()
+            if writer.transport.get_write_buffer_size() > 0:
+                await asyncio.wait_for(writer.drain(), timeout)
+            writer.write(self._transmit_buffers[strip_index].tobytes())
+            self._strip_sent(strip_index)
+            if stats is not None:
+                stats.strip_sent(strip_index, time.perf_counter() - start, self._strip_sent_bytes[strip_index])
+        except (asyncio.TimeoutError, ConnectionError):
+            if stats is not None:
+                stats.strip_failed(strip_index)
+            writer.close()
+            if self._async_writers[strip_index] is writer:
+                self._async_writers[strip_index] = None
+                self._reconnect_async(strip_index, timeout)
+
+    def _reconnect_async(self, strip_index: int, timeout: float, retry_interval: float = 1.0) -> None:
+        """
+        Start connecting a TCP strip in the background unless a connection attempt is already running.
+        :param strip_index: index of the strip
+        :param timeout: time in seconds to wait for the connection
+        :param retry_interval: time in seconds before another attempt is made after a failure
+        """
+        connect = self._async_connects[strip_index]
+        if connect is not None and not connect.done():
+            return
+
+        writers = self._async_writers
+        stats = self._stats
+        address = (self._ips[strip_index], self._ports[strip_index])
+
+        async def connect_strip():
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(*address), timeout)
+            except (OSError, asyncio.TimeoutError):
+                if stats is not None:
+                    stats.strip_connect_failures[strip_index] += 1
+                await asyncio.sleep(retry_interval)
+                return
+            if writers is self._async_writers:
+                writers[strip_index] = writer
+                self._strip_unsent[strip_index] = True
+                if stats is not None:
+                    stats.strip_connects[strip_index] += 1
+            else:
+                # parameters changed while connecting
+                writer.close()
+
+        self._async_connects[strip_index] = asyncio.ensure_future(connect_strip())
+
+    def _close_async_connections(self) -> None:
+        """
+        Cancel running connection attempts and close the TCP connections of transmit_async.
+        """
+        for connect in self._async_connects or []:
+            if connect is not None:
+                connect.cancel()
+        for i, writer in enumerate(self._async_writers or []):
+            if writer is not None:
+                writer.close()
+                self._async_writers[i] = None
+
+    async def close_async(self) -> None:
+        """
+        Close all connections opened by transmit_async.
+        """
+        self._close_async_connections()
+        if self._async_udp_transport is not None:
+            self._async_udp_transport.close()
+            self._async_udp_transport = None
+
+    def close(self) -> None:
+        """
+        Stop the sender thread and close all sockets. Later transmits open new sockets.
+        """
+        self.threaded = False
+        with self._transmit_lock:
+            for i, sock in enumerate(self._socks or []):
+                if sock:
+                    sock.close()
+                    self._socks[i] = None
+            if self._udp_sender is not None:
+                self._udp_sender.close()
+                self._udp_sender = None
+                self._udp_messages_prepared = False
+
+    def __enter__(self) -> 'LedStrip':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def run(
+            self,
+            render: Callable[['LedStrip', float], Union[bool, None]],
+            fps: float = 60.0,
+            *,
+            frames: int = None,
+            clock: FrameClock = None
+    ) -> FrameClock:
+        """
+        Call render and transmit at a fixed frame rate, limited to what the strips can display.
+        :param render: called with the strip and the scheduled frame time in seconds, return False to stop
+        :param fps: requested frames per second
+        :param frames: stop after this amount of frames
+        :param clock: frame clock to use instead of one created from fps
+        :return: the frame clock holding frame and missed deadline counts
+        """
+        if clock is None:
+            clock = FrameClock(fps, min_interval=self.min_frame_interval)
+
+        while frames is None or clock.frame < frames:
+            if render(self, clock.time) is False:
+                break
+            self.transmit()
+            clock.tick()
+
+        return clock
+
+    def off(self) -> None:
+        """
+        Quickly turn off LED strip (clear and transmit).
+        """
+        self.clear()
+        self.transmit()
+
+    @staticmethod
+    def _call_interpolated(
+            pixel_func: Callable[[float, float, float, float], None],
+            pos: float,
+            red: float,
+            green: float,
+            blue: float
+    ) -> None:
+        """
+        Helper function distributing a color manipulation between two pixels based on interpolation.
+        :param pixel_func: function manipulating a single pixel
+        :param pos: floating point led position
+        :param red: red value in range(0.0, 1.0)
+        :param green: green value in range(0.0, 1.0)
+        :param blue: blue value in range(0.0, 1.0)
+        """
+        pos_floor = int(pos)
+        pos_ceil = int(pos + 1.0)
+        floor_factor = 1.0 - (pos - pos_floor)
+        ceil_factor = 1.0 - (pos_ceil - pos)
+        pixel_func(pos_floor, red * floor_factor, green * floor_factor, blue * floor_factor)
+        pixel_func(pos_ceil, red * ceil_factor, green * ceil_factor, blue * ceil_factor)
+
+    @staticmethod
+    def add_arguments(parser: argparse.ArgumentParser) -> None:
+        group = parser.add_argument_group(title='pyledstrip')
+        group.add_argument('--config', type=str, help='configuration file')
+        group.add_argument('--led_count', type=int, nargs='+', help='amount of LEDs')
+        group.add_argument('--ip', type=str, nargs='+', help='IP address')
+        group.add_argument('--port', type=int, nargs='+', help='Port')
+        group.add_argument('--protocol', type=str, nargs='+', choices=list(PROTOCOLS), help='Protocol')
+        group.add_argument('--flip', type=_parse_bool, nargs='+', help='flip led positions')
+        group.add_argument('--universe', type=int, nargs='+', help='first DMX universe (E1.31, Art-Net)')
+        group.add_argument('--power_limit', type=float, help='limit power use')
+        group.add_argument('--power_group', type=int, nargs='+', help='power supply group per strip')
+        group.add_argument('--max_amps', type=float, nargs='+', help='current limit per power supply group')
+        group.add_argument('--amps_per_channel', type=float, help='current of a fully lit color channel')
+        group.add_argument('--idle_amps', type=float, help='current of an LED when off')
+        group.add_argument('--loop', type=_parse_bool, help='loop positions modulo led_count')
+        group.add_argument('--gamma', type=float, nargs='+', help='gamma correction exponent')
+        group.add_argument('--white_balance', type=float, nargs='+', help='red green blue gains per strip')
+        group.add_argument('--dither', type=_parse_bool, help='temporal dithering of calibrated colors')
+        group.add_argument('--threaded', type=_parse_bool, help='encode and send in a background thread')
+        group.add_argument('--keepalive', type=float, help='resend unchanged strips after seconds')
+        group.add_argument('--packet_interval', type=float, help='seconds between UDP packets')
+        group.add_argument('--mtu', type=int, help='maximum transmission unit for fragmenting protocols')
+        group.add_argument('--pixel_dtype', type=str, choices=PIXEL_DTYPES, help='storage type of pixels')
+        group.add_argument('--shared_memory', type=str, help='shared memory name or file holding the pixels')
+        group.add_argument('--collect_stats', type=_parse_bool, help='collect frame timing and network statistics')
+        group.add_argument('--mapping', type=str, nargs='+', help='JSON or CSV file of LED coordinates (per strip)')
+
+
+class Layer:
+    """
+    Named pixel buffer composited onto a strip by a Compositor.
+    Pixels hold floating point rgb colors, alpha optionally holds the coverage per pixel (None for fully opaque).
+    """
+
+    def __init__(
+            self,
+            name: str,
+            led_count: int,
+            render: Callable[['Layer', float], Union[np.ndarray, Tuple[np.ndarray, np.ndarray], None]] = None,
+            *,
+            opacity: float = 1.0,
+            blend: str = 'alpha'
+    ):
+        """
+        :param name: name of the layer
+        :param led_count: amount of LEDs
+        :param render: called with the layer and the frame time, draws into pixels (and alpha) or returns pixels or
+        a tuple of pixels and alpha
+        :param opacity: opacity in range(0.0, 1.0) applied on top of alpha
+        :param blend: blend mode, one of BLEND_MODES
+        """
+        if blend not in BLEND_MODES:
+            raise ValueError('Unknown blend mode %r, expected one of %s' % (blend, ', '.join(BLEND_MODES)))
+        self.name = name
+        self.render = render
+        self.opacity = opacity
+        self.blend = blend
+        self.visible = True
+        self.pixels = np.zeros((led_count, 3))
+        self.alpha = None
+
+    def clear(self) -> None:
+        """
+        Set all pixels to black.
+        """
+        self.pixels[:] = 0.0
+
+
+class Compositor:
+    """
+    Stack of layers rendered concurrently and flattened onto the pixels of a strip, bottom layer first.
+    Render functions run in a thread pool by default, numpy releases the GIL for operations on large arrays.
+    With a process pool render functions have to return their pixels as the layer is only a copy there.
+    """
+
+    def __init__(self, strip: LedStrip, *, workers: int = None, executor: concurrent.futures.Executor = None):
+        """
+        :param strip: strip receiving the flattened layers
+        :param workers: amount of render threads, defaults to the amount of cores
+        :param executor: executor to render layers with instead of an own thread pool
+        """
+        self.strip = strip
+        self.layers = []
+        self._own_executor = executor is None
+        self._executor = executor if executor is not None else concurrent.futures.ThreadPoolExecutor(workers)
+        self._composite = None
+        self._scratch = None
+        self._weight = None
+
+    def add_layer(
+            self,
+            name: str,
+            render: Callable[[Layer, float], Union[np.ndarray, Tuple[np.ndarray, np.ndarray], None]] = None,
+            *,
+            opacity: float = 1.0,
+            blend: str = 'alpha'
+    ) -> Layer:
+        """
+        Add a layer on top of all existing layers.
+        :param name: unique name of the layer
+        :param render: render function of the layer, see Layer
+        :param opacity: opacity in range(0.0, 1.0)
+        :param blend: blend mode, one of BLEND_MODES
+        :return: the new layer
+        """
+        if any(layer.name == name for layer in self.layers):
+            raise ValueError('Layer %r exists already' % name)
+        layer = Layer(name, self.strip.led_count, render, opacity=opacity, blend=blend)
+        self.layers.append(layer)
+        return layer
+
+    def remove_layer(self, name: str) -> None:
+        """
+        :param name: name of the layer to remove
+        """
+        self.layers.remove(self[name])
+
+    def __getitem__(self, name: str) -> Layer:
+        for layer in self.layers:
+            if layer.name == name:
+                return layer
+        raise KeyError(name)
+
+    def render(self, time: float) -> None:
+        """
+        Call the render functions of all visible layers concurrently and wait for them.
+        :param time: frame time passed to the render functions
+        """
+        layers = [layer for layer in self.layers if layer.visible and layer.render is not None]
+        futures = [self._executor.submit(layer.render, layer, time) for layer in layers]
+        for layer, future in zip(layers, futures):
+            result = future.result()
+            if isinstance(result, tuple):
+                layer.pixels[:], alpha = result
+                layer.alpha = None if alpha is None else np.asarray(alpha, dtype=float)
+            elif result is not None:
+                layer.pixels[:] = result
+
+    def flatten(self) -> None:
+        """
+        Blend all visible layers onto black and write the result to the pixels of the strip.
+        Every blend mode computes base + (blended - base) * alpha * opacity in place.
+        """
+        led_count = self.strip.led_count
+        if self._composite is None or len(self._composite) != led_count:
+            self._composite = np.empty((led_count, 3))
+            self._scratch = np.empty((led_count, 3))
+            self._weight = np.empty((led_count, 1))
+        base = self._composite
+        scratch = self._scratch
+        base[:] = 0.0
+
+        for layer in self.layers:
+            if not layer.visible or layer.opacity <= 0.0:
+                continue
+            if len(layer.pixels) != led_count:
+                raise ValueError('Layer %r has %d LEDs, strip has %d' % (layer.name, len(layer.pixels), led_count))
+
+            if layer.blend == 'add':
+                blended = np.add(base, layer.pixels, out=scratch)
+            elif layer.blend == 'max':
+                blended = np.maximum(base, layer.pixels, out=scratch)
+            elif layer.blend == 'multiply':
+                blended = np.multiply(base, layer.pixels, out=scratch)
+            else:
+                blended = layer.pixels
+
+            if layer.alpha is None and layer.opacity >= 1.0:
+                base[:] = blended
+                continue
+
+            np.subtract(blended, base, out=scratch)
+            if layer.alpha is None:
+                scratch *= layer.opacity
+            else:
+                np.multiply(layer.alpha, layer.opacity, out=self._weight[:, 0])
+                scratch *= self._weight
+            base += scratch
+
+        self.strip.load_pixels(base)
+
+    def frame(self, strip: LedStrip, time: float) -> None:
+        """
+        Render and flatten all layers, usable as render function of LedStrip.run.
+        :param strip: the strip of the compositor
+        :param time: frame time passed to the render functions
+        """
+        self.render(time)
+        self.flatten()
+
+    def close(self) -> None:
+        """
+        Shut down the own thread pool.
+        """
+        if self._own_executor:
+            self._executor.shutdown()
+
+
+@functools.lru_cache(maxsize=32)
+def _led_positions(led_count: int) -> np.ndarray:
+    """
+    Integer positions of all LEDs as floating point numbers, shared read-only by all effects of this length.
+    :param led_count: amount of LEDs
+    :return: array of shape (led_count,)
+    """
+    positions = np.arange(led_count, dtype=float)
+    positions.flags.writeable = False
+    return positions
+
+
+@functools.lru_cache(maxsize=32)
+def _led_phases(led_count: int) -> np.ndarray:
+    """
+    Positions of all LEDs along the strip in range(0.0, 1.0), shared read-only by all effects of this length.
+    :param led_count: amount of LEDs
+    :return: array of shape (led_count,)
+    """
+    phases = _led_positions(led_count) / max(led_count, 1)
+    phases.flags.writeable = False
+    return phases
 
 
-# Protocol specified by Open Pixel Control
-# http://openpixelcontrol.org
-class ProtocolOpc(Protocol):
-    CONNECTION_TYPE = 'tcp'
-    DATA_OFFSET = 4
-    RED_OFFSET = 0
-    GREEN_OFFSET = 1
-    BLUE_OFFSET = 2
-    LED_COUNT_HIGH_BYTE = 2
-    LED_COUNT_LOW_BYTE = 3
+@functools.lru_cache(maxsize=32)
+def _twinkle_table(led_count: int, seed: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Random phase, relative frequency in range(0.5, 1.5) and color choice in range(0.0, 1.0) per LED.
+    :param led_count: amount of LEDs
+    :param seed: seed of the random generator
+    :return: tuple of three arrays of shape (led_count,)
+    """
+    tables = np.random.RandomState(seed).random_sample((3, led_count))
+    tables[1] += 0.5
+    tables.flags.writeable = False
+    return tables[0], tables[1], tables[2]
 
 
-PROTOCOLS = {
-    'esp': ProtocolEsp,
-    'opc': ProtocolOpc,
-}
+@functools.lru_cache(maxsize=32)
+def _wave_table(size: int, sharpness: float) -> np.ndarray:
+    """
+    Positive half of a sine raised to a power over one period, shared read-only.
+    :param size: amount of entries
+    :param sharpness: exponent
+    :return: array of shape (size,)
+    """
+    table = np.maximum(np.sin(np.arange(size) * (2.0 * np.pi / size)), 0.0) ** sharpness
+    table.flags.writeable = False
+    return table
 
 
-class LedStrip:
+class Effect:
     """
-    Class managing led strip state information (e.g. connection information, color information before transmit)
+    Frame generator rendering all LEDs at once as a function of time.
+    Tables only depending on the amount of LEDs (positions, phases, palettes) are cached and shared between effects,
+    a frame is computed with a few vectorized operations into preallocated arrays.
+    render returns the same array every frame, copy it to keep a frame.
     """
 
-    def _refresh_parameters(self) -> None:
+    def __init__(self, led_count: int):
         """
-        Build consistent parameter list from possibly ambiguous user inputs
+        :param led_count: amount of LEDs
         """
-        # Transform all strip parameters for lists
-        if isinstance(self._led_count, int):
-            self._led_counts = [self._led_count]
-        else:
-            self._led_counts = self._led_count
+        self.led_count = led_count
+        self._output = np.zeros((led_count, 3))
 
-        if isinstance(self._ip, str):
-            self._ips = [self._ip]
-        else:
-            self._ips = self._ip
+    def render(self, time: float) -> np.ndarray:
+        """
+        :param time: time in seconds
+        :return: floating point rgb colors of shape (led_count, 3) in range(0.0, 1.0)
+        """
+        raise NotImplementedError
 
-        if isinstance(self._port, int):
-            self._ports = [self._port]
-        else:
-            self._ports = self._port
+    def frames(self, fps: float = 60.0, *, start: float = 0.0):
+        """
+        Generate frames at a fixed frame rate.
+        :param fps: frames per second
+        :param start: time of the first frame in seconds
+        :return: endless iterator of rendered frames
+        """
+        frame = 0
+        while True:
+            yield self.render(start + frame / fps)
+            frame += 1
 
-        if isinstance(self._protocol, List):
-            self._protocols = self._protocol
-        else:
-            self._protocols = [self._protocol]
+    def __call__(self, target: Union[LedStrip, Layer], time: float) -> Union[np.ndarray, None]:
+        """
+        Render function of LedStrip.run (writing all pixels at once) and of compositor layers (returning the frame).
+        :param target: strip or layer the frame is rendered for
+        :param time: time in seconds
+        """
+        pixels = self.render(time)
+        if isinstance(target, Layer):
+            return pixels
+        if target.led_count != self.led_count:
+            raise ValueError('Effect has %d LEDs, strip has %d' % (self.led_count, target.led_count))
+        target.load_pixels(pixels)
 
-        self._protocols = [PROTOCOLS[p] if isinstance(p, str) else p for p in self._protocols]
+    def _fade(self, brightness: np.ndarray, color: np.ndarray, background: np.ndarray) -> np.ndarray:
+        """
+        Write background + (color - background) * brightness to the output array.
+        One channel at a time, broadcasting over the short color axis is several times slower.
+        :param brightness: array of shape (led_count,)
+        :param color: rgb color at brightness 1.0
+        :param background: rgb color at brightness 0.0
+        :return: the output array
+        """
+        for channel in range(3):
+            column = self._output[:, channel]
+            np.multiply(brightness, color[channel] - background[channel], out=column)
+            column += background[channel]
+        return self._output
 
-        if isinstance(self._flip, bool):
-            self._flips = [self._flip]
-        else:
-            self._flips = self._flip
 
-        # A strip is defined by a set of ip and port
-        self._strip_count = max(len(self._ips), len(self._ports))
+class GradientScroll(Effect):
+    """
+    Colors of a palette spread over the strip and moving along it.
+    """
 
-        # Make all lists equal in length
-        if len(self._ips) < self._strip_count:
-            self._ips = self._ips + [self._ips[0]] * (self._strip_count - len(self._ips))
+    def __init__(
+            self,
+            led_count: int,
+            colors=((1.0, 0.0, 0.0), (0.0, 0.0, 1.0)),
+            *,
+            speed: float = 0.1,
+            scale: float = 1.0,
+            size: int = PALETTE_SIZE
+    ):
+        """
+        :param led_count: amount of LEDs
+        :param colors: rgb colors of a cyclic gradient
+        :param speed: palette cycles per second moving towards higher positions
+        :param scale: palette cycles over the whole strip
+        :param size: entries of the palette lookup table
+        """
+        super().__init__(led_count)
+        self.speed = speed
+        self.scale = scale
+        self.palette = gradient_palette(colors, size, cyclic=True)
+        self._position = np.empty(led_count)
+        self._indices = np.empty(led_count, dtype=np.intp)
 
-        if len(self._ports) < self._strip_count:
-            self._ports = self._ports + [self._ports[0]] * (self._strip_count - len(self._ports))
+    def render(self, time: float) -> np.ndarray:
+        size = len(self.palette)
+        position = self._position
+        np.multiply(_led_phases(self.led_count), self.scale * size, out=position)
+        position -= time * self.speed * size
+        np.floor(position, out=position)
+        np.copyto(self._indices, position, casting='unsafe')
+        return np.take(self.palette, self._indices, axis=0, out=self._output, mode='wrap')
 
-        if len(self._protocols) < self._strip_count:
-            self._protocols = self._protocols + [self._protocols[0]] * (self._strip_count - len(self._protocols))
 
-        if len(self._led_counts) > self._strip_count:
-            self._led_counts = self._led_counts[:self._strip_count]
-        elif len(self._led_counts) < self._strip_count:
-            self._led_counts = self._led_counts * self._strip_count
+class Rainbow(GradientScroll):
+    """
+    Full hue circle spread over the strip and moving along it.
+    """
 
-        if len(self._flips) > self._strip_count:
-            self._flips = self._flips[:self._strip_count]
-        elif len(self._flips) < self._strip_count:
-            self._flips = self._flips * self._strip_count
+    def __init__(
+            self,
+            led_count: int,
+            *,
+            speed: float = 0.1,
+            scale: float = 1.0,
+            saturation: float = 1.0,
+            value: float = 1.0,
+            size: int = PALETTE_SIZE
+    ):
+        """
+        :param led_count: amount of LEDs
+        :param speed: hue cycles per second moving towards higher positions
+        :param scale: hue cycles over the whole strip
+        :param saturation: saturation in range(0.0, 1.0)
+        :param value: value in range(0.0, 1.0)
+        :param size: entries of the hue lookup table
+        """
+        super().__init__(led_count, speed=speed, scale=scale, size=size)
+        self.palette = hue_palette(size, saturation, value)
 
-        if self._total_led_count != sum(self._led_counts):
-            self._total_led_count = sum(self._led_counts)
-            self._pixels = np.zeros((self._total_led_count, 3))
 
-        self._transmit_buffers = [np.zeros(c * 3 + self._protocols[i].DATA_OFFSET,
-                                  dtype=np.uint8) for i, c in enumerate(self._led_counts)]
-        self._transmit_buffers_dirty = True
-        self._socks = [None for _ in self._led_counts]
+class Chase(Effect):
+    """
+    Equally spaced segments of a color running along the strip, edges anti-aliased.
+    """
 
-    # Public variables
-    def _set_led_count(self, led_count: Union[int, List[int]]) -> None:
-        self._led_count = led_count
-        self._refresh_parameters()
+    def __init__(
+            self,
+            led_count: int,
+            color=(1.0, 1.0, 1.0),
+            *,
+            background=(0.0, 0.0, 0.0),
+            spacing: float = 8.0,
+            width: float = 2.0,
+            speed: float = 10.0
+    ):
+        """
+        :param led_count: amount of LEDs
+        :param color: rgb color of the segments
+        :param background: rgb color between the segments
+        :param spacing: LEDs from the start of one segment to the start of the next one
+        :param width: LEDs covered by a segment
+        :param speed: LEDs per second towards higher positions
+        """
+        super().__init__(led_count)
+        self.color = np.asarray(color, dtype=float)
+        self.background = np.asarray(background, dtype=float)
+        self.spacing = spacing
+        self.width = width
+        self.speed = speed
+        self._distance = np.empty(led_count)
+        self._coverage = np.empty(led_count)
+        self._wrapped = np.empty(led_count)
 
-    led_count = property(
-        fget=lambda self: self._total_led_count,
-        fset=_set_led_count,
-        doc='Amount of LEDs'
-    )
+    def render(self, time: float) -> np.ndarray:
+        spacing = self.spacing
+        width = min(self.width, spacing)
+        coverage = self._coverage
 
-    def _set_ip(self, ip: Union[str, List[str]]) -> None:
-        self._ip = ip
-        self._refresh_parameters()
+        # distance of every LED behind the start of the closest segment, floor based as np.remainder is slow
+        distance = self._distance
+        np.subtract(_led_positions(self.led_count), time * self.speed, out=distance)
+        np.multiply(distance, 1.0 / spacing, out=self._wrapped)
+        np.floor(self._wrapped, out=self._wrapped)
+        self._wrapped *= -spacing
+        distance += self._wrapped
 
-    ip = property(
-        fget=lambda self: self._ip,
-        fset=_set_ip,
-        doc='IP address used when transmit is called'
-    )
+        # part of the LED covered by the segment starting before it and by the one starting within it
+        np.subtract(width, distance, out=coverage)
+        np.clip(coverage, 0.0, 1.0, out=coverage)
+        np.subtract(distance, spacing - 1.0, out=self._wrapped)
+        np.clip(self._wrapped, 0.0, min(width, 1.0), out=self._wrapped)
+        coverage += self._wrapped
+        np.minimum(coverage, 1.0, out=coverage)
+        return self._fade(coverage, self.color, self.background)
 
-    def _set_port(self, port: Union[int, List[int]]) -> None:
-        self._port = port
-        self._refresh_parameters()
 
-    port = property(
-        fget=lambda self: self._port,
-        fset=_set_port,
-        doc='Port used when transmit is called'
-    )
+class Scanner(Effect):
+    """
+    Spot of a color sweeping back and forth over the strip.
+    """
 
-    def _set_protocol(self, protocol: Union[Protocol, List[Protocol]]) -> None:
-        self._protocol = protocol
-        self._refresh_parameters()
+    def __init__(
+            self,
+            led_count: int,
+            color=(1.0, 0.0, 0.0),
+            *,
+            background=(0.0, 0.0, 0.0),
+            width: float = 3.0,
+            period: float = 2.0
+    ):
+        """
+        :param led_count: amount of LEDs
+        :param color: rgb color of the spot
+        :param background: rgb color around the spot
+        :param width: LEDs from the center of the spot to where it fades out
+        :param period: seconds for a sweep from the first LED to the last one and back
+        """
+        super().__init__(led_count)
+        self.color = np.asarray(color, dtype=float)
+        self.background = np.asarray(background, dtype=float)
+        self.width = width
+        self.period = period
+        self._brightness = np.empty(led_count)
 
-    protocol = property(
-        fget=lambda self: self._protocol,
-        fset=_set_protocol,
-        doc='Protocol used when transmit is called'
-    )
+    def center(self, time: float) -> float:
+        """
+        :param time: time in seconds
+        :return: floating point position of the center of the spot
+        """
+        phase = (time / self.period) % 1.0
+        return (self.led_count - 1) * (1.0 - abs(2.0 * phase - 1.0))
 
-    def _set_flip(self, flip: Union[bool, List[bool]]) -> None:
-        self._flip = flip
-        self._refresh_parameters()
+    def render(self, time: float) -> np.ndarray:
+        brightness = self._brightness
+        np.subtract(_led_positions(self.led_count), self.center(time), out=brightness)
+        np.abs(brightness, out=brightness)
+        brightness *= -1.0 / self.width
+        brightness += 1.0
+        np.maximum(brightness, 0.0, out=brightness)
+        return self._fade(brightness, self.color, self.background)
 
-    flip = property(
-        fget=lambda self: self._flip,
-        fset=_set_flip,
-        doc='Flip LED positions, use led_count - pos - 1 as position'
-    )
 
-    def _set_power_limit(self, power_limit: float) -> None:
-        assert power_limit >= 0.0
-        assert power_limit <= 1.0
-        self._power_limit = power_limit
-        self._transmit_buffers_dirty = True
+class Twinkle(Effect):
+    """
+    LEDs fading in and out at random phases and rates, each in one of a set of colors.
+    Brightness only depends on time, so frames can be rendered in any order.
+    """
 
-    power_limit = property(
-        fget=lambda self: self._power_limit,
-        fset=_set_power_limit,
-        doc='Limit total power used by LED strip'
-    )
+    def __init__(
+            self,
+            led_count: int,
+            colors=((1.0, 1.0, 1.0),),
+            *,
+            rate: float = 0.5,
+            sharpness: float = 4.0,
+            seed: int = 0
+    ):
+        """
+        :param led_count: amount of LEDs
+        :param colors: rgb colors assigned to the LEDs at random
+        :param rate: average twinkles per second and LED
+        :param sharpness: exponent shortening the twinkles, 1.0 for a plain sine
+        :param seed: seed of the random phases, rates and colors
+        """
+        super().__init__(led_count)
+        self.rate = rate
+        self.sharpness = sharpness
+        self._phases, self._frequencies, choices = _twinkle_table(led_count, seed)
+        palette = np.array(_color_tuple(colors))
+        self.colors = palette[(choices * len(palette)).astype(int)]
+        self._position = np.empty(led_count)
+        self._indices = np.empty(led_count, dtype=np.intp)
+        self._brightness = np.empty(led_count)
+
+    def render(self, time: float) -> np.ndarray:
+        # brightness over one twinkle looked up instead of computing sine and power per LED
+        wave = _wave_table(PALETTE_SIZE, self.sharpness)
+        position = self._position
+        np.multiply(self._frequencies, time * self.rate, out=position)
+        position += self._phases
+        position *= len(wave)
+        np.floor(position, out=position)
+        np.copyto(self._indices, position, casting='unsafe')
+        np.take(wave, self._indices, out=self._brightness, mode='wrap')
+        for channel in range(3):
+            np.multiply(self.colors[:, channel], self._brightness, out=self._output[:, channel])
+        return self._output
+
+
+class Fire(Effect):
+    """
+    Simulated flames rising from the first LED: heat cools down, drifts towards higher positions and is rekindled
+    by random sparks near the base, then is looked up in a black body like palette.
+    The simulation advances in fixed steps, render catches up with the given time (at most one second).
+    """
 
     def __init__(
             self,
+            led_count: int,
             *,
-            config: Union[str, configparser.ConfigParser] = None,
-            led_count: Union[int, List[int]] = None,
-            ip: Union[str, List[str]] = None,
-            port: Union[int, List[int]] = None,
-            protocol: Union[Protocol, List[Protocol]] = None,
-            flip: Union[bool, List[bool]] = None,
-            power_limit: float = None,
-            loop: bool = None,
-            args=None
+            cooling: float = 0.05,
+            sparking: float = 0.5,
+            rate: float = 60.0,
+            colors=((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 1.0, 0.0), (1.0, 1.0, 1.0)),
+            seed: int = None
     ):
         """
-        :param config: configuration file
-        :param led_count: amount of LEDs (used for power and loop calculation)
-        :param ip: IP address used when transmit is called
-        :param port: Port used when transmit is called
-        :param protocol: Protocol used when transmit is called
-        :param flip: Flip LED positions, use led_count - pos - 1 as position
-        :param power_limit: limit power use running the LED strip on a small power source
-        :param loop: loop positions modulo led_count
-        :param args: argparse arguments
+        :param led_count: amount of LEDs
+        :param cooling: maximum heat in range(0.0, 1.0) an LED loses per step
+        :param sparking: probability of a new spark per step
+        :param rate: simulation steps per second
+        :param colors: rgb colors of a gradient from cold to hot
+        :param seed: seed of the random generator
         """
+        super().__init__(led_count)
+        self.cooling = cooling
+        self.sparking = sparking
+        self.rate = rate
+        self.palette = gradient_palette(colors, 256)
+        self.heat = np.zeros(led_count)
+        self._steps = None
+        self._random = np.random.default_rng(seed)
+        self._cooldown = np.empty(led_count)
+        self._drift = np.empty(max(led_count - 2, 0))
+        self._indices = np.empty(led_count, dtype=np.intp)
 
-        # Property variables per strip
-        self._led_count = 300
-        self._ip = '192.168.4.1'
-        self._port = 7777
-        self._protocol = ProtocolEsp
-        self._flip = False
+    def step(self) -> None:
+        """
+        Advance the simulation by one step.
+        """
+        heat = self.heat
+        self._random.random(out=self._cooldown)
+        self._cooldown *= self.cooling
+        heat -= self._cooldown
+        np.maximum(heat, 0.0, out=heat)
 
-        # Instance variables
-        self.loop = False
-        self._power_limit = 0.2
+        # every LED takes the heat of the two below it
+        if len(self._drift):
+            np.multiply(heat[:-2], 2.0, out=self._drift)
+            self._drift += heat[1:-1]
+            self._drift /= 3.0
+            heat[2:] = self._drift
 
-        # Misc private variables
-        self._socks = None
-        self._strip_count = None
-        self._total_led_count = None
-        self._led_counts = None
-        self._ips = None
-        self._ports = None
-        self._protocols = None
-        self._flips = None
-        self._pixels = None
-        self._transmit_buffers = None
-        self._transmit_buffers_dirty = True
+        if len(heat) and self._random.random() < self.sparking:
+            spark = self._random.integers(min(7, len(heat)))
+            heat[spark] = min(heat[spark] + self._random.uniform(0.6, 1.0), 1.0)
 
-        self._refresh_parameters()
+    def render(self, time: float) -> np.ndarray:
+        steps = int(time * self.rate)
+        if self._steps is None or steps < self._steps:
+            self._steps = steps - 1
+        for _ in range(min(steps - self._steps, int(self.rate))):
+            self.step()
+        self._steps = steps
 
-        self.set_parameters(
-            config=config,
-            led_count=led_count,
-            ip=ip,
-            port=port,
-            protocol=protocol,
-            flip=flip,
-            power_limit=power_limit,
-            loop=loop,
-            args=args
-        )
+        np.multiply(self.heat, len(self.palette) - 1, out=self._cooldown)
+        np.copyto(self._indices, self._cooldown, casting='unsafe')
+        return np.take(self.palette, self._indices, axis=0, out=self._output, mode='clip')
 
-    def set_parameters(
-            self,
-            *,
-            config: Union[str, configparser.ConfigParser] = None,
-            led_count: Union[int, List[int]] = None,
-            ip: Union[str, List[str]] = None,
-            port: Union[int, List[int]] = None,
-            protocol: Union[Protocol, List[Protocol]] = None,
-            flip: Union[bool, List[bool]] = None,
-            power_limit: float = None,
-            loop: bool = False,
-            args=None
-    ) -> None:
+
+# Effects by name
+EFFECTS = {
+    'rainbow': Rainbow,
+    'gradient': GradientScroll,
+    'chase': Chase,
+    'scanner': Scanner,
+    'twinkle': Twinkle,
+    'fire': Fire,
+}
+
+
+class Recorder:
+    """
+    Appends frames of a strip with their time to a file replayed by a Player.
+    The file starts with a header describing the strips, followed by records of a time, a payload size and the
+    payload: the encoded transmit buffers of all strips or the pixels as 8 bit levels, optionally zlib compressed.
+    Records are only ever appended, a file cut short loses at most its last frame.
+    """
+    MAGIC = b'PLR1'
+    HEADER = np.dtype([
+        ('magic', 'S4'),
+        ('content', 'S8'),
+        ('compressed', 'u1'),
+        ('strip_count', '<u4'),
+        ('frame_size', '<u4'),
+    ])
+    STRIP = np.dtype([
+        ('protocol', 'S32'),
+        ('size', '<u4'),
+    ])
+    RECORD = np.dtype([
+        ('time', '<f8'),
+        ('size', '<u4'),
+    ])
+
+    def __init__(self, path: str, strip: LedStrip, *, content: str = 'buffers', compress: bool = False,
+                 append: bool = False):
         """
-        :param config: configuration file
-        :param led_count: amount of LEDs (used for power and loop calculation)
-        :param ip: IP address used when transmit is called
-        :param port: Port used when transmit is called
-        :param protocol: Protocol used when transmit is called
-        :param flip: Flip LED positions, use led_count - pos - 1 as position
-        :param power_limit: used to limit power use when running the LED strip on a small power source
-        :param loop: loop positions modulo led_count
-        :param args: argparse arguments
+        :param path: file to record to
+        :param strip: strip whose frames are recorded
+        :param content: what to record, one of RECORDING_CONTENTS
+        :param compress: compress every frame with zlib
+        :param append: append to an existing recording of the same layout instead of replacing it
+        """
+        if content not in RECORDING_CONTENTS:
+            raise ValueError('Unknown recording content %r, use one of %s' % (content, ', '.join(RECORDING_CONTENTS)))
+        self.path = path
+        self.strip = strip
+        self.content = content
+        self.compress = compress
+        self.frames = 0
+        self._strips = self.layout(strip, content)
+        self._sizes = self._strips['size'].tolist()
+        self._levels = None
+        self._scratch = None
+        self._start = None
+        self._time_offset = 0.0
+
+        header = np.zeros((), dtype=self.HEADER)
+        header['magic'] = self.MAGIC
+        header['content'] = content.encode()
+        header['compressed'] = compress
+        header['strip_count'] = len(self._strips)
+        header['frame_size'] = sum(self._sizes)
+
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                existing, strips, times, _, _, end = _read_recording(buffer)
+            if existing != header or strips.tobytes() != self._strips.tobytes():
+                raise ValueError('Recording %r has a different layout' % path)
+            self._file = open(path, 'r+b')
+            # drop an incomplete last record
+            self._file.truncate(end)
+            self._file.seek(end)
+            self.frames = len(times)
+            if len(times) > 1:
+                self._time_offset = times[-1] + (times[-1] - times[0]) / (len(times) - 1)
+            elif len(times):
+                self._time_offset = times[-1]
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(header.tobytes())
+            self._file.write(self._strips.tobytes())
+
+    @classmethod
+    def layout(cls, strip: LedStrip, content: str) -> np.ndarray:
+        """
+        :return: table of protocol names and payload sizes per strip a recording of the strip has
+        """
+        strips = np.zeros(strip._strip_count, dtype=cls.STRIP)
+        for strip_index, protocol in enumerate(strip._protocols):
+            if content == 'buffers':
+                name = next((n for n, p in PROTOCOLS.items() if p is protocol), protocol.__name__)
+                strips[strip_index] = (name.encode(), len(strip._transmit_buffers[strip_index]))
+            else:
+                strips[strip_index] = (b'', strip._led_counts[strip_index] * 3)
+        return strips
+
+    def record(self, timestamp: float = None) -> None:
+        """
+        Append the current frame of the strip, encoding its pixels if necessary.
+        :param timestamp: time of the frame in seconds, defaults to the time since the first recorded frame
+        """
+        if timestamp is None:
+            now = time.perf_counter()
+            if self._start is None:
+                self._start = now
+            timestamp = self._time_offset + now - self._start
+
+        strip = self.strip
+        with strip._transmit_lock:
+            if self.content == 'buffers':
+                strip._update_buffers()
+                buffers = strip._transmit_buffers
+                if [len(b) for b in buffers] != self._sizes:
+                    raise ValueError('Strip parameters changed while recording')
+            else:
+                buffers = [self._quantized_pixels()]
+
+            if self.compress:
+                buffers = [zlib.compress(b''.join(buffers))]
+            record = np.array((timestamp, sum(len(b) for b in buffers)), dtype=self.RECORD)
+            self._file.write(record.tobytes())
+            for buffer in buffers:
+                self._file.write(buffer)
+        self.frames += 1
+
+    def _quantized_pixels(self) -> np.ndarray:
         """
-        configs = [config]
-        if args is not None and args.config is not None:
-            configs.append(args.config)
+        :return: pixels of the strip as 8 bit levels
+        """
+        pixels = self.strip._pixels
+        if pixels.shape[0] * 3 != sum(self._sizes):
+            raise ValueError('Strip parameters changed while recording')
+        if pixels.dtype == np.uint8:
+            return pixels
+        if self._levels is None or self._levels.shape != pixels.shape:
+            self._levels = np.empty(pixels.shape, dtype=np.uint8)
+            self._scratch = np.empty(pixels.shape)
+        np.multiply(pixels, 255.0, out=self._scratch)
+        np.clip(self._scratch, 0.0, 255.0, out=self._scratch)
+        # truncated like the levels of encoded frames
+        np.copyto(self._levels, self._scratch, casting='unsafe')
+        return self._levels
 
-        self.read_configs(configs)
+    def close(self) -> None:
+        self._file.close()
 
-        if args is not None:
-            self.read_args(args)
+    def __enter__(self) -> 'Recorder':
+        return self
 
-        if led_count is not None:
-            self.led_count = led_count
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
-        if ip is not None:
-            self.ip = ip
 
-        if port is not None:
-            self.port = port
+def _read_recording(buffer) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Parse the header of a recording and index its complete records.
+    :param buffer: contents of the recording
+    :return: header, strip table, times, payload offsets and payload sizes of the records, end of the last record
+    """
+    offset = Recorder.HEADER.itemsize
+    if len(buffer) < offset:
+        raise ValueError('Not a pyledstrip recording')
+    # parse copies so no views of the buffer remain
+    header = np.frombuffer(bytes(buffer[:offset]), dtype=Recorder.HEADER)[0]
+    if header['magic'] != Recorder.MAGIC:
+        raise ValueError('Not a pyledstrip recording')
+    strips_size = int(header['strip_count']) * Recorder.STRIP.itemsize
+    strips = np.frombuffer(bytes(buffer[offset:offset + strips_size]), dtype=Recorder.STRIP)
+    offset += strips_size
 
-        if protocol is not None:
-            self.protocol = protocol
+    if not header['compressed']:
+        # fixed size records are indexed without reading them
+        frame_size = int(header['frame_size'])
+        record_size = Recorder.RECORD.itemsize + frame_size
+        count = (len(buffer) - offset) // record_size
+        records = np.ndarray((count,), dtype=np.dtype({'names': ['time'], 'formats': ['<f8'],
+                                                       'itemsize': record_size}),
+                             buffer=buffer, offset=offset)
+        times = records['time'].copy()
+        del records
+        offsets = offset + Recorder.RECORD.itemsize + np.arange(count) * record_size
+        return header, strips, times, offsets, np.full(count, frame_size), offset + count * record_size
 
-        if flip is not None:
-            self.flip = flip
+    times = []
+    offsets = []
+    sizes = []
+    while offset + Recorder.RECORD.itemsize <= len(buffer):
+        time, size = struct.unpack_from('<dI', buffer, offset)
+        if offset + Recorder.RECORD.itemsize + size > len(buffer):
+            break
+        times.append(time)
+        offsets.append(offset + Recorder.RECORD.itemsize)
+        sizes.append(size)
+        offset += Recorder.RECORD.itemsize + size
+    return header, strips, np.array(times), np.array(offsets, dtype=np.intp), np.array(sizes, dtype=np.intp), offset
 
-        if power_limit is not None:
-            self.power_limit = power_limit
 
-        if loop is not None:
-            self.loop = loop
+class Player:
+    """
+    Replays a recording on a strip with the recorded timing.
+    The file is memory mapped, frames of recorded transmit buffers are sent without any render or encode work.
+    Frames which are late by more than a frame interval are skipped to keep the timing.
+    """
 
-    def read_configs(self, configs: List[Union[str, configparser.ConfigParser]]) -> None:
+    def __init__(
+            self,
+            path: str,
+            strip: LedStrip,
+            *,
+            spin: float = 0.0005,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep
+    ):
         """
-        :param configs: configuration files
+        :param path: recording written by a Recorder
+        :param strip: strip to play on, needs the layout it was recorded with
+        :param spin: time in seconds to busy wait before a frame is due instead of sleeping
+        :param clock: monotonic time source
+        :param sleep: sleep function
         """
-        config = configparser.ConfigParser()
-        global_config_file = os.path.expanduser('~/.pyledstrip.ini')
-        if os.path.exists(global_config_file):
-            config.read(global_config_file)
-        for input_config in configs:
-            if isinstance(input_config, str):
-                # Assume config file name was passed
-                config_file = input_config
-                config.read(config_file)
-            elif input_config is not None:
-                # Any actual ConfigParser object overrides the current config
-                # completely.
-                config = input_config
+        self.path = path
+        self.strip = strip
+        self.spin = spin
+        self.position = 0
+        self.skipped_frames = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header, strips, self.times, self._offsets, self._sizes, _ = _read_recording(self._mmap)
+            self.content = header['content'].decode()
+            self._compressed = bool(header['compressed'])
+            if self.content == 'buffers':
+                matches = strips.tobytes() == Recorder.layout(strip, self.content).tobytes()
+            else:
+                matches = int(header['frame_size']) == strip._total_led_count * 3
+            if not matches:
+                raise ValueError('Recording %r does not match the layout of the strip' % path)
+        except ValueError:
+            self.close()
+            raise
 
-        if 'pyledstrip' not in config:
-            print('Section "pyledstrip" not found in config')
-            return
+        if len(self.times) > 1:
+            # a loop lasts as long as the recording plus an average frame interval
+            self._period = (self.times[-1] - self.times[0]) * len(self.times) / (len(self.times) - 1)
+        else:
+            self._period = 0.0
 
-        section = config['pyledstrip']
+    frame_count = property(
+        fget=lambda self: len(self.times),
+        doc='Amount of recorded frames'
+    )
 
-        if 'led_count' in section:
-            self.led_count = [int(p) for p in shlex.split(section.get('led_count'))]
+    duration = property(
+        fget=lambda self: float(self.times[-1] - self.times[0]) if len(self.times) else 0.0,
+        doc='Time in seconds from the first to the last frame'
+    )
 
-        if 'ip' in section:
-            self.ip = shlex.split(section.get('ip'))
+    def seek(self, seconds: float) -> None:
+        """
+        Continue playing at the frame shown at a time.
+        :param seconds: time since the first frame
+        """
+        if len(self.times):
+            index = np.searchsorted(self.times, self.times[0] + seconds, side='right') - 1
+            self.position = int(min(max(index, 0), len(self.times) - 1))
 
-        if 'port' in section:
-            self.port = [int(p) for p in shlex.split(section.get('port'))]
+    def frame(self, index: int) -> np.ndarray:
+        """
+        :param index: frame index
+        :return: payload of a frame, a view of the file if it is not compressed
+        """
+        offset, size = int(self._offsets[index]), int(self._sizes[index])
+        if self._compressed:
+            with memoryview(self._mmap) as view:
+                return np.frombuffer(zlib.decompress(view[offset:offset + size]), dtype=np.uint8)
+        return np.ndarray((size,), dtype=np.uint8, buffer=self._mmap, offset=offset)
 
-        if 'protocol' in section:
-            self.protocol = [PROTOCOLS[p] for p in shlex.split(section.get('protocol'))]
+    def show(self, index: int) -> None:
+        """
+        Transmit a single frame.
+        :param index: frame index
+        """
+        data = self.frame(index)
+        if self.content == 'buffers':
+            self.strip._transmit_encoded(data)
+        else:
+            self.strip.load_pixels(data.reshape(-1, 3))
+            self.strip.transmit()
 
-        if 'flip' in section:
-            self.flip = [bool(f) for f in shlex.split(section.get('flip'))]
+    def play(self, *, loop: bool = False, speed: float = 1.0, frames: int = None) -> int:
+        """
+        Transmit frames from the current position on with the recorded timing.
+        :param loop: restart at the first frame after the last one
+        :param speed: playback speed factor
+        :param frames: stop after this amount of frames
+        :return: amount of frames shown
+        """
+        assert speed > 0.0
+        count = len(self.times)
+        shown = 0
+        if count == 0:
+            return shown
+        if self.position >= count:
+            # a previous play reached the end
+            if not loop:
+                return shown
+            self.position = 0
 
-        if 'power_limit' in section:
-            self.power_limit = section.getfloat('power_limit')
+        start = self._clock()
+        # recorded time shown at start
+        origin = self.times[self.position]
+        while frames is None or shown < frames:
+            if self.position >= count:
+                if not loop:
+                    break
+                self.position = 0
+                origin -= self._period
 
-        if 'loop' in section:
-            self.loop = section.getboolean('loop')
+            now = self._clock()
+            late = np.searchsorted(self.times, origin + (now - start) * speed, side='right') - 1
+            if late > self.position:
+                self.skipped_frames += int(late) - self.position
+                self.position = int(late)
 
-    def read_args(self, args) -> None:
+            deadline = start + (self.times[self.position] - origin) / speed
+            delay = deadline - now
+            if delay > self.spin:
+                self._sleep(delay - self.spin)
+            while self._clock() < deadline:
+                pass
+
+            self.show(self.position)
+            self.position += 1
+            shown += 1
+        return shown
+
+    def close(self) -> None:
         """
-        :param args: argparse arguments
+        Unmap the recording, frames returned by frame() must not be used afterwards.
         """
-        if args.led_count is not None:
-            self.led_count = args.led_count
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
 
-        if args.ip is not None:
-            self.ip = args.ip
+    def __enter__(self) -> 'Player':
+        return self
 
-        if args.port is not None:
-            self.port = args.port
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
-        if args.protocol is not None:
-            self.protocol = args.protocol
 
-        if args.flip is not None:
-            self.flip = args.flip
+async def _sock_recv_into(loop: asyncio.AbstractEventLoop, sock: socket.socket, view: memoryview) -> int:
+    """
+    loop.sock_recv_into, on Python < 3.7 received with sock_recv and copied into the buffer.
+    :return: amount of bytes received
+    """
+    if hasattr(loop, 'sock_recv_into'):
+        return await loop.sock_recv_into(sock, view)
+    data = await loop.sock_recv(sock, len(view))
+    view[:len(data)] = data
+    return len(data)
 
-        if args.power_limit is not None:
-            self.power_limit = args.power_limit
 
-        if args.loop is not None:
-            self.loop = args.loop
+class _ReceivedStrip:
+    """
+    Frame assembly and counters of a strip received by a Receiver.
+    """
 
-    def __str__(self):
-        return pprint.pformat({
-            'LED Count': self.led_count,
-            'IP': self.ip,
-            'Port': self.port,
-            'Protocol': self.protocol,
-            'Flip': self.flip,
-            'Power Limit': self.power_limit,
-            'Loop': self.loop,
-        })
+    def __init__(self, protocol: type, led_count: int):
+        self.protocol = protocol
+        self.led_count = led_count
+        self.buffer = np.zeros(protocol.buffer_size(led_count), dtype=np.uint8)
+        self.data = protocol.data(self.buffer, led_count)
+        self.pixels = np.zeros((led_count, 3), dtype=np.uint8)
+        self.frames = 0
+        self.bytes = 0
+        self.lost = 0
+        self.reordered = 0
+        self.errors = 0
+        self.sequence = None
+        self.frame_start = None
+        self.last_frame_time = None
+        self.smoothed_interval = None
+        self.interval = _Timing()
+        self.latency = _Timing()
 
-    def set_pixel_rgb(self, pos: int, red: float, green: float, blue: float) -> None:
+    def frame_done(self, now: float) -> None:
+        self.frames += 1
+        if self.frame_start is not None:
+            self.latency.add(now - self.frame_start)
+            self.frame_start = None
+        if self.last_frame_time is not None:
+            interval = now - self.last_frame_time
+            self.interval.add(interval)
+            if self.smoothed_interval is None:
+                self.smoothed_interval = interval
+            else:
+                self.smoothed_interval += _Stats.FPS_SMOOTHING * (interval - self.smoothed_interval)
+        self.last_frame_time = now
+
+    def snapshot(self) -> dict:
+        return {
+            'frames': self.frames,
+            'bytes_received': self.bytes,
+            'fps': 1.0 / self.smoothed_interval if self.smoothed_interval else 0.0,
+            'frame_interval': self.interval.snapshot(),
+            'latency': self.latency.snapshot(),
+            'lost_frames': self.lost,
+            'reordered_frames': self.reordered,
+            'errors': self.errors,
+        }
+
+
+class Receiver:
+    """
+    Receives frames in the wire formats of ProtocolEsp (UDP, also RGBW and fragmented) and ProtocolOpc (TCP) and
+    decodes them back into pixels, to see what transmit() sent and to load test senders on loopback.
+    Every strip listens on a port of its own. Frames are received into preallocated buffers by one asyncio task per
+    socket and only decoded when pixels() is called or on_frame is set.
+    Lost and reordered frames are detected from the frame counter of fragmented ESP frames. Latency is the time from
+    the first to the last packet of a frame, receive times passed to on_frame come from time.perf_counter.
+    """
+    # receive buffer size of datagram sockets
+    SOCKET_BUFFER_SIZE = 1 << 22
+
+    def __init__(
+            self,
+            led_count: Union[int, List[int]],
+            *,
+            protocol: Union[str, type, List[Union[str, type]]] = 'esp',
+            port: Union[int, List[int]] = 0,
+            host: Union[str, List[str]] = '127.0.0.1',
+            on_frame: Callable[[int, np.ndarray, float], None] = None
+    ):
         """
-        Set floating point rgb values at integer position.
-        :param pos: integer led position
-        :param red: red value in range(0.0, 1.0)
-        :param green: green value in range(0.0, 1.0)
-        :param blue: blue value in range(0.0, 1.0)
+        :param led_count: amount of LEDs per strip
+        :param protocol: protocol per strip
+        :param port: port per strip, 0 picks a free port (see ports)
+        :param host: address to listen on (per strip), strips on the same host need different ports
+        :param on_frame: called with the strip index, the decoded pixels and the receive time of every frame
         """
-        if self.loop:
-            pos %= self._total_led_count
+        led_counts = led_count if isinstance(led_count, list) else [led_count]
+        protocols = protocol if isinstance(protocol, list) else [protocol]
+        ports = port if isinstance(port, list) else [port]
+        hosts = host if isinstance(host, list) else [host]
+        strip_count = max(len(led_counts), len(protocols), len(ports), len(hosts))
+        led_counts = led_counts + [led_counts[-1]] * (strip_count - len(led_counts))
+        protocols = protocols + [protocols[-1]] * (strip_count - len(protocols))
+        hosts = hosts + [hosts[-1]] * (strip_count - len(hosts))
+        ports = ports + [ports[-1]] * (strip_count - len(ports))
+        addresses = [(h, p) for h, p in zip(hosts, ports) if p != 0]
+        for address in set(addresses):
+            if addresses.count(address) > 1:
+                raise ValueError('Several strips listen on %s port %d, give them different ports or hosts' % address)
 
-        if 0 <= pos < self._total_led_count:
-            self._pixels[pos] = [red, green, blue]
-            self._transmit_buffers_dirty = True
+        self.hosts = hosts
+        self.on_frame = on_frame
+        self.strips = []
+        self._sockets = []
+        self._loop = None
+        self._thread = None
+        self._stopped = None
+        try:
+            for led_count, protocol, host, port in zip(led_counts, protocols, hosts, ports):
+                protocol = PROTOCOLS[protocol] if isinstance(protocol, str) else protocol
+                if not issubclass(protocol, (ProtocolEsp, ProtocolOpc)):
+                    raise ValueError('Receiver does not support %s' % protocol.__name__)
+                if protocol.CONNECTION_TYPE == 'udp':
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE)
+                else:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self._sockets.append(sock)
+                sock.bind((host, port))
+                if protocol.CONNECTION_TYPE == 'tcp':
+                    sock.listen(16)
+                sock.setblocking(False)
+                self.strips.append(_ReceivedStrip(protocol, led_count))
+        except (OSError, ValueError):
+            self.close()
+            raise
 
-    def add_pixel_rgb(self, pos: int, red: float, green: float, blue: float) -> None:
+    @classmethod
+    def for_strip(cls, strip: LedStrip, host: Union[str, List[str]] = None, **kwargs) -> 'Receiver':
         """
-        Add floating point rgb values at integer position.
-        :param pos: integer led position
-        :param red: red value in range(0.0, 1.0)
-        :param green: green value in range(0.0, 1.0)
-        :param blue: blue value in range(0.0, 1.0)
+        Receiver listening on the ports of all strips of a LedStrip.
+        :param strip: configured strip
+        :param host: address to listen on (per strip), by default the IP of a strip if it is a loopback address
+            (127.x.x.x, so several controllers on the same port can be simulated) and 127.0.0.1 otherwise
+        :param kwargs: further arguments of Receiver
         """
-        if self.loop:
-            pos %= self._total_led_count
+        if host is None:
+            host = [ip if ip.startswith('127.') else '127.0.0.1' for ip in strip._ips]
+        return cls(strip._led_counts, protocol=strip._protocols, port=strip._ports, host=host, **kwargs)
 
-        if 0 <= pos < self._total_led_count:
-            self._pixels[pos] += [red, green, blue]
-            self._transmit_buffers_dirty = True
+    ports = property(
+        fget=lambda self: [sock.getsockname()[1] for sock in self._sockets],
+        doc='Port of every strip'
+    )
 
-    def set_rgb(self, pos: float, red: float, green: float, blue: float) -> None:
+    async def serve(self) -> None:
         """
-        Set floating point rgb values at floating point position (interpolated automatically).
-        :param pos: floating point led position
-        :param red: red value in range(0.0, 1.0)
-        :param green: green value in range(0.0, 1.0)
-        :param blue: blue value in range(0.0, 1.0)
+        Receive until stop() is called.
         """
-        self._call_interpolated(self.set_pixel_rgb, pos, red, green, blue)
+        self._stopped = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        tasks = []
+        for strip_index, sock in enumerate(self._sockets):
+            if self.strips[strip_index].protocol.CONNECTION_TYPE == 'udp':
+                tasks.append(loop.create_task(self._receive_datagrams(loop, strip_index, sock)))
+            else:
+                tasks.append(loop.create_task(self._accept(loop, strip_index, sock)))
+        try:
+            await self._stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
-    def add_rgb(self, pos: float, red: float, green: float, blue: float) -> None:
+    def start(self) -> 'Receiver':
         """
-        Add floating point rgb values at floating point position (interpolated automatically).
-        :param pos: floating point led position
-        :param red: red value in range(0.0, 1.0)
-        :param green: green value in range(0.0, 1.0)
-        :param blue: blue value in range(0.0, 1.0)
+        Receive in a background thread.
         """
-        self._call_interpolated(self.add_pixel_rgb, pos, red, green, blue)
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
 
-    def set_hsv(self, pos: float, hue: float, saturation: float, value: float) -> None:
+        async def serve():
+            task = asyncio.ensure_future(self.serve())
+            await asyncio.sleep(0)
+            started.set()
+            await task
+
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(serve(),),
+                                        name='pyledstrip-receiver', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self) -> None:
         """
-        Set floating point hsv values at floating point position (interpolated automatically).
-        :param pos: floating point led position
-        :param hue: hue value in range(0.0, 1.0)
-        :param saturation: saturation value in range(0.0, 1.0)
-        :param value: brightness value in range(0.0, 1.0)
+        Stop receiving, waits for the background thread if start() was used.
         """
-        rgb = colorsys.hsv_to_rgb(hue, saturation, value)
-        self.set_rgb(pos, rgb[0], rgb[1], rgb[2])
+        if self._stopped is not None:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._stopped.set)
+            else:
+                self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self._loop.close()
+            self._loop = None
 
-    def add_hsv(self, pos: float, hue: float, saturation: float, value: float) -> None:
+    def close(self) -> None:
+        self.stop()
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = []
+
+    def __enter__(self) -> 'Receiver':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _frame_done(self, strip_index: int, received: _ReceivedStrip) -> None:
+        now = time.perf_counter()
+        received.frame_done(now)
+        if self.on_frame is not None:
+            self.on_frame(strip_index, self.pixels(strip_index), now)
+
+    async def _receive_datagrams(self, loop: asyncio.AbstractEventLoop, strip_index: int, sock: socket.socket) -> None:
+        received = self.strips[strip_index]
+        protocol = received.protocol
+        fragmented = issubclass(protocol, ProtocolEspFragmented)
+        # unfragmented frames are received straight into the frame buffer
+        buffer = bytearray(1 << 16) if fragmented else received.buffer
+        view = memoryview(buffer)
+        led_size = protocol.led_size()
+        while True:
+            size = await _sock_recv_into(loop, sock, view)
+            received.bytes += size
+            if not fragmented:
+                if size != len(buffer):
+                    received.errors += 1
+                    continue
+                self._frame_done(strip_index, received)
+                continue
+
+            header_size = ProtocolEspFragmented.HEADER_SIZE
+            if size < header_size:
+                received.errors += 1
+                continue
+            sequence = buffer[0] & 0x7f
+            start = (buffer[1] << 8 | buffer[2]) * led_size
+            end = start + size - header_size
+            if end > len(received.buffer):
+                received.errors += 1
+                continue
+            if received.frame_start is None:
+                received.frame_start = time.perf_counter()
+            received.buffer[start:end] = view[header_size:size]
+            if not buffer[0] & ProtocolEspFragmented.LAST_FRAGMENT:
+                continue
+
+            if received.sequence is not None:
+                step = (sequence - received.sequence) % 128
+                if step >= 64:
+                    received.reordered += 1
+                elif step > 1:
+                    received.lost += step - 1
+            if received.sequence is None or (sequence - received.sequence) % 128 < 64:
+                received.sequence = sequence
+            self._frame_done(strip_index, received)
+
+    async def _accept(self, loop: asyncio.AbstractEventLoop, strip_index: int, sock: socket.socket) -> None:
+        connections = set()
+        try:
+            while True:
+                connection, _ = await loop.sock_accept(sock)
+                connection.setblocking(False)
+                connections.add(loop.create_task(self._receive_stream(loop, strip_index, connection)))
+                connections = {task for task in connections if not task.done()}
+        finally:
+            for task in connections:
+                task.cancel()
+
+    async def _receive_stream(self, loop: asyncio.AbstractEventLoop, strip_index: int,
+                              connection: socket.socket) -> None:
+        received = self.strips[strip_index]
+        header_size = received.protocol.DATA_OFFSET
+        view = memoryview(received.buffer)
+        header = bytearray(header_size)
+        discard = bytearray(1 << 16)
+        try:
+            while True:
+                if not await self._receive_exactly(loop, connection, memoryview(header)):
+                    return
+                received.frame_start = time.perf_counter()
+                # the length field holds the amount of data bytes, a partial LED at the end is skipped
+                length = header[ProtocolOpc.LED_COUNT_HIGH_BYTE] << 8 | header[ProtocolOpc.LED_COUNT_LOW_BYTE]
+                size = length // received.protocol.led_size() * received.protocol.led_size()
+                valid = header[1] == 0 and header_size + size <= len(received.buffer)
+                if valid:
+                    if not await self._receive_exactly(loop, connection, view[header_size:header_size + size]):
+                        return
+                    remaining = length - size
+                else:
+                    # other commands and frames of other lengths are skipped
+                    received.errors += 1
+                    remaining = length
+                while remaining > 0:
+                    chunk = min(remaining, len(discard))
+                    if not await self._receive_exactly(loop, connection, memoryview(discard)[:chunk]):
+                        return
+                    remaining -= chunk
+                if valid:
+                    received.bytes += header_size + length
+                    self._frame_done(strip_index, received)
+        finally:
+            connection.close()
+
+    @staticmethod
+    async def _receive_exactly(loop: asyncio.AbstractEventLoop, connection: socket.socket,
+                               view: memoryview) -> bool:
         """
-        Add floating point hsv values at floating point position (interpolated automatically).
-        :param pos: floating point led position
-        :param hue: hue value in range(0.0, 1.0)
-        :param saturation: saturation value in range(0.0, 1.0)
-        :param value: brightness value in range(0.0, 1.0)
+        :return: False if the connection was closed before view was filled
         """
-        rgb = colorsys.hsv_to_rgb(hue, saturation, value)
-        self.add_rgb(pos, rgb[0], rgb[1], rgb[2])
+        position = 0
+        while position < len(view):
+            size = await _sock_recv_into(loop, connection, view[position:])
+            if size == 0:
+                return False
+            position += size
+        return True
 
-    def clear(self) -> None:
+    def pixels(self, strip_index: int) -> np.ndarray:
         """
-        Set all pixels to black. Needs call to transmit() to take effect.
+        :param strip_index: index of the strip
+        :return: red, green and blue levels of the last frame received, shaped (led_count, 3)
         """
-        for pos in range(0, self._total_led_count):
-            self.set_pixel_rgb(pos, 0, 0, 0)
+        received = self.strips[strip_index]
+        received.protocol.decode(received.data, received.pixels)
+        return received.pixels
 
-    def _update_buffers(self) -> None:
+    def wait(self, frames: int, timeout: float = 1.0) -> bool:
         """
-        Clamp colors to range(0.0, 1.0), limit power use and convert colors to buffer.
+        Wait until every strip received an amount of frames.
+        :param frames: frames per strip
+        :param timeout: maximum time to wait in seconds
+        :return: False on timeout
         """
+        deadline = time.monotonic() + timeout
+        while any(received.frames < frames for received in self.strips):
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
 
-        # clamp individual colors
-        pixels = np.copy(self._pixels)
-        pixels = np.clip(pixels, 0.0, 1.0)
+    def stats(self) -> dict:
+        """
+        :return: dict with a snapshot of the counters of every strip, times in seconds
+        """
+        strips = [received.snapshot() for received in self.strips]
+        return {
+            'frames': sum(s['frames'] for s in strips),
+            'bytes_received': sum(s['bytes_received'] for s in strips),
+            'histogram_buckets': list(STATS_BUCKETS),
+            'strips': strips,
+        }
 
-        # limit power use
-        power_use = np.sum(pixels / 3) / self._total_led_count
-        if power_use > self._power_limit:
-            brightness_factor = self._power_limit / power_use
-            pixels *= brightness_factor
 
-        # calculate length of the buffer if the protocol requires it
-        for strip_index in range(self._strip_count):
-            protocol = self._protocols[strip_index]
-            if (protocol.LED_COUNT_HIGH_BYTE is not None
-                and protocol.LED_COUNT_LOW_BYTE is not None):
-                transmit_buffer = self._transmit_buffers[strip_index]
-                transmit_buffer[protocol.LED_COUNT_HIGH_BYTE] = (
-                    min(int(self._led_counts[strip_index] / 256), 255))
-                transmit_buffer[protocol.LED_COUNT_LOW_BYTE] = (
-                    self._led_counts[strip_index] % 256)
-
-        # convert floating point pixels to bytes
-        pixels *= 255
-        pixels = pixels.astype(int)
+class Relay:
+    """
+    Accepts OPC frames from many producers and re-emits them at a fixed rate to the strips of a LedStrip, so all
+    producers share a single set of controller connections.
+    OPC channel 0 addresses all LEDs starting at the first one, channel n the LEDs of strip n - 1. Per strip the
+    frame of the active client with the highest priority (the latest of equal priorities) is shown, or the highest
+    level of all active clients with merge 'max'. A client is active on a strip for timeout seconds after it sent a
+    frame for it, strips without active clients keep their last frame.
+    Every client slot has a preallocated frame buffer, newer frames replace older ones, so memory use is bounded by
+    max_clients independent of the inbound frame rate.
+    """
 
-        # update data part of the transmit buffer
-        i = 0
-        for strip_index, led_count in enumerate(self._led_counts):
-            protocol = self._protocols[strip_index]
-            transmit_buffer = self._transmit_buffers[strip_index]
+    def __init__(
+            self,
+            strip: LedStrip,
+            *,
+            port: Union[int, List[int]] = 7890,
+            priority: Union[int, List[int]] = 0,
+            host: str = '0.0.0.0',
+            merge: str = 'priority',
+            fps: float = 60.0,
+            timeout: float = 1.0,
+            max_clients: int = 64
+    ):
+        """
+        :param strip: strips to re-emit frames to, switched to uint8 pixels
+        :param port: ports to accept clients on, 0 picks a free port (see ports)
+        :param priority: priority of the clients of every port
+        :param host: address to listen on
+        :param merge: merging of frames from several clients, one of MERGE_MODES
+        :param fps: output frame rate, limited to what the strips can display
+        :param timeout: seconds a client stays active on a strip after its last frame for it
+        :param max_clients: maximum amount of connected clients, further connections are closed
+        """
+        if merge not in MERGE_MODES:
+            raise ValueError('Unknown merge mode %r, use one of %s' % (merge, ', '.join(MERGE_MODES)))
+        ports = port if isinstance(port, list) else [port]
+        priorities = priority if isinstance(priority, list) else [priority]
+        priorities = priorities + [priorities[-1]] * (len(ports) - len(priorities))
 
-            start = i
-            end = i + led_count
-            i += led_count
+        strip.pixel_dtype = 'uint8'
+        self.strip = strip
+        self.merge = merge
+        self.interval = max(1.0 / fps, strip.min_frame_interval)
+        self.timeout = timeout
+        self.max_clients = max_clients
+        self.clients = 0
+        self.rejected_clients = 0
+        self.frames_received = 0
+        self.frames_invalid = 0
+        self.frames_sent = 0
 
-            strip_pixels = pixels[start:end]
-            if self._flips[strip_index]:
-                strip_pixels = np.flip(strip_pixels, 0)
+        led_count = strip._total_led_count
+        # frame buffer, priority and last update per strip of every client slot
+        self._buffers = np.zeros((max_clients, led_count, 3), dtype=np.uint8)
+        self._priorities = np.zeros(max_clients)
+        self._times = np.full((max_clients, strip._strip_count), -np.inf)
+        self._free_slots = list(range(max_clients))
+        self._emitted_times = np.full(strip._strip_count, -np.inf)
+        self._emitted_active = np.zeros((max_clients, strip._strip_count), dtype=bool)
+        self._emitted_winners = np.full(strip._strip_count, -1)
+        self._stopped = None
 
-            red = strip_pixels[:,0]
-            green = strip_pixels[:,1]
-            blue = strip_pixels[:,2]
+        self._sockets = []
+        try:
+            for port, priority in zip(ports, priorities):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self._sockets.append(sock)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind((host, port))
+                sock.listen(max_clients)
+                sock.setblocking(False)
+            self._port_priorities = priorities
+        except OSError:
+            self.close()
+            raise
 
-            # write to buffer in strides per color
-            data = transmit_buffer[protocol.DATA_OFFSET:]
-            data = data.reshape((len(data) // 3, 3))
-            data[:,protocol.RED_OFFSET] = red
-            data[:,protocol.GREEN_OFFSET] = green
-            data[:,protocol.BLUE_OFFSET] = blue
+    ports = property(
+        fget=lambda self: [sock.getsockname()[1] for sock in self._sockets],
+        doc='Port of every listening socket'
+    )
 
-        self._transmit_buffers_dirty = False
+    async def serve(self) -> None:
+        """
+        Accept clients and transmit merged frames until stop() is called.
+        """
+        self._stopped = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        tasks = [loop.create_task(self._accept(loop, sock, priority))
+                 for sock, priority in zip(self._sockets, self._port_priorities)]
+        tasks.append(loop.create_task(self._emit()))
+        try:
+            await self._stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.strip.close_async()
 
-    def transmit(self) -> None:
+    def stop(self) -> None:
+        if self._stopped is not None:
+            self._stopped.set()
+
+    def close(self) -> None:
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = []
+
+    def stats(self) -> dict:
         """
-        Update buffer and transmit to LED strip.
+        :return: dict of client and frame counters
         """
-        if self._transmit_buffers_dirty:
-            self._update_buffers()
+        return {
+            'clients': self.clients,
+            'rejected_clients': self.rejected_clients,
+            'frames_received': self.frames_received,
+            'frames_invalid': self.frames_invalid,
+            'frames_sent': self.frames_sent,
+        }
 
-        for i in range(self._strip_count):
-            protocol = self._protocols[i]
-            if not self._socks[i]:
-                if protocol.CONNECTION_TYPE == 'udp':
-                    self._socks[i] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                else:
-                    self._socks[i] = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    res = self._socks[i].connect_ex((self._ips[i], self._ports[i]))
-                    if res != 0:
-                        self._socks[i] = None
-                        continue
-
-            if protocol.CONNECTION_TYPE == 'udp':
-                self._socks[i].sendto(self._transmit_buffers[i], (self._ips[i], self._ports[i]))
-            else:
-                try:
-                    self._socks[i].sendall(self._transmit_buffers[i])
-                except (ConnectionResetError, BrokenPipeError):
-                    self._socks[i] = None
+    async def _emit(self) -> None:
+        deadline = time.monotonic()
+        while True:
+            self._compose(time.monotonic())
+            await self.strip.transmit_async()
+            self.frames_sent += 1
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay < -self.interval:
+                # restart the schedule instead of bursting after a stall
+                deadline = time.monotonic()
+            await asyncio.sleep(max(delay, 0.0))
 
-    def off(self) -> None:
+    def _compose(self, now: float) -> None:
         """
-        Quickly turn off LED strip (clear and transmit).
+        Write the merged frames of all strips with changed clients to the pixels of the strip.
+        :param now: monotonic time
         """
-        self.clear()
-        self.transmit()
+        times = self._times
+        active = now - times <= self.timeout
+        has_active = active.any(axis=0)
+        # strips with newer frames or clients becoming active or inactive
+        newest = np.where(active, times, -np.inf).max(axis=0)
+        changed = has_active & ((newest > self._emitted_times) | (active != self._emitted_active).any(axis=0))
+        if self.merge == 'priority':
+            # priority first, recency breaks ties
+            keys = np.where(active, self._priorities[:, None] * 1e12 + times, -np.inf)
+            winners = keys.argmax(axis=0)
+            winner_times = times[winners, np.arange(len(winners))]
+            changed &= (winners != self._emitted_winners) | (winner_times > self._emitted_times)
+            self._emitted_winners = np.where(has_active, winners, -1)
 
-    @staticmethod
-    def _call_interpolated(
-            pixel_func: Callable[[float, float, float, float], None],
-            pos: float,
-            red: float,
-            green: float,
-            blue: float
+        strip = self.strip
+        pixels = strip._pixels
+        for strip_index in np.flatnonzero(changed):
+            start, end = strip._strip_ranges[strip_index]
+            if self.merge == 'priority':
+                pixels[start:end] = self._buffers[winners[strip_index], start:end]
+            else:
+                slots = np.flatnonzero(active[:, strip_index])
+                np.maximum.reduce(self._buffers[slots, start:end], axis=0, out=pixels[start:end])
+            strip._strip_dirty[strip_index] = True
+        self._emitted_times = np.where(has_active, newest, self._emitted_times)
+        self._emitted_active = active
+
+    async def _accept(self, loop: asyncio.AbstractEventLoop, sock: socket.socket, priority: int) -> None:
+        # receive tasks and their connections, closed here as well in case a task is cancelled before it started
+        clients = {}
+        try:
+            while True:
+                connection, _ = await loop.sock_accept(sock)
+                if not self._free_slots:
+                    self.rejected_clients += 1
+                    connection.close()
+                    continue
+                # taken before the task runs, sock_accept returns queued connections without yielding
+                slot = self._free_slots.pop()
+                try:
+                    connection.setblocking(False)
+                    clients[loop.create_task(self._receive(loop, connection, slot, priority))] = connection
+                except BaseException:
+                    connection.close()
+                    self._free_slots.append(slot)
+                    raise
+                clients = {task: client for task, client in clients.items() if not task.done()}
+        finally:
+            for task, connection in clients.items():
+                task.cancel()
+                connection.close()
+
+    async def _receive(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            connection: socket.socket,
+            slot: int,
+            priority: int
     ) -> None:
         """
-        Helper function distributing a color manipulation between two pixels based on interpolation.
-        :param pixel_func: function manipulating a single pixel
-        :param pos: floating point led position
-        :param red: red value in range(0.0, 1.0)
-        :param green: green value in range(0.0, 1.0)
-        :param blue: blue value in range(0.0, 1.0)
+        Receive frames of a client into its slot until it disconnects, then release the slot.
+        :param slot: client slot taken from the free slots
         """
-        pos_floor = int(pos)
-        pos_ceil = int(pos + 1.0)
-        floor_factor = 1.0 - (pos - pos_floor)
-        ceil_factor = 1.0 - (pos_ceil - pos)
-        pixel_func(pos_floor, red * floor_factor, green * floor_factor, blue * floor_factor)
-        pixel_func(pos_ceil, red * ceil_factor, green * ceil_factor, blue * ceil_factor)
+        self.clients += 1
+        try:
+            self._priorities[slot] = priority
+            strip = self.strip
+            led_size = ProtocolOpc.led_size()
+            header = bytearray(ProtocolOpc.DATA_OFFSET)
+            incoming = np.empty((strip._total_led_count, 3), dtype=np.uint8)
+            incoming_view = memoryview(incoming.reshape(-1))
+            discard = memoryview(bytearray(1 << 16))
+            while True:
+                if not await Receiver._receive_exactly(loop, connection, memoryview(header)):
+                    return
+                channel, command = header[0], header[1]
+                # the length field holds the amount of data bytes
+                length = header[ProtocolOpc.LED_COUNT_HIGH_BYTE] << 8 | header[ProtocolOpc.LED_COUNT_LOW_BYTE]
+                led_count = length // led_size
+                if channel == 0:
+                    start, end = 0, strip._total_led_count
+                elif channel <= strip._strip_count:
+                    start, end = strip._strip_ranges[channel - 1]
+                else:
+                    start = end = 0
+                if command != 0 or start == end:
+                    self.frames_invalid += 1
+                    start = end = 0
+                used = min(led_count, end - start)
 
-    @staticmethod
-    def add_arguments(parser: argparse.ArgumentParser) -> None:
-        group = parser.add_argument_group(title='pyledstrip')
-        group.add_argument('--config', type=str, help='configuration file')
-        group.add_argument('--led_count', type=int, nargs='+', help='amount of LEDs')
-        group.add_argument('--ip', type=str, nargs='+', help='IP address')
-        group.add_argument('--port', type=int, nargs='+', help='Port')
-        group.add_argument('--protocol', type=str, nargs='+', help='Protocol')
-        group.add_argument('--flip', type=bool, nargs='+', help='flip led positions')
-        group.add_argument('--power_limit', type=float, help='limit power use')
-        group.add_argument('--loop', type=bool, help='loop positions modulo led_count')
+                if not await Receiver._receive_exactly(loop, connection, incoming_view[:used * led_size]):
+                    return
+                # LEDs beyond the channel and a partial LED at the end are skipped
+                remaining = length - used * led_size
+                while remaining > 0:
+                    chunk = min(remaining, len(discard))
+                    if not await Receiver._receive_exactly(loop, connection, discard[:chunk]):
+                        return
+                    remaining -= chunk
+                if used == 0:
+                    continue
+
+                self._buffers[slot, start:start + used] = incoming[:used]
+                first = bisect.bisect_right(strip._strip_ends, start)
+                last = bisect.bisect_right(strip._strip_ends, start + used - 1)
+                self._times[slot, first:last + 1] = time.monotonic()
+                self.frames_received += 1
+        finally:
+            connection.close()
+            self._times[slot] = -np.inf
+            self._free_slots.append(slot)
+            self.clients -= 1
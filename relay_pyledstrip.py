@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Relays OPC frames from many producers to the strips of a pyledstrip configuration at a fixed rate, so all producers
+share one set of controller connections. OPC channel 0 addresses all LEDs, channel n the LEDs of strip n - 1.
+Producers connecting to later --listen_port ports take precedence with the matching --priority.
+"""
+
+import argparse
+import asyncio
+import sys
+
+import pyledstrip
+from pyledstrip import LedStrip, Relay
+
+
+async def report(relay, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print('%(clients)3d clients %(rejected_clients)6d rejected %(frames_received)9d received '
+              '%(frames_invalid)6d invalid %(frames_sent)9d sent' % relay.stats(), file=sys.stderr)
+
+
+async def serve(relay, interval):
+    reporter = asyncio.ensure_future(report(relay, interval)) if interval else None
+    try:
+        await relay.serve()
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', type=str, default='0.0.0.0', help='address to accept producers on')
+    parser.add_argument('--listen_port', type=int, nargs='+', default=[7890], help='ports to accept producers on')
+    parser.add_argument('--priority', type=int, nargs='+', default=[0], help='priority of the producers per port')
+    parser.add_argument('--merge', type=str, choices=pyledstrip.MERGE_MODES, default='priority',
+                        help='merging of frames from several producers')
+    parser.add_argument('--fps', type=float, default=60.0, help='output frames per second')
+    parser.add_argument('--timeout', type=float, default=1.0, help='seconds a producer stays active after a frame')
+    parser.add_argument('--max_clients', type=int, default=64, help='maximum amount of connected producers')
+    parser.add_argument('--report', type=float, default=0.0, help='seconds between statistics reports, 0 for none')
+    LedStrip.add_arguments(parser)
+    args = parser.parse_args()
+
+    strip = LedStrip(config=args.config, args=args)
+    relay = Relay(strip, port=args.listen_port, priority=args.priority, host=args.host, merge=args.merge,
+                  fps=args.fps, timeout=args.timeout, max_clients=args.max_clients)
+    print('relaying %s ports %s to %s' % (args.host, ' '.join(str(port) for port in relay.ports), strip.ip),
+          file=sys.stderr)
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(serve(relay, args.report))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        relay.close()
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Simulates the LED controllers of a pyledstrip configuration: receives the frames sent to the configured ports
+(ESP over UDP, OPC over TCP) and prints statistics per strip or draws the strips as colored blocks in the terminal.
+Point the sender at the host of the simulator, e.g. with --ip 127.0.0.1. Strips configured with loopback addresses
+(127.x.x.x) are received on their own address, so several controllers on the same port can be simulated with e.g.
+--ip 127.0.0.1 127.0.0.2.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from pyledstrip import LedStrip, Receiver
+
+
+def draw(receiver, output):
+    """
+    Draw every strip as a line of 24 bit colored blocks.
+    """
+    lines = []
+    for strip_index in range(len(receiver.strips)):
+        blocks = ''.join('\x1b[38;2;%d;%d;%dm█' % tuple(color) for color in receiver.pixels(strip_index))
+        lines.append(blocks + '\x1b[0m')
+    output.write('\x1b[H\x1b[2J' + '\n'.join(lines) + '\n')
+    output.flush()
+
+
+def report(stats, output):
+    for strip_index, strip in enumerate(stats['strips']):
+        print('strip %3d %8d frames %7.1f fps %6d lost %6d reordered %6d errors %8.3f ms latency' % (
+            strip_index, strip['frames'], strip['fps'], strip['lost_frames'], strip['reordered_frames'],
+            strip['errors'], strip['latency']['mean'] * 1e3), file=output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', type=str, nargs='+',
+                        help='address to listen on per strip, defaults to loopback strip IPs and 127.0.0.1')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between reports')
+    parser.add_argument('--duration', type=float, help='stop after seconds')
+    parser.add_argument('--show', action='store_true', help='draw the strips instead of printing statistics')
+    parser.add_argument('--output', type=str, help='write final JSON statistics to this file')
+    LedStrip.add_arguments(parser)
+    args = parser.parse_args()
+
+    strip = LedStrip(config=args.config, args=args)
+    try:
+        receiver = Receiver.for_strip(strip, host=args.host)
+    except (OSError, ValueError) as e:
+        parser.exit(1, 'cannot listen on the strips of the configuration: %s\n' % e)
+    print('listening on %s' % ' '.join('%s:%d' % (host, port) for host, port in zip(receiver.hosts, receiver.ports)),
+          file=sys.stderr)
+
+    start = time.monotonic()
+    with receiver:
+        try:
+            while args.duration is None or time.monotonic() - start < args.duration:
+                time.sleep(args.interval)
+                if args.show:
+                    draw(receiver, sys.stdout)
+                else:
+                    report(receiver.stats(), sys.stderr)
+        except KeyboardInterrupt:
+            pass
+        stats = receiver.stats()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(stats, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,26 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import argparse
+import asyncio
+import colorsys
+import concurrent.futures
 import configparser
+import contextlib
+import io
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
 import unittest
 
-from pyledstrip import LedStrip
+import numpy as np
+
+import pyledstrip
+from pyledstrip import FrameClock, LedStrip, Receiver
 
 
 class TestParameters(unittest.TestCase):
@@ -58,6 +74,16 @@ class TestParameters(unittest.TestCase):
         self.assertEqual([54321, ], strip._ports)
         self.assertEqual([True, ], strip._flips)
 
+    def test_boolean_arguments(self):
+        parser = argparse.ArgumentParser()
+        LedStrip.add_arguments(parser)
+        strip = LedStrip(led_count=[1, 1], ip=['1', '2'], flip=True, loop=True)
+        strip.read_args(parser.parse_args(['--flip', 'no', 'yes', '--loop', 'False']))
+        self.assertEqual([False, True], strip._flips)
+        self.assertFalse(strip.loop)
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            parser.parse_args(['--loop', 'maybe'])
+
 
 class TestBufferAssembly(unittest.TestCase):
 
@@ -103,15 +129,1799 @@ class TestBufferAssembly(unittest.TestCase):
         strip = LedStrip(config=self.config, protocol=['opc', 'opc'],
                          led_count=[2, 2], flip=[True, False], ip=['1', '2'])
         strip._update_buffers()
-        self.assertEqual([0, 0, 0, 2, 0, 0, 0, 0, 0, 0], list(strip._transmit_buffers[0]))
-        self.assertEqual([0, 0, 0, 2, 0, 0, 0, 0, 0, 0], list(strip._transmit_buffers[1]))
+        self.assertEqual([0, 0, 0, 6, 0, 0, 0, 0, 0, 0], list(strip._transmit_buffers[0]))
+        self.assertEqual([0, 0, 0, 6, 0, 0, 0, 0, 0, 0], list(strip._transmit_buffers[1]))
         strip.add_rgb(0, 1.0, 0.0, 1.0)
         strip.add_rgb(3, 0.0, 1.0, 0.0)
         strip._update_buffers()
-        self.assertEqual([0, 0, 0, 2, 0, 0, 0, 255, 0, 255], list(strip._transmit_buffers[0]))
-        self.assertEqual([0, 0, 0, 2, 0, 0, 0, 0, 255, 0], list(strip._transmit_buffers[1]))
+        self.assertEqual([0, 0, 0, 6, 0, 0, 0, 255, 0, 255], list(strip._transmit_buffers[0]))
+        self.assertEqual([0, 0, 0, 6, 0, 0, 0, 0, 255, 0], list(strip._transmit_buffers[1]))
+
+    def test_opc_length(self):
+        strip = LedStrip(config=self.config, protocol='opc', led_count=300)
+        strip._update_buffers()
+        self.assertEqual([0, 0, 0x03, 0x84], list(strip._transmit_buffers[0][:4]))
+        with self.assertRaises(ValueError):
+            strip.led_count = 21846
+
+    def test_no_allocations(self):
+        strip = LedStrip(config=self.config, protocol=['esp', 'opc'],
+                         led_count=[10000, 10000], flip=[True, False], ip=['1', '2'])
+        strip.add_pixels_rgb(np.arange(20000), np.random.RandomState(0).random_sample((20000, 3)))
+        strip._update_buffers()
+        tracemalloc.start()
+        try:
+            strip._update_buffers()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 10000)
+
+
+class TestDeltaTransmit(unittest.TestCase):
+
+    def setUp(self):
+        self.sinks = []
+        for _ in range(3):
+            sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sink.bind(('127.0.0.1', 0))
+            sink.setblocking(False)
+            self.sinks.append(sink)
+        self.strip = LedStrip(led_count=[3, 4, 5], ip='127.0.0.1', power_limit=1.0, keepalive=float('inf'),
+                              port=[sink.getsockname()[1] for sink in self.sinks])
+
+    def tearDown(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def received(self):
+        time.sleep(0.05)
+        counts = []
+        for sink in self.sinks:
+            count = 0
+            try:
+                while True:
+                    sink.recv(100)
+                    count += 1
+            except BlockingIOError:
+                pass
+            counts.append(count)
+        return counts
+
+    def test_only_changed_strips(self):
+        self.strip.transmit()
+        self.assertEqual([1, 1, 1], self.received())
+        self.strip.transmit()
+        self.assertEqual([0, 0, 0], self.received())
+        self.strip.set_pixel_rgb(3, 1.0, 0.0, 0.0)
+        self.strip.transmit()
+        self.assertEqual([0, 1, 0], self.received())
+        self.strip.add_pixels_rgb([2, 11], [0.0, 0.0, 1.0])
+        self.strip.transmit()
+        self.assertEqual([1, 0, 1], self.received())
+
+    def test_power_limit_resends_all(self):
+        self.strip.transmit()
+        self.received()
+        self.strip.power_limit = 0.1
+        self.strip.transmit()
+        self.assertEqual([1, 1, 1], self.received())
+        self.strip.set_pixel_rgb(0, 1.0, 1.0, 1.0)
+        self.strip.transmit()
+        self.assertEqual([1, 0, 0], self.received())
+        self.strip.set_pixels_rgb([1, 2], [1.0, 1.0, 1.0])
+        self.strip.transmit()
+        self.assertEqual([1, 1, 1], self.received())
+        self.assertEqual([9.0, 0.0, 0.0], self.strip._strip_power.tolist())
+
+    def test_keepalive(self):
+        self.strip.keepalive = 0.0
+        self.strip.transmit()
+        self.strip.transmit()
+        self.assertEqual([2, 2, 2], self.received())
+
+    def test_matches_full_encode(self):
+        pixels = np.random.RandomState(2).random_sample((12, 3))
+        self.strip.power_limit = 0.3
+        self.strip._update_buffers()
+        self.strip.set_pixels_rgb(np.arange(4, 8), pixels[4:8])
+        self.strip._update_buffers()
+        full = LedStrip(led_count=[3, 4, 5], ip='127.0.0.1', port=[1, 2, 3], power_limit=0.3)
+        full.set_pixels_rgb(np.arange(4, 8), pixels[4:8])
+        full._update_buffers()
+        for partial_buffer, full_buffer in zip(self.strip._transmit_buffers, full._transmit_buffers):
+            self.assertEqual(list(full_buffer), list(partial_buffer))
+
+
+class TestFill(unittest.TestCase):
+
+    def test_clear(self):
+        strip = LedStrip(led_count=[2, 3], ip=['1', '2'])
+        strip.set_pixels_rgb(np.arange(5), [1.0, 1.0, 1.0])
+        strip._update_buffers()
+        strip.clear()
+        self.assertEqual([True, True], strip._strip_dirty.tolist())
+        self.assertFalse(strip._pixels.any())
+
+    def test_fill(self):
+        strip = LedStrip(led_count=3)
+        strip.fill([0.1, 0.2, 0.3])
+        np.testing.assert_allclose([[0.1, 0.2, 0.3]] * 3, strip._pixels)
+
+    def test_fill_range(self):
+        strip = LedStrip(led_count=[3, 3, 3], ip=['1', '2', '3'])
+        strip._update_buffers()
+        strip.fill_range(-2, 5, [1.0, 0.0, 0.0])
+        self.assertEqual([1, 1, 1, 1, 1, 0, 0, 0, 0], strip._pixels[:, 0].tolist())
+        self.assertEqual([True, True, False], strip._strip_dirty.tolist())
+
+    def test_fill_range_loop(self):
+        strip = LedStrip(led_count=[3, 3, 3], ip=['1', '2', '3'], loop=True)
+        strip._update_buffers()
+        strip.fill_range(7, 11, [1.0, 0.0, 0.0])
+        self.assertEqual([1, 1, 0, 0, 0, 0, 0, 1, 1], strip._pixels[:, 0].tolist())
+        self.assertEqual([True, False, True], strip._strip_dirty.tolist())
+
+    def test_fill_gradient(self):
+        strip = LedStrip(led_count=6)
+        strip.fill_gradient(1, 5, [0.0, 0.0, 0.0], [0.3, 0.6, 0.0])
+        np.testing.assert_allclose([0.0, 0.0, 0.1, 0.2, 0.3, 0.0], strip._pixels[:, 0])
+        np.testing.assert_allclose([0.0, 0.0, 0.2, 0.4, 0.6, 0.0], strip._pixels[:, 1])
+
+    def test_fill_gradient_loop(self):
+        strip = LedStrip(led_count=6, loop=True)
+        strip.fill_gradient(4, 8, [0.0, 0.0, 0.0], [0.3, 0.0, 0.0])
+        np.testing.assert_allclose([0.2, 0.3, 0.0, 0.0, 0.0, 0.1], strip._pixels[:, 0])
+        strip.fill_gradient(0, 9, [0.0, 0.0, 0.0], [0.8, 0.0, 0.0])
+        np.testing.assert_allclose([0.6, 0.7, 0.8, 0.3, 0.4, 0.5], strip._pixels[:, 0])
+
+
+class TestUdpBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.sinks = []
+        for _ in range(4):
+            sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sink.bind(('127.0.0.1', 0))
+            sink.settimeout(1.0)
+            self.sinks.append(sink)
+        self.packets = [([np.full(10 + i, i, dtype=np.uint8)], sink.getsockname())
+                        for i, sink in enumerate(self.sinks)]
+
+    def tearDown(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def assert_received(self, indices):
+        for i in indices:
+            self.assertEqual(bytes([i] * (10 + i)), self.sinks[i].recv(100))
+
+    def test_batch(self):
+        sender = pyledstrip._UdpSender()
+        messages = sender.prepare(self.packets)
+        if pyledstrip._sendmmsg is None:
+            self.assertIsNone(messages)
+        sender.send(self.packets, messages)
+        self.assert_received(range(4))
+        if messages is not None:
+            sender.send([self.packets[1], self.packets[3]], sender.select(messages, [1, 3]))
+            self.assert_received([1, 3])
+        sender.close()
+
+    def test_paced(self):
+        sender = pyledstrip._UdpSender()
+        start = time.perf_counter()
+        sender.send(self.packets, interval=0.002)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.006)
+        self.assert_received(range(4))
+        sender.close()
+
+    def test_paced_sleeps(self):
+        sender = pyledstrip._UdpSender()
+        wall, cpu = time.perf_counter(), time.process_time()
+        sender.send(self.packets, interval=0.02)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        self.assertGreaterEqual(wall, 0.06)
+        self.assertLess(cpu, wall / 2)
+        sender.close()
+
+    def test_error_sends_rest(self):
+        sender = pyledstrip._UdpSender()
+        # too large for a datagram
+        packets = self.packets[:2] + [([np.zeros(1 << 17, dtype=np.uint8)], self.sinks[2].getsockname())] + \
+            self.packets[3:]
+        for messages, interval in ((sender.prepare(packets), 0.0), (None, 0.0), (None, 0.001)):
+            with self.assertRaises(OSError):
+                sender.send(packets, messages, interval)
+            self.assert_received([0, 1, 3])
+        sender.close()
+
+    def test_shared_socket(self):
+        strip = LedStrip(led_count=1, ip='127.0.0.1', port=[sink.getsockname()[1] for sink in self.sinks],
+                         protocol=['esp', 'opc', 'esp', 'esp'], power_limit=1.0, keepalive=float('inf'))
+        strip.transmit()
+        self.assertEqual([None, None, None], [strip._socks[i] for i in (0, 2, 3)])
+        for i in (0, 2, 3):
+            self.assertEqual(bytes(6), self.sinks[i].recv(100))
+        strip.set_pixel_rgb(3, 1.0, 0.0, 0.0)
+        strip.transmit()
+        self.assertEqual(bytes([0, 0, 0, 0, 255, 0]), self.sinks[3].recv(100))
+
+    def test_gathered_buffers(self):
+        sender = pyledstrip._UdpSender()
+        packets = [([np.array([1, 2], dtype=np.uint8), np.array([3], dtype=np.uint8)], self.sinks[0].getsockname())]
+        sender.send(packets, sender.prepare(packets))
+        sender.send(packets)
+        self.assertEqual(bytes([1, 2, 3]), self.sinks[0].recv(100))
+        self.assertEqual(bytes([1, 2, 3]), self.sinks[0].recv(100))
+        sender.close()
+
+
+class TestFragmentation(unittest.TestCase):
+
+    def test_packets(self):
+        strip = LedStrip(led_count=[1000, 10], ip=['1', '2'], protocol=['esp_fragmented', 'esp'])
+        packets = strip._strip_packets[0]
+        self.assertEqual([3, 3, 3], [len(header) for header, _ in packets])
+        self.assertEqual([489 * 3, 489 * 3, 22 * 3], [len(data) for _, data in packets])
+        self.assertEqual([[0, 0, 0], [0, 1, 233], [128, 3, 210]], [list(header) for header, _ in packets])
+        for _, data in packets:
+            self.assertTrue(np.shares_memory(data, strip._transmit_buffers[0]))
+        self.assertEqual([[strip._transmit_buffers[1]]], strip._strip_packets[1])
+
+    def test_mtu(self):
+        strip = LedStrip(led_count=100, protocol='esp_fragmented', mtu=576)
+        self.assertEqual(1, len(strip._strip_packets[0]))
+        strip.mtu = 331
+        self.assertEqual([100 * 3], [len(data) for _, data in strip._strip_packets[0]])
+        strip.mtu = 330
+        self.assertEqual([99 * 3, 3], [len(data) for _, data in strip._strip_packets[0]])
+        strip.mtu = 34
+        self.assertEqual([3] * 100, [len(data) for _, data in strip._strip_packets[0]])
+        with self.assertRaisesRegex(ValueError, 'MTU 33'):
+            strip.mtu = 33
+        with self.assertRaises(ValueError):
+            strip.mtu = 28
+
+    def test_empty_strip(self):
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(('127.0.0.1', 0))
+        sink.settimeout(1.0)
+        strip = LedStrip(led_count=[0, 2], ip='127.0.0.1', port=[sink.getsockname()[1]] * 2,
+                         protocol='esp_fragmented', power_limit=1.0)
+        self.assertEqual([], strip._strip_packets[0])
+        strip.set_pixel_rgb(0, 1.0, 0.0, 0.0)
+        strip.transmit()
+        self.assertEqual([128 | 1, 0, 0, 0, 255, 0, 0, 0, 0], list(sink.recv(100)))
+        sink.close()
+
+    def test_transmit(self):
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(('127.0.0.1', 0))
+        sink.settimeout(1.0)
+        strip = LedStrip(led_count=1000, ip='127.0.0.1', port=sink.getsockname()[1],
+                         protocol='esp_fragmented', power_limit=1.0)
+        strip.set_pixel_rgb(999, 0.0, 0.0, 1.0)
+        expected = bytearray(3000)
+        expected[2999] = 255
+        for frame in (1, 2):
+            strip.transmit()
+            datagrams = [sink.recv(2000) for _ in range(3)]
+            self.assertEqual([frame, frame, 128 | frame], [d[0] for d in datagrams])
+            self.assertEqual(expected, b''.join(d[3:] for d in datagrams))
+            strip.set_pixel_rgb(0, 1.0, 0.0, 0.0)
+            expected[1] = 255
+        sink.close()
+
+    def test_led_limit(self):
+        strip = LedStrip(led_count=65536, protocol='esp_fragmented')
+        self.assertEqual([0x80, 0xff, 0xf6], list(strip._strip_packets[0][-1][0]))
+        with self.assertRaises(ValueError):
+            strip.led_count = 70000
+        with self.assertRaises(ValueError):
+            LedStrip(led_count=[10, 70000], ip=['1', '2'], protocol='esp_fragmented')
+        LedStrip(led_count=70000, protocol='esp')
+
+
+class TestDmxProtocols(unittest.TestCase):
+
+    @staticmethod
+    def _receive(protocol, led_count, frames=1, **kwargs):
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(('127.0.0.1', 0))
+        sink.settimeout(1.0)
+        strip = LedStrip(led_count=led_count, ip='127.0.0.1', port=sink.getsockname()[1],
+                         protocol=protocol, power_limit=1.0, keepalive=0.0, **kwargs)
+        strip.set_pixel_rgb(0, 1.0, 0.0, 0.0)
+        strip.set_pixel_rgb(led_count - 1, 0.0, 0.0, 1.0)
+        datagrams = []
+        for _ in range(frames):
+            strip.transmit()
+            datagrams.append([sink.recv(2000) for _ in strip._strip_packets[0]])
+        sink.close()
+        return datagrams
+
+    def test_ddp(self):
+        frames = self._receive('ddp', 1000, frames=16)
+        datagrams = frames[0]
+        self.assertEqual([1450, 1450, 130], [len(d) for d in datagrams])
+        self.assertEqual(bytes([0x40, 1, 0x0b, 1, 0, 0, 0, 0, 0x05, 0xa0]), datagrams[0][:10])
+        self.assertEqual(bytes([0x40, 1, 0x0b, 1, 0, 0, 0x05, 0xa0, 0x05, 0xa0]), datagrams[1][:10])
+        self.assertEqual(bytes([0x41, 1, 0x0b, 1, 0, 0, 0x0b, 0x40, 0x00, 0x78]), datagrams[2][:10])
+        data = b''.join(d[10:] for d in datagrams)
+        self.assertEqual((255, 0, 0), tuple(data[:3]))
+        self.assertEqual((0, 0, 255), tuple(data[-3:]))
+        self.assertEqual(list(range(1, 16)) + [1], [f[0][1] for f in frames])
+
+    def test_ddp_mtu(self):
+        with self.assertRaisesRegex(ValueError, 'MTU 40'):
+            LedStrip(led_count=10, protocol='ddp', mtu=40)
+        strip = LedStrip(led_count=10, protocol='ddp', mtu=41)
+        self.assertEqual([3] * 10, [len(data) for _, data in strip._strip_packets[0]])
+
+    def test_empty_strips(self):
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(('127.0.0.1', 0))
+        for protocol in ('ddp', 'e131', 'artnet'):
+            strip = LedStrip(led_count=[0, 2], ip='127.0.0.1', port=[sink.getsockname()[1]] * 2, protocol=protocol)
+            self.assertEqual([], strip._strip_packets[0])
+            strip.transmit()
+        sink.close()
+
+    def test_e131(self):
+        datagrams = self._receive('e131', 200, universe=5)[0]
+        self.assertEqual([126 + 510, 126 + 90], [len(d) for d in datagrams])
+        first, second = datagrams
+        self.assertEqual(b'\x00\x10\x00\x00ASC-E1.17\x00\x00\x00', first[:16])
+        self.assertEqual(0x7000 | (636 - 16), int.from_bytes(first[16:18], 'big'))
+        self.assertEqual(0x7000 | (636 - 38), int.from_bytes(first[38:40], 'big'))
+        self.assertEqual(0x7000 | (636 - 115), int.from_bytes(first[115:117], 'big'))
+        self.assertEqual(first[22:38], second[22:38])
+        self.assertEqual(b'pyledstrip', first[44:54])
+        self.assertEqual(100, first[108])
+        self.assertEqual(1, first[111])
+        self.assertEqual([5, 6], [int.from_bytes(d[113:115], 'big') for d in datagrams])
+        self.assertEqual([511, 91], [int.from_bytes(d[123:125], 'big') for d in datagrams])
+        self.assertEqual((0, 255, 0, 0), tuple(first[125:129]))
+        self.assertEqual((0, 0, 255), tuple(second[-3:]))
+
+    def test_e131_universe_range(self):
+        with self.assertRaises(ValueError):
+            LedStrip(led_count=10, protocol='e131', universe=0)
+        with self.assertRaises(ValueError):
+            LedStrip(led_count=200, protocol='e131', universe=63999)
+
+    def test_e131_multicast(self):
+        strip = LedStrip(led_count=400, ip='1.2.3.4', port=5568, protocol='e131_multicast', universe=255)
+        self.assertEqual([('239.255.0.255', 5568), ('239.255.1.0', 5568), ('239.255.1.1', 5568)],
+                         strip._strip_addresses[0])
+
+    def test_artnet(self):
+        frames = self._receive('artnet', 171, frames=2, universe=0x123)
+        first, second = frames[0]
+        self.assertEqual(18 + 510, len(first))
+        self.assertEqual(18 + 4, len(second))
+        self.assertEqual(b'Art-Net\x00\x00\x50\x00\x0e\x01\x00\x23\x01\x01\xfe', first[:18])
+        self.assertEqual(b'\x24\x01\x00\x04', second[14:18])
+        self.assertEqual((255, 0, 0), tuple(first[18:21]))
+        self.assertEqual((0, 0, 255, 0), tuple(second[18:]))
+        self.assertEqual(2, frames[1][0][12])
+
+
+class TestPixelLayouts(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config['pyledstrip'] = {
+            'power_limit': 1.0,
+        }
+
+    def test_rgbw(self):
+        strip = LedStrip(config=self.config, led_count=2, protocol='esp_rgbw')
+        self.assertEqual(3 + 2 * 4, len(strip._transmit_buffers[0]))
+        strip.set_pixel_rgb(0, 1.0, 0.6, 0.2)
+        strip.set_pixel_rgb(1, 0.0, 1.0, 0.0)
+        strip._update_buffers()
+        # green, red, blue, white
+        self.assertEqual([0, 0, 0, 102, 204, 0, 51, 255, 0, 0, 0], list(strip._transmit_buffers[0]))
+
+    def test_rgbw_universes(self):
+        strip = LedStrip(config=self.config, led_count=200, protocol='artnet_rgbw')
+        self.assertEqual([128 * 4, 72 * 4], [len(packet[1]) for packet in strip._strip_packets[0]])
+
+    def test_16bit(self):
+        strip = LedStrip(config=self.config, led_count=2, protocol='ddp_16bit')
+        strip.set_pixel_rgb(0, 1.0, 0.5, 0.0)
+        strip._update_buffers()
+        self.assertEqual([0xff, 0xff, 0x7f, 0xff, 0, 0, 0, 0, 0, 0, 0, 0], list(strip._transmit_buffers[0]))
+        self.assertEqual(0x0c, strip._strip_packets[0][0][0][2])
+
+    def test_16bit_calibrated(self):
+        strip = LedStrip(config=self.config, led_count=[1, 1], ip=['1', '2'], protocol=['ddp_16bit', 'esp'],
+                         gamma=2.0)
+        strip.set_pixel_rgb(0, 1.0, 0.5, 0.0)
+        strip.set_pixel_rgb(1, 1.0, 0.5, 0.0)
+        strip._update_buffers()
+        data = strip._transmit_data[0][0]
+        self.assertEqual(65535, data[0])
+        self.assertAlmostEqual(65535 * 0.25, data[1], delta=65535 / 4096)
+        self.assertEqual(0, data[2])
+        self.assertEqual([64, 255, 0], list(strip._transmit_data[1][0]))
+
+    def test_custom_protocol(self):
+        class ProtocolBgr(pyledstrip.Protocol):
+            CONNECTION_TYPE = 'tcp'
+            DATA_OFFSET = 1
+            CHANNEL_ORDER = 'BGR'
+
+            @classmethod
+            def write_header(cls, transmit_buffer, led_count):
+                transmit_buffer[0] = led_count
+
+        strip = LedStrip(config=self.config, led_count=2, protocol=ProtocolBgr)
+        strip.set_pixel_rgb(1, 1.0, 0.0, 0.2)
+        strip._update_buffers()
+        self.assertEqual([2, 0, 0, 0, 51, 0, 255], list(strip._transmit_buffers[0]))
+
+
+class TestPixelDtype(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config['pyledstrip'] = {
+            'power_limit': 1.0,
+        }
+
+    def _render(self, strip):
+        random = np.random.RandomState(0)
+        strip.set_pixels_rgb(np.arange(50), random.random_sample((50, 3)))
+        strip.add_pixel_rgb(3, 0.5, 0.5, 0.5)
+        strip.add_rgb_array(random.random_sample(20) * 60, random.random_sample((20, 3)) * 0.1)
+        strip.fill_range(55, 60, (0.2, 0.4, 0.6))
+        strip._update_buffers()
+        return strip._transmit_buffers[0].astype(int)
+
+    def test_footprint(self):
+        for dtype, size in (('float64', 24), ('float32', 12), ('uint8', 3)):
+            strip = LedStrip(config=self.config, led_count=1000, pixel_dtype=dtype)
+            self.assertEqual(1000 * size, strip._pixels.nbytes)
+
+    def test_outputs_match(self):
+        expected = self._render(LedStrip(config=self.config, led_count=60))
+        for dtype in ('float32', 'uint8'):
+            for kwargs in ({}, {'gamma': 2.2}, {'power_limit': 0.3}):
+                kwargs = dict({'config': self.config, 'led_count': 60, 'pixel_dtype': dtype}, **kwargs)
+                reference = self._render(LedStrip(**dict(kwargs, pixel_dtype='float64')))
+                actual = self._render(LedStrip(**kwargs))
+                # 8 bit input levels lose precision where the gamma curve is steep
+                tolerance = 3 if dtype == 'uint8' and 'gamma' in kwargs else 1
+                self.assertLessEqual(np.abs(actual - reference).max(), tolerance, (dtype, kwargs))
+        self.assertEqual(list(expected), list(self._render(LedStrip(config=self.config, led_count=60))))
+
+    def test_uint8_saturates(self):
+        strip = LedStrip(config=self.config, led_count=3, pixel_dtype='uint8')
+        strip.set_pixel_rgb(0, 2.0, -1.0, 0.5)
+        self.assertEqual([255, 0, 127], list(strip._pixels[0]))
+        strip.add_pixel_rgb(0, -0.2, 0.5, 0.75)
+        self.assertEqual([204, 127, 255], list(strip._pixels[0]))
+        strip.add_pixels_rgb([1, 1, 1], [0.4, 0.4, 0.4])
+        self.assertEqual([255, 255, 255], list(strip._pixels[1]))
+        strip.fill_gradient(0, 3, (0.0, 0.0, 0.0), (1.0, 1.0, 1.0))
+        self.assertEqual([0, 127, 255], list(strip._pixels[:, 0]))
+
+    def test_change_dtype(self):
+        strip = LedStrip(config=self.config, led_count=2)
+        strip.set_pixel_rgb(0, 1.0, 0.5, 0.0)
+        strip.pixel_dtype = 'uint8'
+        self.assertEqual([255, 127, 0], list(strip._pixels[0]))
+        strip.pixel_dtype = 'float32'
+        self.assertEqual(np.float32, strip._pixels.dtype)
+        self.assertAlmostEqual(127 / 255, strip._pixels[0, 1])
+        with self.assertRaises(ValueError):
+            strip.pixel_dtype = 'int16'
+
+    def test_no_allocations(self):
+        for dtype in ('float32', 'uint8'):
+            for kwargs in ({}, {'gamma': 2.2}):
+                strip = LedStrip(config=self.config, led_count=[10000, 10000], ip=['1', '2'], pixel_dtype=dtype,
+                                 power_limit=0.3, **kwargs)
+                strip.add_pixels_rgb(np.arange(20000), np.random.RandomState(0).random_sample((20000, 3)))
+                strip._update_buffers()
+                tracemalloc.start()
+                try:
+                    strip._strip_dirty[:] = True
+                    strip._update_buffers()
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                # mixed type ufuncs on integer pixels use casting buffers of at most bufsize elements
+                limit = 10000 + (np.getbufsize() * 8 if dtype == 'uint8' else 0)
+                self.assertLess(peak, limit, (dtype, kwargs))
+
+
+class TestPowerGroups(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config['pyledstrip'] = {}
+
+    def test_single_group(self):
+        strip = LedStrip(config=self.config, led_count=[10, 10], ip=['1', '2'], power_limit=0.25)
+        strip.fill_range(0, 10, (1.0, 1.0, 1.0))
+        strip._update_buffers()
+        # half of all LEDs at full white is twice the limit
+        self.assertEqual([127] * 30, list(strip._transmit_buffers[0][3:]))
+        self.assertEqual([0] * 30, list(strip._transmit_buffers[1][3:]))
+
+    def test_group_ids(self):
+        strip = LedStrip(config=self.config, led_count=[10, 10], ip=['1', '2'], power_limit=0.25, power_group=[0, 2])
+        strip.fill_range(0, 20, (1.0, 1.0, 1.0))
+        # group 1 has no LEDs
+        with np.errstate(all='raise'):
+            strip._update_buffers()
+        self.assertEqual([63] * 30, list(strip._transmit_buffers[1][3:]))
+        with self.assertRaises(ValueError):
+            strip.power_group = [0, -1]
+
+    def test_separate_groups(self):
+        strip = LedStrip(config=self.config, led_count=[10, 10, 10], ip=['1', '2', '3'], power_limit=0.25,
+                         power_group=[0, 1, 1])
+        strip.fill_range(0, 10, (1.0, 1.0, 1.0))
+        strip.fill_range(10, 15, (0.5, 0.5, 0.5))
+        strip._update_buffers()
+        self.assertEqual([63] * 30, list(strip._transmit_buffers[0][3:]))
+        # group 1 uses an eighth of its power and is not dimmed
+        self.assertEqual([127] * 15 + [0] * 15, list(strip._transmit_buffers[1][3:]))
+
+        # dimming one group only re-encodes the strips of that group
+        strip._strip_unsent[:] = False
+        strip.fill_range(20, 30, (1.0, 1.0, 1.0))
+        strip._update_buffers()
+        self.assertEqual([False, True, True], strip._strip_unsent.tolist())
+        self.assertEqual([63] * 30, list(strip._transmit_buffers[0][3:]))
+        self.assertEqual(51, strip._transmit_buffers[1][3])
+
+    def test_max_amps(self):
+        strip = LedStrip(config=self.config, led_count=[10, 10], ip=['1', '2'], power_group=[0, 1],
+                         max_amps=[0.31, 1.0], amps_per_channel=0.02, idle_amps=0.001)
+        strip.fill((1.0, 1.0, 1.0))
+        strip._update_buffers()
+        # 0.61 A at full white, 0.01 A of it idle current
+        self.assertEqual([127] * 30, list(strip._transmit_buffers[0][3:]))
+        self.assertEqual([255] * 30, list(strip._transmit_buffers[1][3:]))
+
+        strip.max_amps = 0.005
+        strip._update_buffers()
+        self.assertEqual([0] * 30, list(strip._transmit_buffers[0][3:]))
+
+    def test_uint8(self):
+        strip = LedStrip(config=self.config, led_count=[10, 10], ip=['1', '2'], power_group=[0, 1],
+                         max_amps=0.31, pixel_dtype='uint8')
+        strip.fill((1.0, 1.0, 1.0))
+        strip._update_buffers()
+        self.assertEqual([127] * 60, list(strip._transmit_buffers[0][3:]) + list(strip._transmit_buffers[1][3:]))
+
+    def test_config(self):
+        self.config['pyledstrip'] = {
+            'ip': '1 2 3',
+            'power_group': '0 1 1',
+            'max_amps': '2.5 4',
+            'amps_per_channel': '0.015',
+            'idle_amps': '0.0005',
+        }
+        strip = LedStrip(config=self.config)
+        self.assertEqual([0, 1, 1], strip._strip_groups.tolist())
+        self.assertEqual([2.5, 4.0], strip._group_max_amps.tolist())
+        self.assertEqual([300, 600], strip._group_led_counts.tolist())
+        self.assertEqual(0.015, strip.amps_per_channel)
+        self.assertEqual(0.0005, strip.idle_amps)
+
+
+def _render_shared(config, name):
+    strip = LedStrip(config=config, led_count=[4, 4], ip=['1', '2'], shared_memory=name)
+    strip.set_pixel_rgb(6, 1.0, 0.0, 0.0)
+    strip.commit()
+
+
+def _commit_shared(config, name, count):
+    strip = LedStrip(config=config, led_count=[4, 4], ip=['1', '2'], shared_memory=name)
+    for _ in range(count):
+        strip.set_pixel_rgb(0, 1.0, 1.0, 1.0)
+        strip.commit()
+
+
+class TestSharedMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config['pyledstrip'] = {
+            'power_limit': 1.0,
+        }
+        self.name = 'pyledstrip_test_%d' % os.getpid()
+
+    def tearDown(self):
+        for strip in getattr(self, 'strips', []):
+            strip.shared_memory = None
+
+    def _strip(self, **kwargs):
+        strip = LedStrip(config=self.config, led_count=[4, 4], ip=['1', '2'], **kwargs)
+        self.strips = getattr(self, 'strips', []) + [strip]
+        return strip
+
+    def test_commit(self):
+        transmitter = self._strip(shared_memory=self.name)
+        producer = self._strip(shared_memory=self.name)
+        producer.commit()
+        transmitter._update_buffers()
+
+        transmitter._strip_unsent[:] = False
+        producer.set_pixel_rgb(1, 0.0, 1.0, 0.0)
+        self.assertEqual([0.0, 1.0, 0.0], transmitter._pixels[1].tolist())
+        transmitter._update_buffers()
+        self.assertEqual(0, transmitter._transmit_buffers[0][6])
+
+        producer.commit()
+        self.assertEqual(2, transmitter.frame_sequence)
+        transmitter._update_buffers()
+        self.assertEqual(255, transmitter._transmit_buffers[0][6])
+        self.assertEqual([True, False], transmitter._strip_unsent.tolist())
+
+    def test_layout_mismatch(self):
+        self._strip(shared_memory=self.name)
+        with self.assertRaises(ValueError):
+            LedStrip(config=self.config, led_count=[4, 4], ip=['1', '2'], shared_memory=self.name,
+                     pixel_dtype='uint8')
+
+    def test_detach_keeps_colors(self):
+        strip = self._strip()
+        strip.set_pixel_rgb(3, 0.5, 0.5, 0.5)
+        strip.shared_memory = self.name
+        self.assertEqual([0.5, 0.5, 0.5], strip._pixels[3].tolist())
+        strip.shared_memory = None
+        self.assertEqual([0.5, 0.5, 0.5], strip._pixels[3].tolist())
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pixels')
+            transmitter = self._strip(shared_memory=path, pixel_dtype='uint8')
+            producer = self._strip(shared_memory=path, pixel_dtype='uint8')
+            producer.fill((1.0, 1.0, 1.0))
+            producer.commit()
+            transmitter._update_buffers()
+            self.assertEqual([255] * 12, list(transmitter._transmit_buffers[1][3:]))
+            producer.shared_memory = None
+            transmitter.shared_memory = None
+            self.assertFalse(os.path.exists(path))
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+    def test_process(self):
+        transmitter = self._strip(shared_memory=self.name)
+        transmitter._update_buffers()
+        process = multiprocessing.get_context('fork').Process(target=_render_shared, args=(self.config, self.name))
+        process.start()
+        process.join(10)
+        self.assertEqual(0, process.exitcode)
+        transmitter._update_buffers()
+        self.assertEqual([0, 255, 0], list(transmitter._transmit_data[1][2]))
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+    def test_concurrent_commits(self):
+        transmitter = self._strip(shared_memory=self.name)
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_commit_shared, args=(self.config, self.name, 2000)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            self.assertEqual(0, process.exitcode)
+        self.assertEqual(8000, transmitter.frame_sequence)
+        self.assertEqual(8000, transmitter._shared_pixels.sequences[0])
+
+    def test_attach_waits_for_creator(self):
+        transmitter = self._strip(shared_memory=self.name)
+        header = transmitter._shared_pixels.header
+        header['magic'] = 0
+        timer = threading.Timer(0.05, header.__setitem__, ('magic', pyledstrip._SharedPixels.MAGIC))
+        timer.start()
+        self._strip(shared_memory=self.name)
+        timer.join()
+
+
+class TestCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config['pyledstrip'] = {
+            'protocol': 'opc',
+            'power_limit': 1.0,
+        }
+
+    def test_identity(self):
+        strip = LedStrip(config=self.config, led_count=2, gamma=1.0, white_balance=[1.0, 1.0, 1.0])
+        self.assertFalse(strip._calibrated)
+
+    def test_gamma(self):
+        strip = LedStrip(config=self.config, led_count=1, gamma=2.0)
+        strip.set_pixel_rgb(0, 1.0, 0.5, 0.0)
+        strip._update_buffers()
+        self.assertEqual([255, 64, 0], list(strip._transmit_buffers[0][4:]))
+
+    def test_white_balance_per_strip(self):
+        strip = LedStrip(config=self.config, led_count=[1, 1], ip=['1', '2'],
+                         white_balance=[[1.0, 0.5, 0.0], [0.2, 1.0, 1.0]])
+        strip.set_pixel_rgb(0, 1.0, 1.0, 1.0)
+        strip.set_pixel_rgb(1, 1.0, 1.0, 1.0)
+        strip._update_buffers()
+        self.assertEqual([255, 128, 0], list(strip._transmit_buffers[0][4:]))
+        self.assertEqual([51, 255, 255], list(strip._transmit_buffers[1][4:]))
+
+    def test_dither_average(self):
+        strip = LedStrip(config=self.config, led_count=100, dither=True)
+        strip.clear()
+        strip.add_pixels_rgb(np.arange(100), [100.25 / 255, 0.0, 0.0])
+        frames = []
+        for _ in range(256):
+            strip._update_buffers()
+            frames.append(strip._transmit_buffers[0][4::3].copy())
+        frames = np.array(frames)
+        self.assertEqual({100, 101}, set(np.unique(frames)))
+        self.assertAlmostEqual(100.25, frames.mean(), delta=0.05)
+
+    def test_config(self):
+        self.config['pyledstrip']['gamma'] = '2.2 1.0'
+        self.config['pyledstrip']['white_balance'] = '1.0 0.9 0.8 1.0 1.0 1.0'
+        self.config['pyledstrip']['dither'] = 'yes'
+        strip = LedStrip(config=self.config, led_count=[1, 1], ip=['1', '2'])
+        self.assertEqual([2.2, 1.0], strip._gammas)
+        self.assertEqual([[1.0, 0.9, 0.8], [1.0, 1.0, 1.0]], strip._white_balances)
+        self.assertTrue(strip.dither)
+
+        parser = argparse.ArgumentParser()
+        LedStrip.add_arguments(parser)
+        strip.read_args(parser.parse_args(['--dither', 'no']))
+        self.assertFalse(strip.dither)
+
+
+class TestTransmitAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_udp_and_tcp(self):
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp.bind(('127.0.0.1', 0))
+        udp.settimeout(1.0)
+        received = []
+
+        async def handle(reader, writer):
+            received.append(await reader.readexactly(10))
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            tcp_port = server.sockets[0].getsockname()[1]
+            strip = LedStrip(led_count=2, ip='127.0.0.1', port=[udp.getsockname()[1], tcp_port],
+                             protocol=['esp', 'opc'], power_limit=1.0)
+            strip.set_pixel_rgb(0, 1.0, 0.0, 0.0)
+            strip.set_pixel_rgb(3, 0.0, 0.0, 1.0)
+            await strip.transmit_async()
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                await strip.transmit_async()
+                if received:
+                    break
+            await strip.close_async()
+            server.close()
+            await server.wait_closed()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual([0, 0, 0, 0, 255, 0, 0, 0, 0], list(udp.recv(100)))
+        self.assertEqual([[0, 0, 0, 6, 0, 0, 0, 0, 0, 255]], [list(r) for r in received])
+        udp.close()
+
+    def test_offline_tcp_does_not_block(self):
+        async def run():
+            strip = LedStrip(led_count=2, ip='10.255.255.1', port=7890, protocol='opc')
+            start = time.monotonic()
+            for _ in range(10):
+                await strip.transmit_async(timeout=0.05)
+            elapsed = time.monotonic() - start
+            await strip.close_async()
+            return elapsed
+
+        self.assertLess(self.loop.run_until_complete(run()), 0.05)
+
+    def test_reconnect_after_close(self):
+        received = []
+
+        async def handle(reader, writer):
+            received.append(await reader.readexactly(10))
+            if len(received) == 1:
+                # the strip drops the first connection
+                writer.close()
+                return
+            while not reader.at_eof():
+                received.append(await reader.read(100))
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            strip = LedStrip(led_count=2, ip='127.0.0.1', port=server.sockets[0].getsockname()[1],
+                             protocol='opc', keepalive=0.0, collect_stats=True)
+            for _ in range(200):
+                strip.set_pixel_rgb(0, 1.0, 0.0, 0.0)
+                await strip.transmit_async(timeout=0.05)
+                await asyncio.sleep(0.01)
+                if len(received) > 1:
+                    break
+            stats = strip.stats()['strips'][0]
+            await strip.close_async()
+            server.close()
+            await server.wait_closed()
+            return stats
+
+        stats = self.loop.run_until_complete(run())
+        self.assertEqual(2, stats['connects'])
+        self.assertGreaterEqual(stats['send_errors'], 1)
+        self.assertGreater(len(received), 1)
+
+    def test_refresh_closes_connections(self):
+        closed = []
+
+        async def handle(reader, writer):
+            closed.append(await reader.read())
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            strip = LedStrip(led_count=2, ip=['127.0.0.1', '127.0.0.2'],
+                             port=server.sockets[0].getsockname()[1], protocol='opc')
+            for _ in range(100):
+                await strip.transmit_async(timeout=0.05)
+                await asyncio.sleep(0.01)
+                if strip._async_writers[0] is not None:
+                    break
+            # a connection attempt still running
+            strip._async_connects[1].cancel()
+            connect = strip._async_connects[1] = asyncio.ensure_future(asyncio.sleep(10))
+            strip.led_count = 3
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if closed:
+                    break
+            await asyncio.sleep(0)
+            self.assertTrue(connect.cancelled())
+            server.close()
+            await server.wait_closed()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(1, len(closed))
+
+
+class TestThreaded(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sink.bind(('127.0.0.1', 0))
+        self.sink.settimeout(1.0)
+
+    def tearDown(self):
+        self.sink.close()
+
+    def test_transmit_copies_pixels(self):
+        strip = LedStrip(led_count=2, ip='127.0.0.1', port=self.sink.getsockname()[1],
+                         power_limit=1.0, threaded=True)
+        strip.set_pixel_rgb(0, 1.0, 0.0, 0.0)
+        strip.transmit()
+        strip.set_pixel_rgb(0, 0.0, 0.0, 1.0)
+        self.assertEqual([0, 0, 0, 0, 255, 0, 0, 0, 0], list(self.sink.recv(100)))
+        strip.transmit()
+        self.assertEqual([0, 0, 0, 0, 0, 255, 0, 0, 0], list(self.sink.recv(100)))
+        strip.threaded = False
+        self.assertFalse(strip._sender_thread)
+
+    def test_parameter_change(self):
+        strip = LedStrip(led_count=2, ip='127.0.0.1', port=self.sink.getsockname()[1],
+                         power_limit=1.0, threaded=True)
+        for led_count in range(1, 50):
+            strip.led_count = led_count
+            strip.set_pixel_rgb(led_count - 1, 0.0, 1.0, 0.0)
+            strip.transmit()
+        strip.threaded = False
+        strip.transmit()
+        packets = []
+        self.sink.settimeout(0.2)
+        try:
+            while True:
+                packets.append(self.sink.recv(1000))
+        except socket.timeout:
+            pass
+        self.assertEqual(3 + 49 * 3, len(packets[-1]))
+        self.assertEqual(255, packets[-1][-3])
+
+    def test_arguments(self):
+        parser = argparse.ArgumentParser()
+        LedStrip.add_arguments(parser)
+        strip = LedStrip(led_count=2, ip='127.0.0.1', port=self.sink.getsockname()[1])
+        strip.read_args(parser.parse_args(['--threaded', 'false']))
+        self.assertFalse(strip.threaded)
+        strip.read_args(parser.parse_args(['--threaded', 'yes']))
+        self.assertTrue(strip._sender_thread.is_alive())
+        strip.close()
+
+    def test_sender_error(self):
+        strip = LedStrip(led_count=2, ip='127.0.0.1', port=self.sink.getsockname()[1],
+                         power_limit=1.0, threaded=True)
+        send_buffers = strip._send_buffers
+
+        def fail():
+            strip._send_buffers = send_buffers
+            raise OSError('unreachable')
+
+        strip._send_buffers = fail
+        strip.set_pixel_rgb(0, 1.0, 0.0, 0.0)
+        strip.transmit()
+        deadline = time.monotonic() + 1.0
+        while strip._sender_error is None and time.monotonic() < deadline:
+            time.sleep(0.001)
+        # the error is raised once, the thread keeps sending
+        strip.set_pixel_rgb(1, 0.0, 1.0, 0.0)
+        with self.assertRaises(OSError):
+            strip.transmit()
+        self.assertEqual([0, 0, 0, 0, 255, 0, 255, 0, 0], list(self.sink.recv(100)))
+        strip.transmit()
+        self.assertTrue(strip._sender_thread.is_alive())
+
+        thread = strip._sender_thread
+        with strip:
+            pass
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(strip.threaded)
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestFrameClock(unittest.TestCase):
+
+    def test_drift_compensation(self):
+        fake = FakeTime()
+        clock = FrameClock(50, spin=0.0, clock=fake.clock, sleep=fake.sleep)
+        for _ in range(10):
+            fake.now += 0.005
+            clock.tick()
+        self.assertAlmostEqual(100.205, fake.now)
+        self.assertAlmostEqual(0.2, clock.time)
+        self.assertEqual(0, clock.missed_deadlines)
+
+    def test_missed_deadline(self):
+        fake = FakeTime()
+        lateness = []
+        clock = FrameClock(100, spin=0.0, on_missed=lateness.append, clock=fake.clock, sleep=fake.sleep)
+        clock.tick()
+        fake.now += 0.015
+        clock.tick()
+        self.assertEqual(1, clock.missed_deadlines)
+        self.assertAlmostEqual(0.005, lateness[0])
+        fake.now += 0.005
+        clock.tick()
+        self.assertAlmostEqual(100.03, fake.now)
+        fake.now += 0.1
+        clock.tick()
+        self.assertEqual(2, clock.missed_deadlines)
+        clock.tick()
+        self.assertAlmostEqual(100.14, fake.now)
+
+    def test_min_frame_interval(self):
+        strip = LedStrip(led_count=[1000, 100], ip=['1', '2'], protocol=['esp', 'opc'])
+        self.assertAlmostEqual(0.0303, strip.min_frame_interval)
+        self.assertAlmostEqual(0.0303, FrameClock(60, min_interval=strip.min_frame_interval).interval)
+
+    def test_run(self):
+        fake = FakeTime()
+        strip = LedStrip(led_count=10, ip='127.0.0.1', port=9)
+        times = []
+
+        def render(s, t):
+            times.append(t)
+            s.set_pixel_rgb(len(times), 1.0, 1.0, 1.0)
+            return len(times) < 5
+
+        clock = strip.run(render, clock=FrameClock(10, spin=0.0, clock=fake.clock, sleep=fake.sleep))
+        self.assertEqual(4, clock.frame)
+        np.testing.assert_allclose([0.0, 0.1, 0.2, 0.3, 0.4], times)
+
+
+class TestArrayApi(unittest.TestCase):
+
+    def test_set_pixels_rgb(self):
+        strip = LedStrip(led_count=5)
+        strip.set_pixels_rgb([0, 2, 7, -1], [[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 1]])
+        self.assertEqual([[1, 0, 0], [0, 0, 0], [0, 1, 0], [0, 0, 0], [0, 0, 0]], strip._pixels.tolist())
+
+    def test_set_pixels_rgb_loop(self):
+        strip = LedStrip(led_count=5, loop=True)
+        strip.set_pixels_rgb([7, -1], [0.5, 0.5, 0.5])
+        self.assertEqual([0.0, 0.0, 0.5, 0.0, 0.5], strip._pixels[:, 0].tolist())
+
+    def test_add_pixels_rgb_accumulates(self):
+        strip = LedStrip(led_count=3)
+        strip.add_pixels_rgb([1, 1, 1], [0.25, 0.0, 0.0])
+        self.assertEqual([0.0, 0.75, 0.0], strip._pixels[:, 0].tolist())
+
+    def test_rgb_array_matches_scalar(self):
+        positions = [0.0, 1.25, 3.5, 4.75, -0.5, 9.0]
+        colors = np.random.RandomState(0).random_sample((len(positions), 3))
+        for loop in (False, True):
+            scalar = LedStrip(led_count=6, loop=loop)
+            array = LedStrip(led_count=6, loop=loop)
+            for pos, color in zip(positions, colors):
+                scalar.add_rgb(pos, *color)
+            array.add_rgb_array(positions, colors)
+            np.testing.assert_allclose(scalar._pixels, array._pixels)
+
+    def test_add_rgb_array_many_positions(self):
+        strip = LedStrip(led_count=4)
+        strip.add_rgb_array(np.full(10, 1.5), [0.1, 0.0, 0.0])
+        np.testing.assert_allclose([0.0, 0.5, 0.5, 0.0], strip._pixels[:, 0])
+
+    def test_kernels_preserve_total(self):
+        for kernel, width in (('triangle', 2.5), ('gaussian', 1.0)):
+            strip = LedStrip(led_count=30)
+            strip.add_rgb_array([10.3, 20.0], [1.0, 0.5, 0.0], kernel=kernel, width=width)
+            np.testing.assert_allclose([2.0, 1.0, 0.0], strip._pixels.sum(axis=0))
+            self.assertGreater(np.count_nonzero(strip._pixels[:, 0]), 4)
+
+    def test_kernel_symmetric(self):
+        strip = LedStrip(led_count=21)
+        strip.add_rgb_array([10.0], [1.0, 1.0, 1.0], kernel='gaussian', width=2.0)
+        np.testing.assert_allclose(strip._pixels[::-1], strip._pixels)
+
+    def test_unknown_kernel(self):
+        strip = LedStrip(led_count=3)
+        with self.assertRaises(ValueError):
+            strip.add_rgb_array([1.0], [1.0, 1.0, 1.0], kernel='box')
+
+    def test_hsv_array_matches_colorsys(self):
+        hsv = np.random.RandomState(1).random_sample((100, 3))
+        strip = LedStrip(led_count=100)
+        strip.set_hsv_array(np.arange(100), hsv)
+        expected = [colorsys.hsv_to_rgb(*color) for color in hsv]
+        np.testing.assert_allclose(expected, strip._pixels)
+
+
+class TestColor(unittest.TestCase):
+
+    def setUp(self):
+        colors = np.random.RandomState(2).random_sample((200, 3))
+        # grays, primaries and secondaries hit the edge cases of the conversions
+        colors[:8] = [[0, 0, 0], [1, 1, 1], [0.5, 0.5, 0.5], [1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0], [1, 0, 1]]
+        self.colors = colors
+
+    def test_hsv_matches_colorsys(self):
+        np.testing.assert_allclose([colorsys.hsv_to_rgb(*color) for color in self.colors],
+                                   pyledstrip.hsv_to_rgb(self.colors), atol=1e-12)
+        np.testing.assert_allclose([colorsys.rgb_to_hsv(*color) for color in self.colors],
+                                   pyledstrip.rgb_to_hsv(self.colors), atol=1e-12)
+        np.testing.assert_allclose([colorsys.hsv_to_rgb(*color) for color in self.colors],
+                                   [pyledstrip._hsv_to_rgb_scalar(*color) for color in self.colors], atol=1e-12)
+
+    def test_hsl_matches_colorsys(self):
+        np.testing.assert_allclose([colorsys.hls_to_rgb(hue, lightness, saturation)
+                                    for hue, saturation, lightness in self.colors],
+                                   pyledstrip.hsl_to_rgb(self.colors), atol=1e-12)
+        np.testing.assert_allclose([[hue, saturation, lightness] for hue, lightness, saturation in
+                                    (colorsys.rgb_to_hls(*color) for color in self.colors)],
+                                   pyledstrip.rgb_to_hsl(self.colors), atol=1e-12)
+
+    def test_hue_wraps(self):
+        hsv = np.array([[1.25, 1.0, 1.0], [-0.75, 1.0, 1.0], [-1e-20, 1.0, 1.0]])
+        np.testing.assert_allclose([[0.5, 1.0, 0.0], [0.5, 1.0, 0.0], [1.0, 0.0, 0.0]], pyledstrip.hsv_to_rgb(hsv))
+        self.assertEqual((1.0, 0.0, 0.0), pyledstrip._hsv_to_rgb_scalar(-1e-20, 1.0, 1.0))
+        # in place
+        pyledstrip.hsv_to_rgb(hsv, hsv)
+        np.testing.assert_allclose([0.5, 1.0, 0.0], hsv[0])
+
+    def test_kelvin(self):
+        rgb = pyledstrip.kelvin_to_rgb([1000, 1900, 2700, 6600, 10000, 50000])
+        np.testing.assert_allclose([1.0, 1.0, 1.0], rgb[3])
+        self.assertTrue(((0.0 <= rgb) & (rgb <= 1.0)).all())
+        # warm light is reddish, cold light bluish
+        self.assertTrue((rgb[:3, 0] >= rgb[:3, 1]).all() and (rgb[:3, 1] >= rgb[:3, 2]).all())
+        self.assertTrue((rgb[4:, 2] >= rgb[4:, 1]).all() and (rgb[4:, 1] >= rgb[4:, 0]).all())
+        np.testing.assert_allclose(rgb[:3, 2], sorted(rgb[:3, 2]))
+        self.assertEqual((2, 2, 3), pyledstrip.kelvin_to_rgb(np.full((2, 2), 3000)).shape)
+
+    def test_palettes(self):
+        palette = pyledstrip.hue_palette(256)
+        self.assertIs(palette, pyledstrip.hue_palette(256))
+        self.assertFalse(palette.flags.writeable)
+        np.testing.assert_allclose(pyledstrip.hsv_to_rgb([[0.25, 1.0, 1.0]])[0], palette[64])
+
+        gradient = pyledstrip.gradient_palette([(0.0, 0.0, 0.0), (1.0, 0.5, 0.0)], size=5)
+        self.assertIs(gradient, pyledstrip.gradient_palette(np.array([[0.0, 0.0, 0.0], [1.0, 0.5, 0.0]]), size=5))
+        np.testing.assert_allclose([0.0, 0.25, 0.5, 0.75, 1.0], gradient[:, 0])
+        np.testing.assert_allclose([[0.0, 0.0, 0.0], [1.0, 0.5, 0.0], [0.5, 0.25, 0.0]],
+                                   pyledstrip.palette_lookup(gradient, [0.1, 0.99, -0.5]))
+
+    def test_hue_lookup(self):
+        # exact at the palette entries, within the palette resolution in between
+        hues = np.arange(1024) / 1024
+        ones = np.ones_like(hues)
+        np.testing.assert_allclose(pyledstrip.hsv_to_rgb(np.column_stack([hues, ones, ones])),
+                                   pyledstrip.hue_to_rgb(hues))
+        np.testing.assert_allclose(pyledstrip.hsv_to_rgb(self.colors),
+                                   pyledstrip.hue_to_rgb(self.colors[:, 0], self.colors[:, 1], self.colors[:, 2]),
+                                   atol=6.0 / pyledstrip.PALETTE_SIZE)
+        out = np.empty((len(hues), 3))
+        self.assertIs(out, pyledstrip.hue_to_rgb(hues, 0.5, 0.5, size=256, out=out))
+        np.testing.assert_allclose(0.5, out.max(axis=1))
+        np.testing.assert_allclose(0.25, out.min(axis=1))
+
+    def test_set_hsv_matches_colorsys(self):
+        strip = LedStrip(led_count=10)
+        for pos, color in enumerate(self.colors[:10]):
+            strip.set_hsv(pos, *color)
+        strip.add_hsv(2.5, 0.3, 0.5, 0.5)
+        expected = np.array([colorsys.hsv_to_rgb(*color) for color in self.colors[:10]])
+        expected[2:4] += np.multiply.outer([0.5, 0.5], colorsys.hsv_to_rgb(0.3, 0.5, 0.5))
+        np.testing.assert_allclose(np.minimum(expected, 1.0), strip._pixels)
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sink.bind(('127.0.0.1', 0))
+
+    def tearDown(self):
+        self.sink.close()
+
+    def test_disabled(self):
+        strip = LedStrip(led_count=2, ip='127.0.0.1', port=self.sink.getsockname()[1])
+        strip.transmit()
+        self.assertFalse(strip.collect_stats)
+        self.assertIsNone(strip._stats)
+        self.assertEqual({}, strip.stats())
+
+    def test_udp_frames(self):
+        records = []
+        strip = LedStrip(led_count=[3, 4], ip='127.0.0.1', port=[self.sink.getsockname()[1]] * 2, keepalive=0.0,
+                         collect_stats=True, stats_callback=records.append)
+        for _ in range(3):
+            strip.transmit()
+
+        stats = strip.stats()
+        self.assertEqual(3, stats['frames'])
+        self.assertEqual(0, stats['dropped_frames'])
+        self.assertEqual(3 * (12 + 15), stats['bytes_sent'])
+        self.assertEqual([36, 45], [s['bytes_sent'] for s in stats['strips']])
+        self.assertEqual([3, 3], [s['send_time']['count'] for s in stats['strips']])
+        self.assertEqual(3, sum(stats['encode_time']['histogram']))
+        self.assertEqual(2, sum(stats['frame_interval']['histogram']))
+        self.assertGreater(stats['fps'], 0.0)
+        self.assertEqual([1, 2, 3], [r['frame'] for r in records])
+        self.assertEqual([27, 27, 27], [r['bytes_sent'] for r in records])
+        self.assertEqual([2, 2, 2], [r['strips_sent'] for r in records])
+
+        strip.reset_stats()
+        self.assertEqual(0, strip.stats()['frames'])
+        strip.collect_stats = False
+        self.assertEqual({}, strip.stats())
+
+    def test_tcp_connections(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        closed.bind(('127.0.0.1', 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+
+        strip = LedStrip(led_count=2, ip='127.0.0.1', port=[server.getsockname()[1], closed_port],
+                         protocol='opc', keepalive=0.0, collect_stats=True)
+        strip.transmit()
+        strip.transmit()
+        connection, _ = server.accept()
+        stats = strip.stats()['strips']
+        connection.close()
+        server.close()
+
+        self.assertEqual([1, 0], [s['connects'] for s in stats])
+        self.assertEqual([0, 2], [s['connect_failures'] for s in stats])
+        self.assertEqual([0, 2], [s['dropped_frames'] for s in stats])
+        self.assertEqual([20, 0], [s['bytes_sent'] for s in stats])
+
+    def test_threaded_dropped_frames(self):
+        strip = LedStrip(led_count=2, ip='127.0.0.1', port=self.sink.getsockname()[1], threaded=True,
+                         collect_stats=True)
+        # the sender thread can not encode while the lock is held, so later frames replace each other
+        with strip._transmit_lock:
+            for _ in range(3):
+                strip.transmit()
+        strip.threaded = False
+        self.assertGreaterEqual(strip.stats()['dropped_frames'], 1)
+
+    def test_parameters(self):
+        config = configparser.ConfigParser()
+        config['pyledstrip'] = {'collect_stats': 'yes'}
+        strip = LedStrip(config=config)
+        self.assertTrue(strip.collect_stats)
+        self.assertIn("'Collect Stats': True", str(strip))
+        strip.port = [7777, 7778]
+        self.assertEqual(2, len(strip.stats()['strips']))
+
+        parser = argparse.ArgumentParser()
+        LedStrip.add_arguments(parser)
+        strip.read_args(parser.parse_args(['--collect_stats', 'False']))
+        self.assertFalse(strip.collect_stats)
+
+
+class TestMapping(unittest.TestCase):
+
+    def test_grid(self):
+        mapping = pyledstrip.Mapping.grid(3, 2, serpentine=True)
+        self.assertEqual([0, 1, 2, 2, 1, 0], mapping.x.tolist())
+        self.assertEqual([0, 0, 0, 1, 1, 1], mapping.y.tolist())
+        mapping = pyledstrip.Mapping.grid(2, 2, 2, columns=True, offset=(1.0, 0.0, 0.0))
+        self.assertEqual([1, 1, 2, 2, 1, 1, 2, 2], mapping.x.tolist())
+        self.assertEqual([0, 1, 0, 1, 0, 1, 0, 1], mapping.y.tolist())
+        self.assertEqual([0, 0, 0, 0, 1, 1, 1, 1], mapping.z.tolist())
+
+    def test_image_on_strips(self):
+        # two serpentine 3x2 panels next to each other, one per strip
+        strip = LedStrip(led_count=[6, 6], ip='127.0.0.1', port=[1, 2], mapping=[
+            pyledstrip.Mapping.grid(3, 2, serpentine=True),
+            pyledstrip.Mapping.grid(3, 2, serpentine=True, offset=(3.0, 0.0, 0.0))])
+        strip._strip_dirty[:] = False
+        image = np.zeros((2, 6, 3))
+        image[:, :, 0] = np.arange(6) / 10
+        image[:, :, 1] = np.arange(2)[:, None] / 10
+        strip.set_image(image)
+        np.testing.assert_allclose([0.0, 0.1, 0.2, 0.2, 0.1, 0.0, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3],
+                                   strip._pixels[:, 0])
+        np.testing.assert_allclose([0.0] * 3 + [0.1] * 3 + [0.0] * 3 + [0.1] * 3, strip._pixels[:, 1])
+        self.assertTrue(strip._strip_dirty.all())
+        # images of another size are stretched over the mapping
+        strip.set_image(np.arange(4 * 3).reshape(1, 4, 3) / 10)
+        np.testing.assert_allclose(strip._pixels[:, 0],
+                                   [0.0, 0.3, 0.3, 0.3, 0.3, 0.0, 0.6, 0.6, 0.9, 0.9, 0.6, 0.6])
+
+    def test_function_partial(self):
+        points = np.full((10, 2), np.nan)
+        points[6:] = [[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [3.0, 1.0]]
+        strip = LedStrip(led_count=[5, 5], ip='127.0.0.1', port=[1, 2], pixel_dtype='uint8')
+        strip.mapping = pyledstrip.Mapping(points)
+        strip._strip_dirty[:] = False
+        strip.set_function(lambda x, y, z: np.column_stack([x / 3, y, z]))
+        self.assertEqual([0, 0, 0, 0, 0, 0, 0, 85, 170, 255], strip._pixels[:, 0].tolist())
+        self.assertEqual(255, strip._pixels[9, 1])
+        self.assertEqual([False, True], strip._strip_dirty.tolist())
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'points.csv')
+            with open(csv_path, 'w') as file:
+                file.write('# x,y,z\n0,0,1\nnan,nan,nan\n2,3,4\n')
+            json_path = os.path.join(directory, 'points.json')
+            with open(json_path, 'w') as file:
+                file.write('[[0, 0], null, [2, 3, 4]]')
+            for path in (csv_path, json_path):
+                strip = LedStrip(led_count=3, mapping=path)
+                mapping = strip._strip_mapping
+                self.assertEqual([0, 2], mapping.indices.tolist())
+                self.assertEqual([2.0, 3.0, 4.0], mapping.bounds[1].tolist())
+                self.assertIn(repr(path), str(strip))
+
+    def test_mismatch(self):
+        strip = LedStrip(led_count=4)
+        with self.assertRaises(ValueError):
+            strip.set_function(lambda x, y, z: (1.0, 1.0, 1.0))
+        strip.mapping = pyledstrip.Mapping.grid(2, 2)
+        strip.set_function(lambda x, y, z: (1.0, 1.0, 1.0))
+        strip.led_count = 5
+        with self.assertRaises(ValueError):
+            strip.set_function(lambda x, y, z: (1.0, 1.0, 1.0))
+
+
+class TestReceiver(unittest.TestCase):
+
+    def transmit(self, receiver, frames=1, **kwargs):
+        strip = LedStrip(ip='127.0.0.1', port=receiver.ports, power_limit=1.0, keepalive=0.0, **kwargs)
+        pixels = np.random.RandomState(3).random_sample((strip._total_led_count, 3))
+        strip.load_pixels(pixels)
+        for _ in range(frames):
+            strip.transmit()
+        self.assertTrue(receiver.wait(frames))
+        return strip, (pixels * 255).astype(np.uint8)
+
+    def test_esp_and_opc(self):
+        protocols = ['esp', 'esp_rgbw', 'opc']
+        with Receiver([3, 4, 5], protocol=protocols) as receiver:
+            strip, levels = self.transmit(receiver, 2, led_count=[3, 4, 5], protocol=protocols)
+            for strip_index, (start, end) in enumerate(strip._strip_ranges):
+                np.testing.assert_array_equal(levels[start:end], receiver.pixels(strip_index))
+            stats = receiver.stats()
+        self.assertEqual(6, stats['frames'])
+        self.assertEqual([2 * 12, 2 * 19, 2 * 19], [s['bytes_received'] for s in stats['strips']])
+        self.assertEqual([1, 1, 1], [s['frame_interval']['count'] for s in stats['strips']])
+
+    def test_opc_byte_length(self):
+        with Receiver(4, protocol='opc') as receiver:
+            producer = socket.create_connection(('127.0.0.1', receiver.ports[0]))
+            # a full frame, one ending with a partial LED and one longer than the strip
+            producer.sendall(bytes([0, 0, 0x00, 0x0c]) + bytes(range(1, 13)))
+            producer.sendall(bytes([0, 0, 0x00, 0x07]) + bytes([9] * 7))
+            producer.sendall(bytes([0, 0, 0x00, 0x0f]) + bytes(15))
+            producer.sendall(bytes([0, 0, 0x00, 0x03]) + bytes([7, 8, 9]))
+            self.assertTrue(receiver.wait(3))
+            producer.close()
+            np.testing.assert_array_equal([[7, 8, 9], [9, 9, 9], [7, 8, 9], [10, 11, 12]], receiver.pixels(0))
+            stats = receiver.stats()
+        self.assertEqual(1, stats['strips'][0]['errors'])
+        self.assertEqual(16 + 11 + 7, stats['strips'][0]['bytes_received'])
+
+    def test_fragmented_loss_and_reorder(self):
+        frames = []
+        with Receiver(500, protocol='esp_fragmented', on_frame=lambda *frame: frames.append(frame)) as receiver:
+            strip, levels = self.transmit(receiver, 2, led_count=500, protocol='esp_fragmented', mtu=576)
+            np.testing.assert_array_equal(levels, receiver.pixels(0))
+            strip._strip_frames[0] += 3
+            strip.transmit()
+            strip._strip_frames[0] -= 2
+            strip.transmit()
+            self.assertTrue(receiver.wait(4))
+            stats = receiver.stats()['strips'][0]
+        self.assertEqual(3, stats['lost_frames'])
+        self.assertEqual(1, stats['reordered_frames'])
+        self.assertEqual(4, stats['latency']['count'])
+        self.assertEqual([0, 0, 0, 0], [strip_index for strip_index, _, _ in frames])
+
+    def test_for_strip(self):
+        strip = LedStrip(led_count=[2, 2], ip='127.0.0.1', port=[0, 0], protocol=['esp', 'opc'])
+        with Receiver.for_strip(strip) as receiver:
+            self.assertEqual(2, len(set(receiver.ports)))
+            self.transmit(receiver, led_count=[2, 2], protocol=['esp', 'opc'])
+        with self.assertRaises(ValueError):
+            Receiver(2, protocol='ddp')
+        with self.assertRaises(ValueError):
+            Receiver([2, 2], port=7777)
+
+    def test_for_strip_same_port(self):
+        # controllers differing only in their IP, every 127.x.x.x address is loopback
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        strip = LedStrip(led_count=[2, 3], ip=['127.0.0.1', '127.0.0.2'], port=port, power_limit=1.0)
+        with Receiver.for_strip(strip) as receiver:
+            self.assertEqual([port, port], receiver.ports)
+            strip.set_pixel_rgb(3, 1.0, 0.0, 0.0)
+            strip.transmit()
+            self.assertTrue(receiver.wait(1))
+            np.testing.assert_array_equal([[0, 0, 0], [255, 0, 0], [0, 0, 0]], receiver.pixels(1))
+
+    def test_recv_into_fallback(self):
+        class Loop:
+            # event loop of Python < 3.7
+            def __init__(self, loop):
+                self.sock_recv = loop.sock_recv
+
+        left, right = socket.socketpair()
+        left.setblocking(False)
+        loop = asyncio.new_event_loop()
+        try:
+            right.sendall(b'abcdef')
+            view = memoryview(np.zeros(4, dtype=np.uint8))
+            self.assertTrue(loop.run_until_complete(Receiver._receive_exactly(Loop(loop), left, view)))
+            self.assertEqual(b'abcd', view.tobytes())
+        finally:
+            loop.close()
+            left.close()
+            right.close()
+
+
+class TestRelay(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = Receiver([2, 3]).start()
+        self.strip = LedStrip(led_count=[2, 3], ip='127.0.0.1', port=self.receiver.ports, power_limit=1.0)
+
+    def tearDown(self):
+        self.receiver.close()
+
+    @staticmethod
+    def opc(channel, levels):
+        data = bytes(np.ravel(levels).tolist())
+        return bytes([channel, 0, len(data) >> 8, len(data) & 0xff]) + data
+
+    def run_relay(self, clients, **kwargs):
+        """
+        Run a relay with clients connected to ports of the given priorities, each sending a list of OPC messages.
+        :return: relay and pixels of the strip after every client sent its messages
+        """
+        relay = pyledstrip.Relay(self.strip, port=[0] * len(clients), priority=[p for p, _ in clients],
+                                 host='127.0.0.1', fps=200.0, **kwargs)
+        states = []
+
+        async def run():
+            serve = asyncio.ensure_future(relay.serve())
+            writers = []
+            for port, (_, messages) in zip(relay.ports, clients):
+                _, writer = await asyncio.open_connection('127.0.0.1', port)
+                writers.append(writer)
+                for message in messages:
+                    writer.write(message)
+                await writer.drain()
+                await asyncio.sleep(0.05)
+                states.append(self.strip._pixels.copy())
+            for writer in writers:
+                writer.close()
+            await asyncio.sleep(0.05)
+            states.append(self.strip._pixels.copy())
+            relay.stop()
+            await serve
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run())
+        finally:
+            loop.close()
+            relay.close()
+        return relay, states
+
+    def test_priority(self):
+        low = [[10, 20, 30]] * 5
+        high = [[200, 100, 0]] * 3
+        relay, states = self.run_relay([(0, [self.opc(0, low)]), (1, [self.opc(2, high)])], timeout=10.0)
+        np.testing.assert_array_equal(low, states[0])
+        np.testing.assert_array_equal(low[:2] + high, states[1])
+        # frames stay after all clients disconnected
+        np.testing.assert_array_equal(states[1], states[2])
+        deadline = time.monotonic() + 1.0
+        while (self.receiver.pixels(1) != high).any() and time.monotonic() < deadline:
+            time.sleep(0.001)
+        np.testing.assert_array_equal(high, self.receiver.pixels(1))
+        self.assertEqual(2, relay.stats()['frames_received'])
+        self.assertEqual(0, relay.stats()['clients'])
+
+    def test_byte_length(self):
+        # two frames of 12 bytes and one of 7 bytes, which ends with a partial LED
+        frame = bytes([0, 0, 0x00, 0x0c]) + bytes(range(1, 13))
+        partial = bytes([0, 0, 0x00, 0x07]) + bytes([9] * 7)
+        relay, states = self.run_relay([(0, [frame, frame, partial, self.opc(2, [[5, 6, 7]])])])
+        self.assertEqual(4, relay.stats()['frames_received'])
+        self.assertEqual(0, relay.stats()['frames_invalid'])
+        np.testing.assert_array_equal([[9, 9, 9], [9, 9, 9], [5, 6, 7], [10, 11, 12], [0, 0, 0]], states[0])
+
+    def test_max(self):
+        relay, states = self.run_relay([
+            (0, [self.opc(1, [[10, 0, 0], [0, 50, 0]])]),
+            (0, [self.opc(1, [[0, 20, 0], [0, 30, 0]]), self.opc(9, [[1, 1, 1]])]),
+        ], merge='max')
+        np.testing.assert_array_equal([[10, 20, 0], [0, 50, 0]], states[1][:2])
+        self.assertEqual(1, relay.stats()['frames_invalid'])
+
+    def test_max_clients(self):
+        relay, _ = self.run_relay([(0, [self.opc(0, [[1, 2, 3]])]), (0, [self.opc(0, [[4, 5, 6]])])],
+                                  max_clients=1)
+        self.assertEqual(1, relay.rejected_clients)
+        with self.assertRaises(ValueError):
+            pyledstrip.Relay(self.strip, merge='blend')
+
+    def test_max_clients_queued(self):
+        # connections queued before the relay accepts are returned by sock_accept without yielding
+        relay = pyledstrip.Relay(self.strip, port=0, host='127.0.0.1', max_clients=2)
+        producers = [socket.create_connection(('127.0.0.1', relay.ports[0])) for _ in range(3)]
+        counts = []
+
+        async def run():
+            serve = asyncio.ensure_future(relay.serve())
+            await asyncio.sleep(0.05)
+            counts.append(relay.clients)
+            relay.stop()
+            await serve
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run())
+        finally:
+            loop.close()
+            relay.close()
+            for producer in producers:
+                producer.close()
+        self.assertEqual([2], counts)
+        self.assertEqual(1, relay.rejected_clients)
+        self.assertEqual(0, relay.clients)
+        self.assertEqual(2, len(relay._free_slots))
+
+
+def _render_gradient(layer, time):
+    return np.outer(np.linspace(0.0, 1.0, len(layer.pixels)), [time, 0.0, 0.0])
+
+
+class TestCompositor(unittest.TestCase):
+
+    def setUp(self):
+        config = configparser.ConfigParser()
+        config['pyledstrip'] = {}
+        self.strip = LedStrip(config=config, led_count=4)
+        self.compositor = pyledstrip.Compositor(self.strip, workers=2)
+
+    def tearDown(self):
+        self.compositor.close()
+
+    def test_blend_modes(self):
+        base = self.compositor.add_layer('base')
+        base.pixels[:] = [0.4, 0.5, 0.6]
+        top = self.compositor.add_layer('top')
+        top.pixels[:] = [0.5, 0.25, 1.0]
+        expected = {
+            'add': [0.9, 0.75, 1.6],
+            'alpha': [0.5, 0.25, 1.0],
+            'max': [0.5, 0.5, 1.0],
+            'multiply': [0.2, 0.125, 0.6],
+        }
+        for blend, color in expected.items():
+            top.blend = blend
+            self.compositor.flatten()
+            np.testing.assert_allclose([color] * 4, self.strip._pixels)
+        self.assertTrue(self.strip._strip_dirty.all())
+
+    def test_opacity_and_alpha(self):
+        self.compositor.add_layer('base').pixels[:] = 1.0
+        top = self.compositor.add_layer('top', opacity=0.5, blend='multiply')
+        top.alpha = np.array([0.0, 0.5, 1.0, 1.0])
+        self.compositor.flatten()
+        np.testing.assert_allclose([1.0, 0.75, 0.5, 0.5], self.strip._pixels[:, 0])
+
+        top.visible = False
+        self.compositor.flatten()
+        np.testing.assert_allclose(np.ones((4, 3)), self.strip._pixels)
+
+        self.compositor.remove_layer('top')
+        self.assertEqual(['base'], [layer.name for layer in self.compositor.layers])
+
+    def test_render(self):
+        def draw(layer, time):
+            layer.pixels[:, 1] = time
+
+        self.compositor.add_layer('draw', draw)
+        self.compositor.add_layer('gradient', _render_gradient, blend='add')
+        self.compositor.frame(self.strip, 0.75)
+        np.testing.assert_allclose([[0.0, 0.75, 0.0], [0.25, 0.75, 0.0], [0.5, 0.75, 0.0], [0.75, 0.75, 0.0]],
+                                   self.strip._pixels)
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+    def test_process_pool(self):
+        executor = concurrent.futures.ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('fork'))
+        compositor = pyledstrip.Compositor(self.strip, executor=executor)
+        try:
+            compositor.add_layer('gradient', _render_gradient)
+            compositor.frame(self.strip, 1.0)
+        finally:
+            executor.shutdown()
+        np.testing.assert_allclose([0.0, 1 / 3, 2 / 3, 1.0], self.strip._pixels[:, 0])
+
+    def test_invalid(self):
+        self.compositor.add_layer('base')
+        with self.assertRaises(ValueError):
+            self.compositor.add_layer('base')
+        with self.assertRaises(ValueError):
+            self.compositor.add_layer('other', blend='screen')
+        with self.assertRaises(KeyError):
+            self.compositor.remove_layer('other')
+
+
+
+class TestEffects(unittest.TestCase):
+
+    def setUp(self):
+        config = configparser.ConfigParser()
+        config['pyledstrip'] = {}
+        self.strip = LedStrip(config=config, led_count=12)
+
+    def test_rainbow_matches_hsv(self):
+        rainbow = pyledstrip.Rainbow(12, speed=0.25)
+        for pos in range(12):
+            self.strip.set_hsv(pos, pos / 12, 1.0, 1.0)
+        # hue resolution of the lookup table
+        np.testing.assert_allclose(self.strip._pixels, rainbow.render(0.0), atol=6.0 / pyledstrip.PALETTE_SIZE)
+        # a quarter hue cycle per second moves the colors three LEDs per second
+        np.testing.assert_allclose(np.roll(rainbow.render(0.0), 3, axis=0), rainbow.render(1.0))
+
+    def test_tables_cached_per_led_count(self):
+        first = pyledstrip.Rainbow(12)
+        second = pyledstrip.Rainbow(12, speed=-1.0)
+        self.assertIs(first.palette, second.palette)
+        self.assertIs(pyledstrip._led_phases(12), pyledstrip._led_phases(12))
+        self.assertIsNot(first._output, second._output)
+
+    def test_gradient_scroll(self):
+        gradient = pyledstrip.GradientScroll(4, [(1.0, 0.0, 0.0), (0.0, 0.0, 1.0)], speed=0.0, size=8)
+        np.testing.assert_allclose([[1.0, 0.0, 0.0], [0.5, 0.0, 0.5], [0.0, 0.0, 1.0], [0.5, 0.0, 0.5]],
+                                   gradient.render(3.0))
+
+    def test_chase(self):
+        chase = pyledstrip.Chase(8, (1.0, 0.5, 0.0), spacing=4, width=1.5, speed=1.0)
+        np.testing.assert_allclose([1.0, 0.5, 0.0, 0.0] * 2, chase.render(0.0)[:, 0])
+        np.testing.assert_allclose([0.75, 0.75, 0.0, 0.0] * 2, chase.render(0.25)[:, 0])
+        np.testing.assert_allclose(chase.render(0.25)[:, 0] * 0.5, chase.render(0.25)[:, 1])
+
+    def test_scanner(self):
+        scanner = pyledstrip.Scanner(10, (0.0, 1.0, 0.0), width=2.0, period=2.0)
+        self.assertEqual(0.0, scanner.center(0.0))
+        self.assertEqual(4.5, scanner.center(0.5))
+        self.assertEqual(9.0, scanner.center(1.0))
+        self.assertEqual(4.5, scanner.center(1.5))
+        np.testing.assert_allclose([0.0, 0.0, 0.0, 0.25, 0.75, 0.75, 0.25, 0.0, 0.0, 0.0], scanner.render(0.5)[:, 1])
+
+    def test_twinkle_depends_on_time_only(self):
+        twinkle = pyledstrip.Twinkle(100, [(1.0, 0.0, 0.0), (0.0, 0.0, 1.0)], seed=3)
+        frame = twinkle.render(2.0).copy()
+        twinkle.render(5.0)
+        np.testing.assert_array_equal(frame, pyledstrip.Twinkle(100, [(1.0, 0.0, 0.0), (0.0, 0.0, 1.0)],
+                                                                seed=3).render(2.0))
+        self.assertTrue((frame.max(axis=1) > 0.0).any())
+        # every LED is either red or blue
+        self.assertTrue((frame[:, 1] == 0.0).all() and (frame.min(axis=1) == 0.0).all())
+
+    def test_fire(self):
+        fire = pyledstrip.Fire(30, sparking=1.0, seed=1)
+        for frame in range(60):
+            pixels = fire.render(frame / 60.0)
+        self.assertTrue((pixels[:7].max(axis=1) > 0.0).any())
+        self.assertTrue(((0.0 <= fire.heat) & (fire.heat <= 1.0)).all())
+        # red rises first on the palette from black over red and yellow to white
+        self.assertTrue((pixels[:, 0] >= pixels[:, 1]).all() and (pixels[:, 1] >= pixels[:, 2]).all())
+
+    def test_run_writes_strip(self):
+        effect = pyledstrip.Scanner(12)
+        effect(self.strip, 0.0)
+        np.testing.assert_allclose(effect.render(0.0), self.strip._pixels)
+        self.assertTrue(self.strip._strip_dirty.all())
+        with self.assertRaises(ValueError):
+            pyledstrip.Scanner(13)(self.strip, 0.0)
+
+        frames = pyledstrip.Rainbow(12, speed=1.0).frames(fps=4.0)
+        np.testing.assert_allclose(pyledstrip.Rainbow(12, speed=1.0).render(0.25), [next(frames) for _ in range(2)][1])
+
+    def test_compositor_layer(self):
+        compositor = pyledstrip.Compositor(self.strip, workers=1)
+        try:
+            compositor.add_layer('rainbow', pyledstrip.Rainbow(12))
+            compositor.add_layer('scanner', pyledstrip.Scanner(12), blend='max')
+            compositor.frame(self.strip, 0.5)
+        finally:
+            compositor.close()
+        np.testing.assert_allclose(np.maximum(pyledstrip.Rainbow(12).render(0.5), pyledstrip.Scanner(12).render(0.5)),
+                                   self.strip._pixels)
+
+    def test_render_does_not_allocate(self):
+        effects = [cls(100000) for cls in pyledstrip.EFFECTS.values()]
+        for effect in effects:
+            effect.render(0.0)
+        tracemalloc.start()
+        try:
+            for effect in effects:
+                effect.render(1.0 / 60.0)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # at most fixed size iteration buffers of numpy, far less than a frame
+        self.assertLess(peak, effects[0]._output.nbytes // 8)
+
+
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'show.plr')
+        self.sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sink.bind(('127.0.0.1', 0))
+        self.sink.settimeout(1.0)
+        self.strip = LedStrip(led_count=[2, 3], ip='127.0.0.1', port=[self.sink.getsockname()[1]] * 2,
+                              power_limit=1.0, keepalive=float('inf'))
+
+    def tearDown(self):
+        self.sink.close()
+        self.directory.cleanup()
+
+    def record(self, frames, **kwargs):
+        with pyledstrip.Recorder(self.path, self.strip, **kwargs) as recorder:
+            for frame in range(frames):
+                self.strip.clear()
+                self.strip.set_pixel_rgb(frame % 5, 1.0, 0.5, 0.0)
+                recorder.record(frame * 0.02)
+
+    def received(self, count):
+        return [list(self.sink.recv(100)) for _ in range(count)]
+
+    def test_buffers(self):
+        self.record(3)
+        self.strip.clear()
+        fake = FakeTime()
+        with pyledstrip.Player(self.path, self.strip, spin=0.0, clock=fake.clock, sleep=fake.sleep) as player:
+            self.assertEqual(3, player.frame_count)
+            self.assertAlmostEqual(0.04, player.duration)
+            self.assertEqual(3, player.play())
+        self.assertAlmostEqual(100.04, fake.now)
+        self.assertEqual([
+            [0, 0, 0, 127, 255, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 127, 255, 0],
+            [0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 127, 255, 0, 0, 0, 0, 0, 0, 0],
+        ], self.received(5))
+        # pixels were not touched, the next transmit encodes them again
+        self.assertFalse(self.strip._pixels.any())
+        self.assertTrue(self.strip._strip_dirty.all())
+
+    def test_pixels_compressed(self):
+        self.record(3, content='pixels', compress=True)
+        with pyledstrip.Recorder(self.path, self.strip, content='pixels', compress=True, append=True) as recorder:
+            recorder.record(0.1)
+        # an incomplete record at the end is ignored
+        with open(self.path, 'ab') as file:
+            file.write(b'\0' * 10)
+
+        with pyledstrip.Player(self.path, self.strip) as player:
+            self.assertEqual([0.0, 0.02, 0.04, 0.1], player.times.tolist())
+            np.testing.assert_array_equal([[0, 0, 0], [0, 0, 0], [255, 127, 0], [0, 0, 0], [0, 0, 0]],
+                                          player.frame(2).reshape(-1, 3))
+            player.show(2)
+        np.testing.assert_allclose([1.0, 127 / 255, 0.0], self.strip._pixels[2])
+
+    def test_seek_loop_and_skip(self):
+        self.record(5)
+        fake = FakeTime()
+        shown = []
+        with pyledstrip.Player(self.path, self.strip, spin=0.0, clock=fake.clock, sleep=fake.sleep) as player:
+            player.show = shown.append
+            player.seek(0.05)
+            self.assertEqual(2, player.position)
+            self.assertEqual(5, player.play(loop=True, frames=5))
+            self.assertEqual([2, 3, 4, 0, 1], shown)
+            # a loop lasts five frame intervals
+            self.assertAlmostEqual(100.08, fake.now)
+
+            def late(index):
+                shown.append(index)
+                fake.now += 0.05
+
+            player.show = late
+            player.position = 0
+            shown.clear()
+            player.play()
+            self.assertEqual([0, 2, 4], shown)
+            self.assertEqual(2, player.skipped_frames)
 
+            # playing again after the end shows nothing, or starts over with loop
+            player.show = shown.append
+            shown.clear()
+            self.assertEqual(0, player.play())
+            self.assertEqual(2, player.play(loop=True, frames=2))
+            self.assertEqual([0, 1], shown)
 
+    def test_layout(self):
+        self.record(1)
+        with self.assertRaises(ValueError):
+            pyledstrip.Player(self.path, LedStrip(led_count=[2, 4], ip='127.0.0.1', port=[1, 2]))
+        with self.assertRaises(ValueError):
+            pyledstrip.Recorder(self.path, LedStrip(led_count=5, ip='127.0.0.1'), append=True)
+        with self.assertRaises(ValueError):
+            pyledstrip.Recorder(self.path, self.strip, content='video')
 
 if __name__ == '__main__':
     unittest.main()